@@ -0,0 +1,575 @@
+# 导入argparse模块用于解析命令行参数 / Import argparse module for command line parsing
+import argparse
+# 导入glob模块用于查找工作负载文件 / Import glob module to find workload files
+import glob
+# 导入json模块用于输出机器可读的结果 / Import json module for machine-readable results
+import json
+# 导入multiprocessing模块用于并发客户端进程 / Import multiprocessing module for concurrent client processes
+import multiprocessing
+# 导入random模块用于生成合成工作负载 / Import random module to generate synthetic workloads
+import random
+# 导入shlex模块用于拆分额外的服务器参数 / Import shlex module to split extra server arguments
+import shlex
+# 导入shutil模块用于删除临时数据目录 / Import shutil module to remove temporary data directories
+import shutil
+# 导入socket模块用于网络通信 / Import socket module for network communication
+import socket
+# 导入subprocess模块用于启动服务器进程 / Import subprocess module to launch server processes
+import subprocess
+# 导入sys模块用于获取解释器路径 / Import sys module for the interpreter path
+import sys
+# 导入tempfile模块用于创建临时数据目录 / Import tempfile module to create temporary data directories
+import tempfile
+# 导入threading模块用于并发连接 / Import threading module for concurrent connections
+import threading
+# 导入time模块用于计时 / Import time module for timing
+import time
+# 导入urllib.request用于读取指标端点 / Import urllib.request to read the metrics endpoint
+import urllib.request
+# 从array导入array用于紧凑地传回延迟样本 / Import array from array to return latency samples compactly
+from array import array
+
+# 导入二进制协议 / Import the binary protocol
+from binary_protocol import RESPONSE_HEADER, BinaryFrameReader, negotiate
+# 从client导入TupleSpaceClient以复用请求编码 / Import TupleSpaceClient from client to reuse request encoding
+from client import TupleSpaceClient
+# 导入带长度前缀的消息读取器 / Import the length-prefixed message reader
+from framing import FrameReader, format_batch
+# 导入预写日志以测量恢复时间 / Import the write-ahead log to measure recovery time
+from persistence import WriteAheadLog
+# 导入服务器以在本进程中测量每个操作的开销 / Import the server to measure the per-op cost in this process
+from server import TupleSpaceServer
+# 导入分片元组空间作为恢复目标 / Import the sharded tuple space as the recovery target
+from tuple_store import ShardedTupleSpace
+
+# 默认工作负载文件 / Default workload files
+WORKLOAD_FILES = sorted(glob.glob('client_*.txt'), key=lambda name: int(name[7:-4]))
+
+
+# 在子进程中启动服务器 / Launch a server in a child process
+def start_server(port, extra_args=()):
+    # 启动server.py并丢弃其输出 / Run server.py and discard its output
+    process = subprocess.Popen(
+        [sys.executable, 'server.py', str(port), *extra_args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    # 等待端口可连接 / Wait until the port accepts connections
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+# 停止服务器子进程 / Stop a server child process
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# 读取工作负载文件中的请求消息，binary时为二进制帧 / Load the request messages of a workload file, binary frames when binary is set
+def load_requests(path, max_lines, binary=False):
+    encoder = TupleSpaceClient(None, None, path, binary=binary)
+    requests = []
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            request_msg, _ = encoder.build_request(line)
+            if request_msg is not None:
+                requests.append(request_msg)
+            if max_lines and len(requests) >= max_lines:
+                break
+    return requests
+
+
+# 生成Zipf分布的合成请求：键的访问概率与其排名的skew次方成反比
+# Generate Zipf-skewed synthetic requests: a key's access probability is inversely proportional to its rank to the power skew
+def zipf_requests(seed, operations, num_keys, skew, reads, gets):
+    rng = random.Random(seed)
+    encoder = TupleSpaceClient(None, None, None)
+    keys = [f"key{rank}" for rank in range(num_keys)]
+    weights = [1 / (rank + 1) ** skew for rank in range(num_keys)]
+    requests = []
+    for key in rng.choices(keys, weights, k=operations):
+        choice = rng.random()
+        if choice < reads:
+            line = f"READ {key}"
+        elif choice < reads + gets:
+            line = f"GET {key}"
+        else:
+            line = f"PUT {key} value-{rng.randrange(1 << 30)}"
+        request_msg, _ = encoder.build_request(line)
+        requests.append(request_msg)
+    return requests
+
+
+# 在单个连接上回放请求并记录每个请求的延迟（在子进程中运行）
+# Replay requests over one connection, recording every request's latency (runs in a child process)
+def replay_timed(job):
+    port, workload = job
+    if workload[0] == 'file':
+        requests = load_requests(*workload[1:])
+    else:
+        requests = zipf_requests(*workload[1:])
+    messages = [request_msg.encode('utf-8') for request_msg in requests]
+    reader = FrameReader()
+    latencies = array('q')
+    errors = 0
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        # 使用跨进程可比较的单调时钟 / Use a monotonic clock that is comparable across processes
+        started = time.monotonic()
+        for message in messages:
+            sent = time.perf_counter_ns()
+            sock.sendall(message)
+            response = reader.read_frame(sock)
+            latencies.append(time.perf_counter_ns() - sent)
+            if response is None:
+                raise ConnectionError("server closed the connection")
+            if response[4:7] == 'ERR':
+                errors += 1
+        finished = time.monotonic()
+    return len(messages), errors, started, finished, latencies.tobytes()
+
+
+# 在单个连接上回放一个工作负载文件（在子进程中运行） / Replay one workload over one connection (runs in a child process)
+def replay_file(job):
+    port, path, max_lines, batch, binary = job
+    requests = load_requests(path, max_lines, binary)
+    # 按批量大小打包请求 / Pack the requests into batches
+    if batch > 1:
+        messages = [format_batch(requests[i:i + batch]) for i in range(0, len(requests), batch)]
+    else:
+        messages = requests
+    if not binary:
+        messages = [message.encode('utf-8') for message in messages]
+    reader = BinaryFrameReader(RESPONSE_HEADER.size) if binary else FrameReader()
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        if binary:
+            negotiate(sock)
+        start = time.perf_counter()
+        for message in messages:
+            sock.sendall(message)
+            reader.read_frame(sock)
+        elapsed = time.perf_counter() - start
+    return len(requests), elapsed
+
+
+# 测量每秒连接数 / Measure connections per second
+def measure_connections(port, count, concurrency):
+    probe = b"007 R x"
+    errors = []
+
+    # 每个线程打开、使用并关闭连接 / Each thread opens, uses and closes connections
+    def worker(n):
+        for _ in range(n):
+            try:
+                with socket.create_connection(('127.0.0.1', port)) as sock:
+                    sock.sendall(probe)
+                    FrameReader().read_frame(sock)
+            except OSError as e:
+                errors.append(e)
+
+    per_thread = max(1, count // concurrency)
+    threads = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return (per_thread * concurrency - len(errors)) / elapsed, len(errors)
+
+
+# 测量并发回放十个工作负载时的每秒操作数 / Measure ops/sec while replaying the workloads concurrently
+def measure_ops(port, files, max_lines, batch=1, binary=False):
+    jobs = [(port, path, max_lines, batch, binary) for path in files]
+    with multiprocessing.Pool(len(jobs)) as pool:
+        start = time.perf_counter()
+        results = pool.map(replay_file, jobs)
+        elapsed = time.perf_counter() - start
+    total_ops = sum(ops for ops, _ in results)
+    return total_ops / elapsed
+
+
+# 比较线程引擎与asyncio引擎 / Compare the threaded engine with the asyncio engine
+def bench_engines(args):
+    print(f"{'engine':<10} {'conn/s':>10} {'ops/s':>10} {'conn errors':>12}")
+    for engine in args.engines:
+        process = start_server(args.port, ['--engine', engine, '--backlog', str(args.backlog)])
+        try:
+            conn_rate, conn_errors = measure_connections(args.port, args.connections, args.concurrency)
+            ops_rate = measure_ops(args.port, args.files, args.lines)
+        finally:
+            stop_server(process)
+        print(f"{engine:<10} {conn_rate:>10.0f} {ops_rate:>10.0f} {conn_errors:>12}")
+
+
+# 测量并发客户端数增加时的每秒操作数 / Measure ops/sec as the number of concurrent clients grows
+def bench_contention(args):
+    print(f"{'shards':>6} {'clients':>8} {'ops/s':>10}")
+    for num_shards in args.shards:
+        for num_clients in args.clients:
+            # 每个客户端轮流使用一个工作负载文件 / Each client uses the workload files in turn
+            files = [args.files[i % len(args.files)] for i in range(num_clients)]
+            process = start_server(args.port, ['--shards', str(num_shards)])
+            try:
+                ops_rate = measure_ops(args.port, files, args.lines)
+            finally:
+                stop_server(process)
+            print(f"{num_shards:>6} {num_clients:>8} {ops_rate:>10.0f}")
+
+
+# 测量工作进程数增加时的每秒操作数 / Measure ops/sec as the number of worker processes grows
+def bench_workers(args):
+    print(f"{'workers':>7} {'engine':<10} {'ops/s':>10}")
+    files = [args.files[i % len(args.files)] for i in range(args.clients)]
+    for num_workers in args.workers:
+        process = start_server(args.port, ['--workers', str(num_workers), '--engine', args.engine])
+        try:
+            ops_rate = measure_ops(args.port, files, args.lines)
+        finally:
+            stop_server(process)
+        print(f"{num_workers:>7} {args.engine:<10} {ops_rate:>10.0f}")
+
+
+# 测量不同批量大小下的每秒操作数 / Measure ops/sec for different batch sizes
+def bench_batch(args):
+    print(f"{'batch':>6} {'ops/s':>10}")
+    for batch in args.batch:
+        process = start_server(args.port)
+        try:
+            ops_rate = measure_ops(args.port, args.files, args.lines, batch)
+        finally:
+            stop_server(process)
+        print(f"{batch:>6} {ops_rate:>10.0f}")
+
+
+# 测量不同fsync策略下的写入吞吐量和恢复时间 / Measure write throughput and recovery time for each fsync policy
+def bench_persistence(args):
+    print(f"{'fsync':<8} {'ops/s':>10} {'records':>10} {'recovery s':>11}")
+    for policy in args.fsync:
+        data_dir = tempfile.mkdtemp(prefix='tuplespace-bench-')
+        try:
+            process = start_server(args.port, ['--data-dir', data_dir, '--fsync', policy,
+                                               '--snapshot-interval', str(args.snapshot_interval)])
+            try:
+                ops_rate = measure_ops(args.port, args.files, args.lines)
+            finally:
+                stop_server(process)
+            # 在本进程中重放快照和日志 / Replay the snapshot and the log in this process
+            start = time.perf_counter()
+            records = WriteAheadLog(data_dir, policy).load(ShardedTupleSpace())
+            recovery = time.perf_counter() - start
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        print(f"{policy:<8} {ops_rate:>10.0f} {records:>10} {recovery:>11.3f}")
+
+
+# 比较开启和关闭性能指标时的每秒操作数 / Compare ops/sec with performance metrics on and off
+def bench_metrics(args):
+    print(f"{'metrics':<8} {'ops/s':>10}")
+    for enabled in (False, True):
+        extra = ['--metrics-port', str(args.metrics_port)] if enabled else []
+        process = start_server(args.port, extra)
+        try:
+            ops_rate = measure_ops(args.port, args.files, args.lines)
+        finally:
+            stop_server(process)
+        print(f"{'on' if enabled else 'off':<8} {ops_rate:>10.0f}")
+
+
+# 比较文本协议与二进制协议：本进程内服务器端每个操作的CPU开销、每个操作的字节数和网络上的每秒操作数
+# Compare the text and binary protocols: server-side CPU per op measured in this process, bytes per op and ops/sec over the network
+def bench_protocols(args):
+    print(f"{'protocol':<9} {'us/op':>7} {'req B/op':>9} {'resp B/op':>10} {'ops/s':>10}")
+    for protocol in args.protocols:
+        binary = protocol == 'binary'
+        requests = []
+        for path in args.files:
+            requests.extend(load_requests(path, args.lines, binary))
+
+        # 服务器处理请求的开销：解析、执行和编码响应，不含网络
+        # Server cost of a request: parsing, applying and encoding the response, network excluded
+        server = TupleSpaceServer(args.port)
+        process = server.process_binary if binary else server.process_request
+        start = time.perf_counter()
+        responses = [process(request) for request in requests]
+        per_op = (time.perf_counter() - start) / len(requests) * 1e6
+        request_bytes = sum(len(request) for request in requests) / len(requests)
+        if binary:
+            response_bytes = sum(len(response) for response in responses) / len(responses)
+        else:
+            response_bytes = sum(len(response.encode('utf-8')) for response in responses) / len(responses)
+
+        process = start_server(args.port)
+        try:
+            ops_rate = measure_ops(args.port, args.files, args.lines, binary=binary)
+        finally:
+            stop_server(process)
+        print(f"{protocol:<9} {per_op:>7.2f} {request_bytes:>9.1f} {response_bytes:>10.1f} {ops_rate:>10.0f}")
+
+
+# 比较前缀查询经有序索引与扫描整个字典的耗时（本进程内，不含网络），每个查询匹配args.matches个元组
+# Compare a prefix query through the sorted index with a scan of the whole dict (in this process, network
+# excluded); every query matches args.matches tuples
+def bench_queries(args):
+    print(f"{'tuples':>9} {'matches':>8} {'index ms':>9} {'scan ms':>9}")
+    for size in args.sizes:
+        server = TupleSpaceServer(args.port)
+        groups = max(1, size // args.matches)
+        for i in range(size):
+            server.put_tuple(server.tuple_space.shard_for(f"g{i % groups:06d}:{i}"), f"g{i % groups:06d}:{i}", 'v')
+        prefixes = [f"g{random.randrange(groups):06d}:" for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        for prefix in prefixes:
+            matched = sum(1 for _ in server.process_query('QP', prefix, None, None))
+        indexed = (time.perf_counter() - start) / len(prefixes) * 1e3
+
+        # 没有索引时：在分片锁内扫描所有键再排序 / Without an index: scan every key under the shard locks, then sort
+        start = time.perf_counter()
+        for prefix in prefixes:
+            found = []
+            for shard in server.tuple_space.shards:
+                with shard.lock:
+                    found.extend((key, value) for key, value in shard.tuples.items() if key.startswith(prefix))
+            found.sort()
+        scanned = (time.perf_counter() - start) / len(prefixes) * 1e3
+        print(f"{size:>9} {matched:>8} {indexed:>9.3f} {scanned:>9.3f}")
+
+
+# 读取服务器指标端点中的数值指标 / Read the numeric metrics of a server's metrics endpoint
+def read_metrics(metrics_port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{metrics_port}/metrics", timeout=5) as response:
+        metrics = {}
+        for line in response.read().decode('utf-8').splitlines():
+            if line.startswith('tuplespace_') and '{' not in line:
+                name, value = line.split()
+                metrics[name[len('tuplespace_'):]] = float(value)
+        return metrics
+
+
+# 主节点带0个或1个从节点时的写入吞吐量，以及负载结束后从节点追上所需的时间和状态是否一致
+# Write throughput of a primary with 0 or 1 follower, plus how long the follower takes to catch up once
+# the load ends and whether both end up with the same state
+def bench_replication(args):
+    print(f"{'followers':>9} {'ops/s':>10} {'catch-up s':>11} {'consistent':>11}")
+    for followers in (0, 1):
+        primary = start_server(args.port, ['--replication-port', str(args.replication_port),
+                                           '--metrics-port', str(args.metrics_port)])
+        follower = None
+        try:
+            if followers:
+                follower = start_server(args.port + 1, ['--follow', f"127.0.0.1:{args.replication_port}",
+                                                        '--metrics-port', str(args.metrics_port + 1)])
+            ops_rate = measure_ops(args.port, args.files, args.lines)
+            if not followers:
+                print(f"{followers:>9} {ops_rate:>10.0f} {'-':>11} {'-':>11}")
+                continue
+            # 等待从节点应用主节点的所有记录 / Wait until the follower applied every record of the primary
+            start = time.perf_counter()
+            target = read_metrics(args.metrics_port)['replication_sequence']
+            while read_metrics(args.metrics_port + 1)['replication_applied'] < target:
+                time.sleep(0.01)
+            catch_up = time.perf_counter() - start
+            expected, actual = read_metrics(args.metrics_port), read_metrics(args.metrics_port + 1)
+            consistent = all(expected[name] == actual[name] for name in ('tuples', 'key_size', 'value_size'))
+            print(f"{followers:>9} {ops_rate:>10.0f} {catch_up:>11.2f} {'yes' if consistent else 'no':>11}")
+        finally:
+            if follower is not None:
+                stop_server(follower)
+            stop_server(primary)
+
+
+# 回放工作负载文件或Zipf合成负载，以JSON输出吞吐量、延迟分位数和错误率
+# Replay the workload files or a Zipf mix and report throughput, latency percentiles and error rate as JSON
+def bench_replay(args):
+    # 每个连接一个工作负载 / One workload per connection
+    if args.workload == 'files':
+        workloads = [('file', args.files[i % len(args.files)], args.lines) for i in range(args.connections)]
+    else:
+        workloads = [('zipf', args.seed + i, args.operations, args.keys, args.skew, args.reads, args.gets)
+                     for i in range(args.connections)]
+
+    server_args = shlex.split(args.server_args)
+    process = start_server(args.port, server_args)
+    try:
+        with multiprocessing.Pool(args.connections) as pool:
+            results = pool.map(replay_timed, [(args.port, workload) for workload in workloads])
+    finally:
+        stop_server(process)
+
+    # 合并所有连接的结果 / Merge the results of every connection
+    operations = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+    elapsed = max(result[3] for result in results) - min(result[2] for result in results)
+    latencies = array('q')
+    for result in results:
+        latencies.frombytes(result[4])
+    latencies = sorted(latencies)
+
+    # 返回某个分位数的延迟（微秒） / Return the latency at a percentile, in microseconds
+    def percentile(fraction):
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] / 1000
+
+    report = {
+        'workload': args.workload,
+        'server_args': server_args,
+        'connections': args.connections,
+        'operations': operations,
+        'errors': errors,
+        'error_rate': errors / operations if operations else 0,
+        'elapsed_s': elapsed,
+        'throughput_ops_s': operations / elapsed if elapsed > 0 else 0,
+        'latency_us': {
+            'p50': percentile(0.5),
+            'p99': percentile(0.99),
+            'p999': percentile(0.999),
+            'max': latencies[-1] / 1000 if latencies else 0,
+        },
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    print(output)
+
+
+# 主函数 / Main function
+def main():
+    parser = argparse.ArgumentParser(description="Tuple space server benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    # 回放基准（JSON输出） / Replay benchmark (JSON output)
+    replay = subparsers.add_parser('replay', help="replay workloads and report latency percentiles as JSON")
+    replay.add_argument('--workload', choices=['files', 'zipf'], default='files')
+    replay.add_argument('--connections', type=int, default=10,
+                        help="concurrent connections, each replaying one workload")
+    replay.add_argument('--server-args', default='',
+                        help="extra server.py arguments, e.g. \"--engine asyncio\"")
+    replay.add_argument('--port', type=int, default=55555)
+    replay.add_argument('--lines', type=int, default=0,
+                        help="lines replayed per workload file (0 = whole file)")
+    replay.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    replay.add_argument('--operations', type=int, default=100000,
+                        help="zipf: requests per connection")
+    replay.add_argument('--keys', type=int, default=10000, help="zipf: number of distinct keys")
+    replay.add_argument('--skew', type=float, default=1.0, help="zipf: skew exponent")
+    replay.add_argument('--reads', type=float, default=0.5, help="zipf: fraction of READs")
+    replay.add_argument('--gets', type=float, default=0.25, help="zipf: fraction of GETs (the rest are PUTs)")
+    replay.add_argument('--seed', type=int, default=1)
+    replay.add_argument('--output', help="also write the JSON report to this file")
+    replay.set_defaults(func=bench_replay)
+
+    # 引擎对比基准 / Engine comparison benchmark
+    engines = subparsers.add_parser('engines', help="threaded vs asyncio engine")
+    engines.add_argument('--engines', nargs='+', default=['threaded', 'asyncio'])
+    engines.add_argument('--port', type=int, default=55555)
+    engines.add_argument('--backlog', type=int, default=1024)
+    engines.add_argument('--connections', type=int, default=2000,
+                         help="connections opened for the conn/s measurement")
+    engines.add_argument('--concurrency', type=int, default=50,
+                         help="threads opening connections at the same time")
+    engines.add_argument('--lines', type=int, default=10000,
+                         help="lines replayed per workload file (0 = whole file)")
+    engines.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    engines.set_defaults(func=bench_engines)
+
+    # 锁竞争基准 / Lock contention benchmark
+    contention = subparsers.add_parser('contention', help="ops/sec vs concurrent clients")
+    contention.add_argument('--shards', nargs='+', type=int, default=[1, 16])
+    contention.add_argument('--clients', nargs='+', type=int, default=[1, 2, 4, 8, 16, 32])
+    contention.add_argument('--port', type=int, default=55555)
+    contention.add_argument('--lines', type=int, default=5000,
+                            help="lines replayed per client (0 = whole file)")
+    contention.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    contention.set_defaults(func=bench_contention)
+
+    # 多进程扩展基准 / Multi-process scaling benchmark
+    workers = subparsers.add_parser('workers', help="ops/sec vs worker processes")
+    workers.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4, 8])
+    workers.add_argument('--engine', choices=['threaded', 'asyncio'], default='threaded')
+    workers.add_argument('--clients', type=int, default=32,
+                         help="concurrent clients replaying the workloads")
+    workers.add_argument('--port', type=int, default=55555)
+    workers.add_argument('--lines', type=int, default=5000,
+                         help="lines replayed per client (0 = whole file)")
+    workers.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    workers.set_defaults(func=bench_workers)
+
+    # 批量消息基准 / Batch message benchmark
+    batch = subparsers.add_parser('batch', help="ops/sec vs requests per batch message")
+    batch.add_argument('--batch', nargs='+', type=int, default=[1, 16, 256])
+    batch.add_argument('--port', type=int, default=55555)
+    batch.add_argument('--lines', type=int, default=10000,
+                       help="lines replayed per workload file (0 = whole file)")
+    batch.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    batch.set_defaults(func=bench_batch)
+
+    # 持久化基准 / Persistence benchmark
+    persistence = subparsers.add_parser('persistence', help="write throughput and recovery time per fsync policy")
+    persistence.add_argument('--fsync', nargs='+', default=['always', 'group', 'none'])
+    persistence.add_argument('--snapshot-interval', type=float, default=3600,
+                             help="seconds between snapshots (default: no snapshot during the run)")
+    persistence.add_argument('--port', type=int, default=55555)
+    persistence.add_argument('--lines', type=int, default=5000,
+                             help="lines replayed per workload file (0 = whole file)")
+    persistence.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    persistence.set_defaults(func=bench_persistence)
+
+    # 性能指标开销基准 / Instrumentation overhead benchmark
+    instrumentation = subparsers.add_parser('metrics', help="ops/sec with instrumentation off and on")
+    instrumentation.add_argument('--port', type=int, default=55555)
+    instrumentation.add_argument('--metrics-port', type=int, default=55556)
+    instrumentation.add_argument('--lines', type=int, default=10000,
+                                 help="lines replayed per workload file (0 = whole file)")
+    instrumentation.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    instrumentation.set_defaults(func=bench_metrics)
+
+    # 线路协议基准 / Wire protocol benchmark
+    protocols = subparsers.add_parser('protocols', help="per-op cost and ops/sec of the text and binary protocols")
+    protocols.add_argument('--protocols', nargs='+', choices=['text', 'binary'], default=['text', 'binary'])
+    protocols.add_argument('--port', type=int, default=55555)
+    protocols.add_argument('--lines', type=int, default=10000,
+                           help="lines replayed per workload file (0 = whole file)")
+    protocols.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    protocols.set_defaults(func=bench_protocols)
+
+    # 前缀查询基准 / Prefix query benchmark
+    queries = subparsers.add_parser('queries', help="prefix query time with the sorted index vs a full scan")
+    queries.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    queries.add_argument('--matches', type=int, default=100, help="tuples matched by each query")
+    queries.add_argument('--queries', type=int, default=20, help="queries timed per size")
+    queries.add_argument('--port', type=int, default=55555)
+    queries.set_defaults(func=bench_queries)
+
+    # 复制基准：主节点和从节点在同一台机器上运行 / Replication benchmark: the primary and the follower run on this machine
+    replication = subparsers.add_parser('replication', help="primary ops/sec with and without a follower, and catch-up time")
+    replication.add_argument('--port', type=int, default=55555, help="primary port; the follower uses the next one")
+    replication.add_argument('--replication-port', type=int, default=55557)
+    replication.add_argument('--metrics-port', type=int, default=55558,
+                             help="primary metrics port; the follower uses the next one")
+    replication.add_argument('--lines', type=int, default=10000,
+                             help="lines replayed per workload file (0 = whole file)")
+    replication.add_argument('--files', nargs='+', default=WORKLOAD_FILES)
+    replication.set_defaults(func=bench_replication)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+# 程序入口 / Program entry point
+if __name__ == "__main__":
+    main()
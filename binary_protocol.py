@@ -0,0 +1,173 @@
+# 二进制线路协议 / Binary wire protocol
+#
+# 与文本协议并存的可选紧凑协议。客户端连接后先发送HELLO，服务器回复同样的HELLO表示接受，
+# 之后该连接上的请求和响应都是二进制帧。没有发送HELLO的连接继续使用文本协议。
+# An optional compact protocol next to the text one. A client sends HELLO right
+# after connecting and the server answers with the same HELLO to accept it;
+# from then on the requests and responses on that connection are binary frames.
+# Connections that do not send HELLO keep using the text protocol.
+#
+# 请求 / Request:  length:u32 opcode:u8 key_length:u16 argument:u32 key value
+# 响应 / Response: length:u32 status:u8 payload
+#
+# length为整帧的字节数（含自身），整数均为大端序，键和值为原始UTF-8字节。argument是PX的TTL、
+# BR/BG的超时（毫秒）或QP/QR的结果数量上限，没有时为NO_ARGUMENT。成功的R/G/BR/BG响应携带值，
+# PUT只返回状态码，不回显值；STATUS_ERROR的响应携带错误信息。查询（QP按前缀，QR按范围，
+# 范围的结束键放在值的位置）先为每个匹配的元组返回一个STATUS_MATCH帧，最后以携带匹配数量的
+# STATUS_OK帧结束。
+# length is the size of the whole frame in bytes (itself included), integers
+# are big-endian and the key and value are raw UTF-8 bytes. argument is the TTL
+# of a PX or the timeout of a BR/BG in milliseconds, or the result limit of a
+# QP/QR; NO_ARGUMENT when there is none. Successful R/G/BR/BG responses carry
+# the value, PUTs only return a status code and never echo the value;
+# STATUS_ERROR responses carry the error. Queries (QP by prefix, QR by range
+# with the end key in place of the value) first answer one STATUS_MATCH frame
+# per matching tuple and end with a STATUS_OK frame carrying the match count.
+#
+# 匹配帧 / Match frame: length:u32 status:u8 key_length:u16 key value
+
+# 导入struct模块用于编码帧头 / Import struct module to encode frame headers
+import struct
+
+# 导入文本协议的读取器作为缓冲区管理的基础 / Import the text protocol reader as the base of buffer management
+from framing import FrameReader
+
+# 协商二进制协议的握手字节，以文本协议中不会出现的NUL开头
+# Handshake bytes negotiating the binary protocol; they start with a NUL that never begins a text message
+HELLO = b'\x00TSB\x01'
+# 帧长度字段 / Frame length field
+LENGTH = struct.Struct('!I')
+# 请求帧头：长度、操作码、键长度、参数 / Request header: length, opcode, key length, argument
+REQUEST_HEADER = struct.Struct('!IBHI')
+# 响应帧头：长度、状态码 / Response header: length, status
+RESPONSE_HEADER = struct.Struct('!IB')
+# 查询匹配帧的负载头：键长度 / Payload header of a query match frame: key length
+MATCH_HEADER = struct.Struct('!H')
+# 单帧的最大字节数 / Maximum size of one frame in bytes
+MAX_FRAME_SIZE = 1 << 24
+# 没有TTL或超时时的参数值 / Argument value when there is no TTL or timeout
+NO_ARGUMENT = 0xFFFFFFFF
+
+# 操作码 / Opcodes
+OPCODES = {'R': 1, 'G': 2, 'P': 3, 'PX': 4, 'BR': 5, 'BG': 6, 'QP': 7, 'QR': 8}
+OPERATIONS = {opcode: operation for operation, opcode in OPCODES.items()}
+
+# 状态码 / Status codes
+STATUS_OK = 0          # 成功 / Success
+STATUS_NOT_FOUND = 1   # 键不存在 / The key does not exist
+STATUS_EXISTS = 2      # PUT的键已存在 / The key of a PUT already exists
+STATUS_ERROR = 3       # 请求无效或服务器错误 / Invalid request or server error
+STATUS_MATCH = 4       # 查询匹配的一个元组，后面还有帧 / One tuple matched by a query, more frames follow
+
+
+# 编码一个请求帧 / Encode one request frame
+def encode_request(operation, key, value='', argument=NO_ARGUMENT):
+    key = key.encode('utf-8')
+    value = value.encode('utf-8')
+    length = REQUEST_HEADER.size + len(key) + len(value)
+    return REQUEST_HEADER.pack(length, OPCODES[operation], len(key), argument) + key + value
+
+
+# 解码一个请求帧，返回(操作, 键, 参数, 值)，无效时抛出ValueError
+# Decode one request frame into (operation, key, argument, value); raises ValueError when it is invalid
+def decode_request(frame):
+    if len(frame) < REQUEST_HEADER.size:
+        raise ValueError("Frame too short")
+    length, opcode, key_length, argument = REQUEST_HEADER.unpack_from(frame)
+    if length != len(frame):
+        raise ValueError(f"Size mismatch (declared: {length}, actual: {len(frame)})")
+    if opcode not in OPERATIONS:
+        raise ValueError(f"Invalid operation: {opcode}")
+    key_end = REQUEST_HEADER.size + key_length
+    if key_length == 0 or key_end > length:
+        raise ValueError("Invalid key length")
+    key = frame[REQUEST_HEADER.size:key_end].decode('utf-8')
+    value = frame[key_end:].decode('utf-8')
+    return OPERATIONS[opcode], key, argument, value
+
+
+# 编码一个响应帧 / Encode one response frame
+def encode_response(status, payload=''):
+    payload = payload.encode('utf-8')
+    return RESPONSE_HEADER.pack(RESPONSE_HEADER.size + len(payload), status) + payload
+
+
+# 编码读取结果：找到时返回值，否则返回STATUS_NOT_FOUND / Encode a read result: the value when found, STATUS_NOT_FOUND otherwise
+def encode_value(value):
+    if value is None:
+        return encode_response(STATUS_NOT_FOUND)
+    return encode_response(STATUS_OK, value)
+
+
+# 编码查询匹配的一个元组 / Encode one tuple matched by a query
+def encode_match(key, value):
+    key = key.encode('utf-8')
+    value = value.encode('utf-8')
+    length = RESPONSE_HEADER.size + MATCH_HEADER.size + len(key) + len(value)
+    return RESPONSE_HEADER.pack(length, STATUS_MATCH) + MATCH_HEADER.pack(len(key)) + key + value
+
+
+# 解码STATUS_MATCH帧，返回(键, 值) / Decode a STATUS_MATCH frame into (key, value)
+def decode_match(frame):
+    key_start = RESPONSE_HEADER.size + MATCH_HEADER.size
+    key_length, = MATCH_HEADER.unpack_from(frame, RESPONSE_HEADER.size)
+    key_end = key_start + key_length
+    return frame[key_start:key_end].decode('utf-8'), frame[key_end:].decode('utf-8')
+
+
+# 解码一个响应帧，返回(状态码, 负载) / Decode one response frame into (status, payload)
+def decode_response(frame):
+    length, status = RESPONSE_HEADER.unpack_from(frame)
+    if length != len(frame):
+        raise ValueError(f"Size mismatch (declared: {length}, actual: {len(frame)})")
+    return status, frame[RESPONSE_HEADER.size:].decode('utf-8')
+
+
+# 在已连接的socket上协商二进制协议，服务器拒绝时抛出ConnectionError
+# Negotiate the binary protocol on a connected socket; raises ConnectionError when the server declines
+def negotiate(sock):
+    sock.sendall(HELLO)
+    reply = b''
+    while len(reply) < len(HELLO):
+        data = sock.recv(len(HELLO) - len(reply))
+        if not data:
+            break
+        reply += data
+    if reply != HELLO:
+        raise ConnectionError("server does not support the binary protocol")
+
+
+# 定义BinaryFrameReader类：按4字节长度取出二进制帧 / Define BinaryFrameReader class: pulls binary frames out by their 4-byte length
+class BinaryFrameReader(FrameReader):
+    # 初始化方法，可接管文本读取器中已收到的数据 / Initialization method; can take over the data a text reader already received
+    def __init__(self, header_size, source=None):
+        super().__init__()
+        # 合法帧的最小长度 / Minimum length of a valid frame
+        self.header_size = header_size
+        if source is not None:
+            self.chunk_size = source.chunk_size
+            self.read_size = source.read_size
+            self.fed = source.fed
+            self.buffer = source.buffer
+            self.start = source.start
+            self.end = source.end
+            self.partial_since = source.partial_since
+
+    # 取出下一帧（bytes），不完整时返回None / Pop the next frame (bytes), or None if incomplete
+    def next_frame(self):
+        available = self.end - self.start
+        if available < LENGTH.size:
+            if available == 0:
+                self.compact()
+            return None
+        length, = LENGTH.unpack_from(self.buffer, self.start)
+        if not self.header_size <= length <= MAX_FRAME_SIZE:
+            # 长度无效时无法重新同步，把剩余数据作为一帧交给上层报错
+            # An invalid length cannot be resynchronised; hand the rest over as one frame so the caller reports it
+            length = available
+        if available < length:
+            return None
+        frame = bytes(self.buffer[self.start:self.start + length])
+        self.start += length
+        self.popped()
+        return frame
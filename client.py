@@ -1,12 +1,36 @@
-# 导入socket和sys模块
-# Import socket module and sys module for network communication
+# 导入网络通信、线程和命令行解析所需的模块
+# Import modules for network communication, threading and command line parsing
+import argparse
+import glob
+import io
+import queue
+import re
 import socket  
-import sys  
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Import the binary protocol
+# 导入二进制协议
+from binary_protocol import (NO_ARGUMENT, RESPONSE_HEADER, STATUS_ERROR, STATUS_EXISTS, STATUS_MATCH, STATUS_NOT_FOUND,
+                             STATUS_OK, BinaryFrameReader, decode_match, decode_request, decode_response,
+                             encode_request, negotiate)
+# Import the length-prefixed message reader
+# 导入带长度前缀的消息读取器
+from framing import BATCH_HEADER_SIZE, BATCH_MARKER, FrameReader, byte_length, format_batch, split_batch
+# Import structured logging
+# 导入结构化日志
+from logs import LEVELS, LOG_FORMATS, Logger
+
+# Operations that answer one response per matching tuple before their final response
+# 在最终响应之前为每个匹配的元组返回一条响应的操作
+QUERY_OPERATIONS = ('QUERY', 'RANGE')
 
 #create class TupleSpaceClient 
 # 创建TupleSpaceClient类
 class TupleSpaceClient:
-    def __init__(self, host, port, request_file):
+    def __init__(self, host, port, request_file, window=1, batch=1, logger=None, quiet=False, binary=False):
         # Initialize the client
         # 初始化客户端
         # 服务器主机地址,设置主机、端口和请求文件
@@ -16,152 +40,729 @@ class TupleSpaceClient:
         # 请求文件名
         # Request file name
         self.request_file = request_file 
+        # Maximum number of requests in flight (1 = wait for each response)
+        # 同时在途的最大请求数（1表示逐条等待响应）
+        self.window = window
+        # Maximum number of consecutive lines sent as one batch message (1 = no batching)
+        # 合并为一条批量消息发送的最大连续行数（1表示不合并）
+        self.batch = batch
+        # Logger that receives the results and errors (standard output by default)
+        # Results are formatted and written in batches by its background thread; none are ever dropped
+        # 接收结果和错误的日志记录器（默认为标准输出）
+        # 结果由其后台线程格式化并成批写出，不会被丢弃
+        self.logger = logger if logger is not None else Logger(lossy=False)
+        # Only count the responses instead of printing them
+        # 只统计响应而不打印
+        self.quiet = quiet
+        # Use the binary protocol instead of the text one (no batching)
+        # 使用二进制协议代替文本协议（不支持批量）
+        self.binary = binary
+        # Number of responses received so far
+        # 目前收到的响应数
+        self.completed = 0
+        # Set when the last connection used can no longer carry requests
+        # 最近使用的连接不可再用时设置
+        self.connection_lost = False
     
+    # Build the framed request message for one line of the request file
+    # Returns (request_msg, None) on success or (None, error) when the line is invalid
+    # 为请求文件中的一行构建带长度前缀的请求消息
+    # 成功时返回(request_msg, None)，行无效时返回(None, error)
+    def build_request(self, line):
+        # Parse the request line into parts
+        # 将请求行分割成多个部分
+        parts = line.split()
+        if len(parts) < 2:
+            return None, f"Invalid request line: {line}"
+
+        # Extract operation, key, and value from the request line
+        # 从请求行中提取操作、键和值
+        #operation
+        operation = parts[0].upper()
+        #key
+        key = ' '.join(parts[1:-1]) if operation == 'PUT' else ' '.join(parts[1:])
+        #value
+        value = parts[-1] if operation == 'PUT' else None
+
+        # Blocking operations take an optional trailing timeout in seconds
+        # 阻塞操作可以在末尾带一个以秒为单位的超时
+        if operation in ('BREAD', 'BGET') and len(parts) > 2:
+            try:
+                float(parts[-1])
+            except ValueError:
+                pass
+            else:
+                key = ' '.join(parts[1:-1])
+                value = parts[-1]
+
+        # PUTEX stores with a TTL: PUTEX <key> <value> <seconds>
+        # PUTEX带TTL存储：PUTEX <key> <value> <seconds>
+        ttl = None
+        if operation == 'PUTEX':
+            if len(parts) < 4:
+                return None, f"Invalid request line: {line}"
+            key = ' '.join(parts[1:-2])
+            value = parts[-2]
+            ttl = parts[-1]
+
+        # Queries take single-word keys: QUERY <prefix> [limit], RANGE <start> <end> [limit]
+        # 查询使用单个词的键：QUERY <prefix> [limit]，RANGE <start> <end> [limit]
+        if operation in QUERY_OPERATIONS:
+            if len(parts) > (3 if operation == 'QUERY' else 4) or (operation == 'RANGE' and len(parts) < 3):
+                return None, f"Invalid request line: {line}"
+            key = parts[1]
+            value = ' '.join(parts[2:]) or None
+
+        # Validate the collated size for PUT operations (the binary protocol has no such limit)
+        # 验证PUT操作的合并大小（二进制协议没有该限制）
+        if operation in ('PUT', 'PUTEX') and not self.binary:
+            collated_size = byte_length(key) + byte_length(value) + 1  # +1 for space, in UTF-8 bytes
+            if collated_size > 970:
+                return None, f"Error: collated size exceeds limit for line: {line}"
+        # Prepare the request message based on the operation
+        # 根据操作类型准备请求消息
+        #Check if the operation is 'READ'
+        if operation == 'READ':
+            # Set command to 'R' for READ operation
+            cmd = 'R'
+            # Format the message as "R <key>"
+            message_content = f"{cmd} {key}"
+        
+        # If operation is not 'READ', check if it's 'GET'
+        # 如果操作不是'READ'，检查是否是'GET'
+        elif operation == 'GET':
+            # Set command to 'G' for GET operation
+            # 为GET操作设置命令为'G'
+            cmd = 'G'
+            # Format the message as "G <key>"
+            # 将消息格式化为"G <key>"
+            message_content = f"{cmd} {key}"
+        
+        # If operation is not 'READ' or 'GET', check if it's 'PUT'
+        # 如果操作不是'READ'或'GET'，检查是否是'PUT'
+        elif operation == 'PUT':
+            # Set command to 'P' for PUT operation
+            # 为PUT操作设置命令为'P'
+            cmd = 'P'
+            # Format the message as "P <key> <value>"
+            # 将消息格式化为"P <key> <value>"
+            message_content = f"{cmd} {key} {value}"
+
+        # If operation is a PUT whose tuple expires after a TTL
+        # 如果操作是元组在TTL后过期的PUT
+        elif operation == 'PUTEX':
+            # Set command to 'PX' and format the message as "PX <key> <seconds> <value>"
+            # 设置命令为'PX'，将消息格式化为"PX <key> <seconds> <value>"
+            cmd = 'PX'
+            message_content = f"{cmd} {key} {ttl} {value}"
+
+        # If operation is a blocking READ or GET that waits for the key to appear
+        # 如果操作是等待键出现的阻塞READ或GET
+        elif operation in ('BREAD', 'BGET'):
+            # Set command to 'BR' or 'BG'
+            # 设置命令为'BR'或'BG'
+            cmd = 'BR' if operation == 'BREAD' else 'BG'
+            # Format the message as "BR <key> [timeout]"
+            # 将消息格式化为"BR <key> [timeout]"
+            message_content = f"{cmd} {key}" if value is None else f"{cmd} {key} {value}"
+
+        # If operation is a prefix or range query streaming every matching tuple
+        # 如果操作是流式返回所有匹配元组的前缀或范围查询
+        elif operation in QUERY_OPERATIONS:
+            # Set command to 'QP' or 'QR' and format the message as "QP <prefix> [limit]" or "QR <start> <end> [limit]"
+            # 设置命令为'QP'或'QR'，将消息格式化为"QP <prefix> [limit]"或"QR <start> <end> [limit]"
+            cmd = 'QP' if operation == 'QUERY' else 'QR'
+            message_content = f"{cmd} {key}" if value is None else f"{cmd} {key} {value}"
+
+        # If operation is none of the above
+        # 如果操作不是以上任何一种
+        else:
+            # Return error message for invalid operation
+            # 返回无效操作的错误信息
+            return None, f"Invalid operation: {operation}"
+
+        # Binary requests are encoded from the same message content
+        # 二进制请求由相同的消息内容编码
+        if self.binary:
+            return self.build_binary_request(message_content)
+
+        # Calculate the message length in UTF-8 bytes and format the request
+        # 计算消息的UTF-8字节长度并格式化请求
+        message_length = 3 + 1 + byte_length(message_content)
+        if message_length > 999:
+            return None, f"Error: message too long for line: {line}"
+        request_msg = f"{message_length:03d} {message_content}"
+
+
+        return request_msg, None
+
+    # Encode message content such as "P <key> <value>" as a binary request frame
+    # The content is split the way the server splits text requests, so both protocols store the same tuples
+    # Returns (request_msg, None) on success or (None, error) when the content is invalid
+    # 将"P <key> <value>"等消息内容编码为二进制请求帧
+    # 按服务器拆分文本请求的方式拆分内容，使两种协议存储相同的元组
+    # 成功时返回(request_msg, None)，内容无效时返回(None, error)
+    def build_binary_request(self, message_content):
+        parts = message_content.split(maxsplit=2)
+        if len(parts) < 2:
+            return None, f"Missing key: {message_content}"
+        cmd, key = parts[0], parts[1]
+        argument = parts[2] if len(parts) > 2 else None
+
+        # READ and GET carry only the key
+        # READ和GET只携带键
+        if cmd in ('R', 'G'):
+            return encode_request(cmd, key), None
+        # PUT carries the value
+        # PUT携带值
+        if cmd == 'P':
+            if argument is None:
+                return None, f"PUT requires a value: {message_content}"
+            return encode_request(cmd, key, argument), None
+
+        # Queries carry the end key of a range as the value and the limit as the argument
+        # 查询把范围的结束键作为值，把数量上限作为参数
+        if cmd in ('QP', 'QR'):
+            words = argument.split() if argument is not None else []
+            end = ''
+            if cmd == 'QR':
+                if not words:
+                    return None, f"QR requires an end key: {message_content}"
+                end = words.pop(0)
+            limit = NO_ARGUMENT
+            if words:
+                if len(words) > 1 or not words[0].isdigit() or not 0 < int(words[0]) < NO_ARGUMENT:
+                    return None, f"Invalid limit: {message_content}"
+                limit = int(words[0])
+            return encode_request(cmd, key, end, limit), None
+
+        # PX carries the TTL and the value, BR/BG an optional timeout, both in milliseconds
+        # PX携带TTL和值，BR/BG携带可选的超时，单位均为毫秒
+        value = ''
+        if cmd == 'PX':
+            if argument is None or len(argument.split(maxsplit=1)) < 2:
+                return None, f"PX requires a TTL and a value: {message_content}"
+            argument, value = argument.split(maxsplit=1)
+        milliseconds = NO_ARGUMENT
+        if argument is not None:
+            kind = 'TTL' if cmd == 'PX' else 'timeout'
+            try:
+                milliseconds = round(float(argument) * 1000)
+            except ValueError:
+                return None, f"Invalid {kind}: {message_content}"
+            if not 0 <= milliseconds < NO_ARGUMENT:
+                return None, f"Invalid {kind}: {message_content}"
+        return encode_request(cmd, key, value, milliseconds), None
+
+    # Lazily turn request lines into (line, request_msg, error), skipping blank lines
+    # Nothing is read from the file ahead of what is being sent
+    # 惰性地将请求行转换为(line, request_msg, error)，跳过空行
+    # 不会提前读取尚未发送的行
+    def encode_requests(self, lines):
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            request_msg, error = self.build_request(line)
+            yield line, request_msg, error
+
     # Main method to run the client
+    # Uses the given connected socket when there is one, otherwise opens its own connection
+    # Returns the number of responses received
     # 运行客户端的主要方法
-    def run(self):
+    # 有给定的已连接套接字时使用它，否则自己打开连接
+    # 返回收到的响应数
+    def run(self, sock=None):
         try:
-            # Open and read the request file
-            # 打开并读取请求文件
+            # Open the request file; its lines are streamed while they are sent
+            # 打开请求文件，其中的行在发送时以流的方式读取
             with open(self.request_file, 'r') as file:
-                requests = file.readlines()
-
-            # Create a TCP socket and connect to the server
-            # 创建TCP套接字并连接到服务器
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.connect((self.host, self.port))
-
-                # Process each request line in the file
-                # 处理文件中的每个请求行
-                for line in requests:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # Parse the request line into parts
-                    # 将请求行分割成多个部分
-                    parts = line.split()
-                    if len(parts) < 2:
-                        print(f"Invalid request line: {line}")
-                        continue
-
-                    # Extract operation, key, and value from the request line
-                    # 从请求行中提取操作、键和值
-                    #operation
-                    operation = parts[0].upper()
-                    #key
-                    key = ' '.join(parts[1:-1]) if operation == 'PUT' else ' '.join(parts[1:])
-                    #value
-                    value = parts[-1] if operation == 'PUT' else None
-
-                    # Validate the collated size for PUT operations
-                    # 验证PUT操作的合并大小
-                    if operation == 'PUT':
-                        collated_size = len(key) + len(value) + 1  # +1 for space
-                        if collated_size > 970:
-                            print(f"Error: collated size exceeds limit for line: {line}")
-                            continue
-                    # Prepare the request message based on the operation
-                    # 根据操作类型准备请求消息
-                    #Check if the operation is 'READ'
-                    if operation == 'READ':
-                        # Set command to 'R' for READ operation
-                        cmd = 'R'
-                        # Format the message as "R <key>"
-                        message_content = f"{cmd} {key}"
-                    
-                    # If operation is not 'READ', check if it's 'GET'
-                    # 如果操作不是'READ'，检查是否是'GET'
-                    elif operation == 'GET':
-                        # Set command to 'G' for GET operation
-                        # 为GET操作设置命令为'G'
-                        cmd = 'G'
-                        # Format the message as "G <key>"
-                        # 将消息格式化为"G <key>"
-                        message_content = f"{cmd} {key}"
-                    
-                    # If operation is not 'READ' or 'GET', check if it's 'PUT'
-                    # 如果操作不是'READ'或'GET'，检查是否是'PUT'
-                    elif operation == 'PUT':
-                        # Set command to 'P' for PUT operation
-                        # 为PUT操作设置命令为'P'
-                        cmd = 'P'
-                        # Format the message as "P <key> <value>"
-                        # 将消息格式化为"P <key> <value>"
-                        message_content = f"{cmd} {key} {value}"
-
-                    # If operation is none of the above
-                    # 如果操作不是以上任何一种
-                    else:
-                        # Print error message for invalid operation
-                        # 打印无效操作的错误信息
-                        print(f"Invalid operation: {operation}")
-                        # Skip to next iteration of the loop
-                        # 跳过本次循环，继续下一次
-                        continue
-
-                    # Calculate the message length and format the request
-                    # 计算消息长度并格式化请求
-                    message_length = 3 + 1 + len(message_content) 
-                    if message_length > 999:
-                        print(f"Error: message too long for line: {line}")
-                        continue
-                    request_msg = f"{message_length:03d} {message_content}"
-
-                    # Send the request to the server
-                    # 向服务器发送请求
-                    sock.sendall(request_msg.encode('utf-8'))
-
-                    # Receive the response from the server
-                    # 接收服务器的响应
-                    response = sock.recv(1024).decode('utf-8').strip()
-
-                    # Parse the response into size and message
-                    # 将响应解析为大小和消息
-                    response_parts = response.split(' ', 1)
-                    # Validate that the response contains both size and message parts
-                    # If not, print error and skip to next request
-                    # 验证响应是否包含大小和消息两部分
-                    #如果不包含，打印错误并跳过处理下一个请求
-                    if len(response_parts) < 2:
-                        print(f"Invalid response format: {response}")
-                        continue
-                    # Extract the response size (should be 3-digit number)
-                    # 提取响应大小（应该是3位数字）
-                    response_size = response_parts[0]
-                    # Extract the actual response message content
-                    # This is everything after the first space
-                    # 提取实际的响应消息内容
-                    # 这是第一个空格后的所有内容
-                    response_msg = response_parts[1]
-
-                    print(f"{line}: {response_msg}")
+                # Use the given connection, or open one just for this file
+                # 使用给定的连接，或仅为该文件打开一个连接
+                if sock is not None:
+                    return self.send_requests(sock, file)
+
+                # Create a TCP socket and connect to the server
+                # 创建TCP套接字并连接到服务器
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                    sock.connect((self.host, self.port))
+                    # Switch the connection to the binary protocol when asked to
+                    # 需要时将连接切换为二进制协议
+                    if self.binary:
+                        negotiate(sock)
+                    return self.send_requests(sock, file)
         # Handle file not found error
         # 处理文件未找到错误
         except FileNotFoundError:
-            print(f"Error: File not found - {self.request_file}")
+            self.logger.error('file_not_found', "Error: File not found - {file}", file=self.request_file)
 
         # Handle connection refused error
         # 处理连接被拒绝错误
         except ConnectionRefusedError:
-            print("Error: Could not connect to the server")
+            self.logger.error('connect_failed', "Error: Could not connect to the server")
+            self.connection_lost = True
+
+        # Handle a server that declines the binary protocol
+        # 处理拒绝二进制协议的服务器
+        except ConnectionError as e:
+            self.logger.error('connection_error', "Error: {error}", error=str(e))
+            self.connection_lost = True
+        return self.completed
+
+    # Send the request lines (any iterable, read lazily) over a connected socket and print the results
+    # Returns the number of responses received
+    # 通过已连接的套接字发送请求行并打印结果
+    # 返回收到的响应数
+    def send_requests(self, sock, requests):
+        # Set once the connection can no longer be used
+        # 连接不可再用时设置
+        closed = threading.Event()
+        # Reader that splits the response stream into complete messages
+        # 将响应流拆分为完整消息的读取器
+        reader = BinaryFrameReader(RESPONSE_HEADER.size) if self.binary else FrameReader()
+
+        # With a window of 1, send each request and read its response in this thread,
+        # without a receiver thread, queue or semaphore
+        # 窗口为1时在本线程中逐条发送请求并读取响应，不需要接收线程、队列和信号量
+        if self.window == 1:
+            self.send_lines(sock, requests, lambda item: self.receive_one(reader, sock, item, None, closed),
+                            None, closed)
+            self.connection_lost = closed.is_set()
+            return self.completed
+
+        # Lines waiting for output, in file order
+        # 按文件顺序等待输出的行
+        in_flight = queue.Queue()
+        # Limits the number of requests sent but not yet answered
+        # 限制已发送但尚未收到响应的请求数量
+        window = threading.Semaphore(self.window)
+
+        # Start the thread that matches responses to lines
+        # 启动将响应与请求行匹配的线程
+        receiver = threading.Thread(
+            target=self.receive_responses,
+            args=(reader, sock, in_flight, window, closed)
+        )
+        receiver.start()
+
+        try:
+            self.send_lines(sock, requests, in_flight.put, window, closed)
+        finally:
+            # Tell the receiver that no more lines are coming
+            # 通知接收线程不会再有新的请求行
+            in_flight.put(None)
+            receiver.join()
+        self.connection_lost = closed.is_set()
+        return self.completed
+
+    # Send the request lines, batching them when asked to; pending takes each line (or error) waiting for output
+    # 发送请求行，需要时合并为批量；pending接收每个等待输出的行（或错误）
+    def send_lines(self, sock, requests, pending, window, closed):
+        # Lines of the batch being built and their request messages
+        # 正在构建的批量中的行及其请求消息
+        group = []
+        messages = []
+
+        # Process each request line in the file as it is read
+        # 在读取时处理文件中的每个请求行
+        for line, request_msg, error in self.encode_requests(requests):
+            if request_msg is None:
+                # Queue the error so it is printed in file order
+                # 将错误放入队列，使其按文件顺序打印
+                if group:
+                    group.append((None, error))
+                else:
+                    pending((None, error))
+                continue
+
+            # Queries stream many responses and are never batched; send the batch before them first
+            # 查询流式返回多条响应，不参与批量；先发送它之前的批量
+            if self.batch > 1 and self.is_query(line):
+                if messages:
+                    if not self.send(sock, format_batch(messages), (group, None), pending, window, closed):
+                        return
+                    group, messages = [], []
+                if not self.send(sock, request_msg, (line, None), pending, window, closed):
+                    return
+                continue
+
+            # Send single requests straight away
+            # 单条请求直接发送
+            # Binary responses are described from the request they answer
+            # 二进制响应根据其对应的请求来描述
+            if self.binary:
+                if not self.send(sock, request_msg, (line, request_msg), pending, window, closed):
+                    return
+                continue
+            if self.batch == 1:
+                if not self.send(sock, request_msg, (line, None), pending, window, closed):
+                    return
+                continue
+
+            # Group consecutive lines and send them once the batch is full
+            # 合并连续的行，批量满时发送
+            group.append((line, None))
+            messages.append(request_msg)
+            if len(messages) == self.batch:
+                if not self.send(sock, format_batch(messages), (group, None), pending, window, closed):
+                    return
+                group, messages = [], []
+
+        # Send the last, partly filled batch
+        # 发送最后一个未满的批量
+        if messages:
+            self.send(sock, format_batch(messages), (group, None), pending, window, closed)
+
+    # Send one message once the window has room and hand its lines to pending
+    # Without a window (None) the response is read right after sending
+    # Returns False when the connection can no longer be used
+    # 窗口有空位时发送一条消息，并把对应的行交给pending
+    # 没有窗口（None）时发送后立即读取响应
+    # 连接不可再用时返回False
+    def send(self, sock, message, item, pending, window, closed):
+        # Wait for a free slot in the window
+        # 等待窗口中出现空位
+        if window is not None:
+            window.acquire()
+        if closed.is_set():
+            return False
+        # Queue the lines before sending so the receiver expects the response
+        # 在发送之前放入队列，使接收线程等待该响应
+        if window is not None:
+            pending(item)
+
+        # Send the request to the server
+        # 向服务器发送请求
+        try:
+            sock.sendall(message if self.binary else message.encode('utf-8'))
+        except OSError:
+            # Wake the receiver so it can report the closed connection
+            # 唤醒接收线程以便报告连接已关闭
+            closed.set()
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return False
+        # Wait for the response of this request
+        # 等待该请求的响应
+        if window is None:
+            pending(item)
+            return not closed.is_set()
+        return True
+
+    # Receive responses in order and print them next to their request lines
+    # Runs in its own thread while run() keeps sending requests
+    # 按顺序接收响应并与对应的请求行一起打印
+    # 在独立线程中运行，同时run()继续发送请求
+    def receive_responses(self, reader, sock, in_flight, window, closed):
+        while True:
+            item = in_flight.get()
+            # No more lines to wait for
+            # 没有更多需要等待的行
+            if item is None:
+                return
+            self.receive_one(reader, sock, item, window, closed)
+
+    # Receive the response for one queued item and print it next to its lines
+    # window is None when requests are sent one at a time
+    # 接收一个队列项的响应并与对应的行一起打印
+    # 逐条发送请求时window为None
+    def receive_one(self, reader, sock, item, window, closed):
+        line, detail = item
+        # Print errors for invalid lines at their place in the file
+        # 在文件中对应的位置打印无效行的错误
+        if line is None:
+            self.logger.error('invalid_request', "{error}", error=detail)
+            return
+        # Skip the remaining lines once the connection is gone
+        # 连接断开后跳过剩余的行
+        if closed.is_set():
+            return
+
+        # Receive the next complete response from the server
+        # 接收服务器的下一条完整响应
+        response = self.read_response(reader, sock)
+        # A query answers one frame per matching tuple before its final response
+        # 查询在最终响应之前为每个匹配的元组返回一帧
+        if not isinstance(line, list) and self.is_query(line):
+            while response is not None and self.is_match(response):
+                self.print_match(line, response)
+                response = self.read_response(reader, sock)
+        if response is None:
+            self.logger.error('connection_closed', "Error: Server closed the connection")
+            # Unblock the sender so it notices the closed connection
+            # 解除发送方的阻塞，使其发现连接已关闭
+            closed.set()
+            if window is not None:
+                for _ in range(self.window):
+                    window.release()
+            return
+        # Free the window slot used by this request
+        # 释放该请求占用的窗口位置
+        if window is not None:
+            window.release()
+
+        # A batch carries the lines of several requests
+        # 批量消息对应多行请求
+        if isinstance(line, list):
+            self.print_batch(line, response)
+        elif self.binary:
+            self.print_binary_response(line, detail, response)
+        else:
+            self.print_response(line, response)
+
+    # Read the next complete response, or None once the connection is gone
+    # 读取下一条完整响应，连接断开时返回None
+    def read_response(self, reader, sock):
+        try:
+            return reader.read_frame(sock)
+        except OSError:
+            return None
+
+    # Whether a request line is a query
+    # 请求行是否为查询
+    def is_query(self, line):
+        return line.split(maxsplit=1)[0].upper() in QUERY_OPERATIONS
+
+    # Whether a response to a query is one matching tuple rather than the final response
+    # 查询的响应是否为一个匹配的元组而不是最终响应
+    def is_match(self, response):
+        if self.binary:
+            return response[RESPONSE_HEADER.size - 1] == STATUS_MATCH
+        response = response.strip()
+        return response[4:8] == 'OK (' and response.endswith(') matched')
+
+    # Print one tuple matched by a query next to the query line
+    # 将查询匹配的一个元组与查询行一起打印
+    def print_match(self, line, response):
+        # Quiet mode does not print matches; only the final response is counted
+        # 安静模式不打印匹配的元组，只统计最终响应
+        if self.quiet:
+            return
+        if self.binary:
+            key, value = decode_match(response)
+            self.logger.info('match', "{request}: OK ({key}, {value}) matched", request=line, key=key, value=value)
+        else:
+            self.logger.info('match', "{request}: {response}", request=line, response=response.strip()[4:])
+
+    # Print the responses of a batch next to its lines, in file order
+    # 按文件顺序将批量响应与对应的行一起打印
+    def print_batch(self, group, response):
+        response = response.strip()
+        # The server answers a rejected batch with a single error response
+        # 服务器拒绝整个批量时只返回一条错误响应
+        if not response.startswith(BATCH_MARKER):
+            responses = None
+        else:
+            try:
+                responses = iter(list(split_batch(response[BATCH_HEADER_SIZE:])))
+            except ValueError:
+                responses = None
+        for line, error in group:
+            if line is None:
+                self.logger.error('invalid_request', "{error}", error=error)
+            elif responses is None:
+                self.print_response(line, response)
+            else:
+                self.print_response(line, next(responses, ''))
+
+    # Print one response next to its request line
+    # 将一条响应与对应的请求行一起打印
+    def print_response(self, line, response):
+        self.completed += 1
+        # Quiet mode only counts the response
+        # 安静模式只统计响应
+        if self.quiet:
+            return
+        response = response.strip()
+
+        # Parse the response into size and message
+        # 将响应解析为大小和消息
+        response_parts = response.split(' ', 1)
+        # Validate that the response contains both size and message parts
+        # If not, print error and skip to next request
+        # 验证响应是否包含大小和消息两部分
+        #如果不包含，打印错误并跳过处理下一个请求
+        if len(response_parts) < 2:
+            self.logger.error('invalid_response', "Invalid response format: {response}", response=response)
+            return
+        # Extract the response size (should be 3-digit number)
+        # 提取响应大小（应该是3位数字）
+        response_size = response_parts[0]
+        # Extract the actual response message content
+        # This is everything after the first space
+        # 提取实际的响应消息内容
+        # 这是第一个空格后的所有内容
+        response_msg = response_parts[1]
+
+        self.logger.info('response', "{request}: {response}", request=line, response=response_msg)
+
+    # Print a binary response next to its request line, worded like the text protocol
+    # 将二进制响应与对应的请求行一起打印，措辞与文本协议相同
+    def print_binary_response(self, line, request, response):
+        self.completed += 1
+        # Quiet mode only counts the response
+        # 安静模式只统计响应
+        if self.quiet:
+            return
+        operation, key, _, value = decode_request(request)
+        try:
+            status, payload = decode_response(response)
+        except ValueError as e:
+            self.logger.error('invalid_response', "Invalid response format: {response}", response=str(e))
+            return
+        # PUTs are not echoed, so their value comes from the request
+        # PUT不回显值，因此其值取自请求
+        if status == STATUS_OK:
+            if operation in ('QP', 'QR'):
+                response_msg = f"OK {payload} tuples matched"
+            elif operation in ('P', 'PX'):
+                response_msg = f"OK ({key}, {value}) added"
+            else:
+                verb = 'read' if operation in ('R', 'BR') else 'removed'
+                response_msg = f"OK ({key}, {payload}) {verb}"
+        elif status == STATUS_NOT_FOUND:
+            response_msg = f"ERR {key} does not exist"
+        elif status == STATUS_EXISTS:
+            response_msg = f"ERR {key} already exists"
+        elif status == STATUS_ERROR:
+            response_msg = f"ERR {payload}"
+        else:
+            response_msg = f"Invalid response status: {status}"
+        self.logger.info('response', "{request}: {response}", request=line, response=response_msg)
+
+# Expand file names and glob patterns into request files, in natural order
+# Patterns that match nothing are kept so their error is reported
+# 将文件名和通配符展开为请求文件，按自然顺序排列
+# 没有匹配的模式保持不变，以便报告其错误
+def expand_request_files(patterns):
+    # Sort "client_2.txt" before "client_10.txt"
+    # 使"client_2.txt"排在"client_10.txt"之前
+    def natural_key(name):
+        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+    request_files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern), key=natural_key)
+        request_files.extend(matches or [pattern])
+    return request_files
+
+
+# Drive several request files concurrently over a bounded pool of connections
+# Each worker thread keeps one connection open and reuses it for the files it runs
+# Output is printed per file in the given order, followed by a summary
+# 通过有上限的连接池并发运行多个请求文件
+# 每个工作线程保持一个打开的连接，并在其运行的文件之间复用
+# 按给定顺序逐个文件打印输出，最后打印汇总
+def run_files(host, port, request_files, connections, window=1, batch=1, quiet=False, binary=False,
+              log_level='info', log_format='text'):
+    # Logger for the summary; the results of each file are collected by a logger of their own
+    # 用于汇总的日志记录器；每个文件的结果由各自的日志记录器收集
+    logger = Logger(log_level, log_format, lossy=False)
+    # Connection owned by each worker thread, and every connection opened
+    # 每个工作线程拥有的连接，以及所有打开过的连接
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+
+    # Run one file over the worker thread's connection, opening it when needed
+    # 在工作线程的连接上运行一个文件，需要时打开连接
+    def run_one(request_file):
+        output = io.StringIO()
+        file_logger = Logger(log_level, log_format, stream=output, lossy=False, context={'file': request_file})
+        client = TupleSpaceClient(host, port, request_file, window=window, batch=batch,
+                                  logger=file_logger, quiet=quiet, binary=binary)
+        sock = getattr(local, 'sock', None)
+        if sock is None:
+            try:
+                sock = socket.create_connection((host, port))
+            except ConnectionRefusedError:
+                file_logger.error('connect_failed', "Error: Could not connect to the server")
+                file_logger.flush()
+                return output.getvalue(), 0
+            with opened_lock:
+                opened.append(sock)
+            # Negotiate the binary protocol once per connection
+            # 每个连接只协商一次二进制协议
+            if binary:
+                try:
+                    negotiate(sock)
+                except ConnectionError as e:
+                    file_logger.error('connection_error', "Error: {error}", error=str(e))
+                    file_logger.flush()
+                    return output.getvalue(), 0
+            local.sock = sock
+        completed = client.run(sock)
+        # Do not reuse a connection the server closed
+        # 不复用已被服务器关闭的连接
+        if client.connection_lost:
+            local.sock = None
+        # Wait until every result of the file is written out
+        # 等待该文件的所有结果写出
+        file_logger.flush()
+        return output.getvalue(), completed
+
+    start = time.perf_counter()
+    total = 0
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            # map yields the results in file order as soon as each one is ready
+            # map在每个结果就绪后按文件顺序返回
+            for request_file, (output, completed) in zip(request_files, pool.map(run_one, request_files)):
+                # JSON records name their file instead of following a header
+                # JSON记录带有文件名，不使用标题行
+                if log_format == 'json':
+                    sys.stdout.write(output)
+                elif not quiet or output:
+                    sys.stdout.write(f"=== {request_file} ===\n{output}")
+                total += completed
+    finally:
+        for sock in opened:
+            sock.close()
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0
+    logger.info('summary', "Summary: {files} files, {requests} requests in {seconds:.2f}s ({rate:.0f} ops/sec)",
+                files=len(request_files), requests=total, seconds=elapsed, rate=rate)
+    logger.flush()
+
 
 # Main function to start the client
 # 主函数，启动客户端
 def main():
-    # Check if the correct number of arguments is provided
-    # 检查是否提供了正确数量的参数
-    if len(sys.argv) != 4:
-        print("Usage: python client.py <host> <port> <request_file>")
-        return
-    
+    # Parse the command line arguments
+    # 解析命令行参数
+    parser = argparse.ArgumentParser(usage="python client.py <host> <port> <request_file> [request_file ...] [options]")
+    parser.add_argument('host')
+    parser.add_argument('port')
+    parser.add_argument('request_files', nargs='+',
+                        help="request files or glob patterns such as 'client_*.txt'")
+    parser.add_argument('--window', type=int, default=1,
+                        help="number of requests sent ahead of their responses (default: 1)")
+    parser.add_argument('--batch', type=int, default=1,
+                        help="number of consecutive lines sent as one batch message (default: 1)")
+    parser.add_argument('--connections', type=int, default=4,
+                        help="maximum connections used to drive several files concurrently (default: 4)")
+    parser.add_argument('--quiet', action='store_true',
+                        help="do not print per-line results, only errors and a summary")
+    parser.add_argument('--binary', action='store_true',
+                        help="use the compact binary protocol instead of the text one")
+    parser.add_argument('--log-level', choices=list(LEVELS), default='info',
+                        help="least severe output printed; warning and above hide the results (default: info)")
+    parser.add_argument('--log-format', choices=LOG_FORMATS, default='text',
+                        help="plain text lines or one JSON object per line (default: text)")
+    args = parser.parse_args()
+    # Logger for errors and, with a single file, the results
+    # 用于错误以及单个文件时结果的日志记录器
+    logger = Logger(args.log_level, args.log_format, lossy=False)
+
     # Get host from command line arguments
     # 从命令行参数获取主机
-    host = sys.argv[1]
+    host = args.host
     try:
         # Convert the second command-line argument (port number) from string to integer
         # 将第二个命令行参数（端口号）从字符串转换为整数
-        port = int(sys.argv[2])
+        port = int(args.port)
 
         # Validate that the port number falls within the allowed range (50000-59999)
         # 验证端口号是否在允许范围内（50000-59999）
@@ -175,17 +776,52 @@ def main():
     except ValueError:
         # Print user-friendly error message about valid port requirements
         # 打印关于有效端口要求的用户友好错误信息
-        print("Error: Port must be a number between 50000 and 59999")
+        logger.error('invalid_arguments', "Error: Port must be a number between 50000 and 59999")
+        return
+
+    # The window must allow at least one request in flight
+    # 窗口至少允许一个在途请求
+    if args.window < 1:
+        logger.error('invalid_arguments', "Error: Window must be at least 1")
+        return
+
+    # A batch must contain at least one request
+    # 批量至少包含一条请求
+    if args.batch < 1:
+        logger.error('invalid_arguments', "Error: Batch must be at least 1")
+        return
+
+    # At least one connection is needed
+    # 至少需要一个连接
+    if args.connections < 1:
+        logger.error('invalid_arguments', "Error: Connections must be at least 1")
+        return
+
+    # The binary protocol has no batch messages
+    # 二进制协议没有批量消息
+    if args.binary and args.batch > 1:
+        logger.error('invalid_arguments', "Error: --binary cannot be combined with --batch")
         return
     
-    # Get the request file from command line arguments
+    # Get the request files from command line arguments
     # 从命令行参数获取请求文件
-    request_file = sys.argv[3]
+    request_files = expand_request_files(args.request_files)
 
-    # Create and run the client
-    # 创建并运行客户端
-    client = TupleSpaceClient(host, port, request_file)
-    client.run()
+    # Several files (or quiet mode) go through the concurrent driver
+    # 多个文件（或安静模式）使用并发驱动
+    if len(request_files) > 1 or args.quiet:
+        run_files(host, port, request_files, args.connections, window=args.window, batch=args.batch,
+                  quiet=args.quiet, binary=args.binary, log_level=args.log_level, log_format=args.log_format)
+        return
+
+    # Create and run the client; its logger writes the results in batches instead of one terminal write per line
+    # 创建并运行客户端；其日志记录器成批写出结果，而不是每行写一次终端
+    client = TupleSpaceClient(host, port, request_files[0], window=args.window, batch=args.batch,
+                              logger=logger, binary=args.binary)
+    try:
+        client.run()
+    finally:
+        logger.flush()
 
 # Entry point of the script
 # 脚本的入口点
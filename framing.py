@@ -0,0 +1,259 @@
+# 带长度前缀的消息流读取器 / Reader for length-prefixed message streams
+#
+# 协议中每条消息以3位长度前缀"NNN"开头，NNN为整条消息（含前缀和空格）UTF-8编码后的字节数。
+# TCP会合并或拆分消息，因此读取器把收到的字节追加到可增长的缓冲区中，
+# 并按长度前缀依次取出完整的消息。
+# Every message in the protocol starts with a 3-digit "NNN" prefix holding the
+# length in UTF-8 bytes of the whole message (prefix and space included), so
+# the reader can cut messages before decoding them. TCP may merge or
+# split messages, so the reader appends received bytes to a growable buffer
+# and pulls complete messages out of it in order using the length prefix.
+#
+# 缓冲区按需分配和增长：空闲的连接不占用缓冲区，一次接收的字节数从READ_SIZE起随流量翻倍直至
+# chunk_size，缓冲区因长消息超过chunk_size后在数据消费完时释放。asyncio流收到的bytes在缓冲区为空时
+# 直接使用，其中的完整消息不经复制即可取出，只有剩余的不完整消息才复制到缓冲区。
+# The buffer is allocated and grown on demand: an idle connection holds no
+# buffer, the bytes received per read start at READ_SIZE and double with the
+# traffic up to chunk_size, and a buffer grown past chunk_size by a long
+# message is released once its data is consumed. Bytes from an asyncio stream
+# are used as they are while the buffer is empty, so the complete messages in
+# them are popped without a copy; only a partial message left over is copied.
+#
+# 读取器还记录缓冲区中未接收完的消息从何时开始计时，每取出一条完整消息后重新计时，服务器据此
+# 对每条请求单独计算读超时。
+# The reader also tracks since when the partly received message in its buffer
+# has been waiting; the clock restarts after every complete message, so the
+# server applies the read timeout to each request on its own.
+#
+# 批量消息以"*"和8位长度开头（"*LLLLLLLL "），消息体是若干条普通的NNN消息。
+# A batch message starts with "*" and an 8-digit length ("*LLLLLLLL ") and its
+# body is a sequence of ordinary NNN messages.
+
+# 导入time模块用于未接收完的消息计时 / Import time module to time partly received messages
+import time
+
+# 长度前缀的位数 / Number of digits in the length prefix
+PREFIX_SIZE = 3
+# 合法消息的最小长度，如"005 R x" / Minimum valid message length, e.g. "005 R x"
+MIN_MESSAGE_SIZE = 5
+# 消息之间允许出现的空白字节 / Whitespace bytes tolerated between messages
+WHITESPACE = b' \t\r\n'
+# 第一次接收的字节数，之后随流量增长到chunk_size / Bytes of the first read; later reads grow with the traffic up to chunk_size
+READ_SIZE = 4096
+# 批量消息的标记字符 / Marker character of a batch message
+BATCH_MARKER = '*'
+# 批量消息长度前缀的位数 / Number of digits in the batch length prefix
+BATCH_PREFIX_SIZE = 8
+# 批量消息头的长度（标记+长度+空格） / Length of the batch header (marker, length and space)
+BATCH_HEADER_SIZE = 1 + BATCH_PREFIX_SIZE + 1
+
+
+# 文本的UTF-8字节数，即长度前缀使用的单位；纯ASCII文本不需要编码
+# Length of a text in UTF-8 bytes, the unit of the length prefixes; pure ASCII text needs no encoding
+def byte_length(text):
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+# 把若干条NNN消息打包成一条批量消息 / Pack several NNN messages into one batch message
+def format_batch(messages):
+    body = ''.join(messages)
+    # 长度按字节计算，与读取器一致 / The length counts bytes, like the reader does
+    size = BATCH_HEADER_SIZE + byte_length(body)
+    return f"{BATCH_MARKER}{size:0{BATCH_PREFIX_SIZE}d} {body}"
+
+
+# 依次取出批量消息体中的NNN消息 / Split the NNN messages out of a batch message body
+def split_batch(body):
+    # 长度前缀按字节计算，非ASCII的消息体按编码后的字节切分 / Prefixes count bytes, so a non-ASCII body is cut in its encoded form
+    ascii_only = body.isascii()
+    data = body if ascii_only else body.encode('utf-8')
+    whitespace = ' \t\r\n' if ascii_only else WHITESPACE
+    pos = 0
+    while pos < len(data):
+        # 跳过消息之间的空白 / Skip whitespace between messages
+        if data[pos:pos + 1] in whitespace:
+            pos += 1
+            continue
+        prefix = data[pos:pos + PREFIX_SIZE]
+        if not prefix.isdigit() or int(prefix) < MIN_MESSAGE_SIZE:
+            raise ValueError("Invalid length prefix in batch")
+        message = data[pos:pos + int(prefix)]
+        yield message if ascii_only else message.decode('utf-8', 'replace')
+        pos += int(prefix)
+
+
+# 定义FrameReader类 / Define FrameReader class
+class FrameReader:
+    # 初始化方法 / Initialization method
+    # max_batch_size限制接受的批量消息长度（None表示不限制） / max_batch_size caps the batch length accepted (None for no cap)
+    def __init__(self, chunk_size=65536, max_batch_size=None):
+        # 每次接收的最大字节数 / Maximum bytes received per read
+        self.chunk_size = chunk_size
+        # 批量消息的长度上限 / Cap on the length of a batch message
+        self.max_batch_size = max_batch_size
+        # 收到超过上限的批量消息后，声明的长度；之后不再取出消息
+        # Declared length of a batch that exceeded the cap; no messages are popped after it
+        self.oversized = None
+        # 接收缓冲区：尚未分配时为空的bytes，也可能是feed()直接使用的bytes
+        # Receive buffer: empty bytes until allocated, or the bytes feed() uses as they are
+        self.buffer = b''
+        # 下一次接收的字节数 / Bytes to receive on the next read
+        self.read_size = min(READ_SIZE, chunk_size)
+        # 数据由feed()提供时，每次都带来新的bytes，缓冲区消费完后不必保留
+        # When data comes from feed() every call brings new bytes, so the buffer need not be kept once consumed
+        self.fed = False
+        # 第一个未消费字节的位置 / Position of the first unconsumed byte
+        self.start = 0
+        # 有效数据的结束位置 / End position of valid data
+        self.end = 0
+        # 未接收完的消息开始计时的时间（time.monotonic()），尚未开始时为None
+        # When the clock of the partly received message started (time.monotonic()); None until it starts
+        self.partial_since = None
+
+    # 确保缓冲区是末尾至少有size字节空闲的bytearray / Make sure the buffer is a bytearray with at least size bytes free at the end
+    def reserve(self, size):
+        buffer = self.buffer
+        if isinstance(buffer, bytearray) and len(buffer) - self.end >= size:
+            return
+        pending = self.end - self.start
+        # 不可修改的bytes复制到新分配的缓冲区 / Copy immutable bytes into a newly allocated buffer
+        if not isinstance(buffer, bytearray):
+            self.buffer = bytearray(max(pending + size, self.read_size))
+            self.buffer[:pending] = buffer[self.start:self.end]
+            self.start = 0
+            self.end = pending
+            return
+        # 空间不足时先把未消费数据移到开头 / Move unconsumed data to the front first
+        if self.start > 0:
+            buffer[:pending] = buffer[self.start:self.end]
+            self.start = 0
+            self.end = pending
+        # 仍然不足则扩大缓冲区 / Grow the buffer if that is still not enough
+        if len(buffer) - self.end < size:
+            buffer.extend(bytes(size - (len(buffer) - self.end)))
+
+    # 从socket直接接收数据到缓冲区 / Receive data from a socket straight into the buffer
+    def fill(self, sock):
+        self.reserve(self.read_size)
+        # 使用memoryview避免额外复制 / Use a memoryview to avoid an extra copy
+        space = len(self.buffer) - self.end
+        received = sock.recv_into(memoryview(self.buffer)[self.end:])
+        self.end += received
+        # 填满了空闲空间，说明还有更多数据，下次多接收一些 / The free space was filled, so more data is waiting; read more next time
+        if received == space and self.read_size < self.chunk_size:
+            self.read_size = min(2 * self.read_size, self.chunk_size)
+        # 返回0表示对端已关闭 / A return value of 0 means the peer closed
+        return received
+
+    # 追加已收到的数据（用于asyncio流）；缓冲区为空时直接使用data而不复制
+    # Append data that was already received (used with asyncio streams); while the buffer is empty data is used without a copy
+    def feed(self, data):
+        self.fed = True
+        if self.start == self.end and isinstance(data, bytes):
+            self.buffer = data
+            self.start = 0
+            self.end = len(data)
+            return
+        self.reserve(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    # 取出一条完整消息之后，剩余数据的计时重新开始 / After popping a complete message the clock of the data left restarts
+    def popped(self):
+        self.partial_since = None
+        self.compact()
+
+    # 缓冲区中未接收完的消息开始计时的时间，缓冲区为空时返回None
+    # When the clock of the partly received message in the buffer started; None while the buffer is empty
+    def partial_started(self):
+        if self.start == self.end:
+            return None
+        if self.partial_since is None:
+            self.partial_since = time.monotonic()
+        return self.partial_since
+
+    # 已收到的数据以prefix开头时消费它并返回True，否则返回False；数据还不足以判断时返回None
+    # Consume prefix and return True when the received data starts with it, False otherwise; None while too little has arrived to tell
+    def consume(self, prefix):
+        data = bytes(self.buffer[self.start:min(self.end, self.start + len(prefix))])
+        if not prefix.startswith(data):
+            return False
+        if len(data) < len(prefix):
+            return None
+        self.start += len(prefix)
+        self.compact()
+        return True
+
+    # 取出下一条完整消息，不完整时返回None / Pop the next complete message, or None if incomplete
+    def next_frame(self):
+        buffer = self.buffer
+        # 跳过消息之间的空白 / Skip whitespace between messages
+        while self.start < self.end and buffer[self.start] in WHITESPACE:
+            self.start += 1
+        available = self.end - self.start
+        if available == 0 or self.oversized is not None:
+            self.compact()
+            return None
+
+        # 批量消息使用更宽的长度前缀 / Batch messages use a wider length prefix
+        if buffer[self.start] == ord(BATCH_MARKER):
+            digits_start, prefix_size, min_size = 1, 1 + BATCH_PREFIX_SIZE, BATCH_HEADER_SIZE
+        else:
+            digits_start, prefix_size, min_size = 0, PREFIX_SIZE, MIN_MESSAGE_SIZE
+        if available < prefix_size:
+            return None
+
+        # 解析长度前缀 / Parse the length prefix
+        prefix = buffer[self.start + digits_start:self.start + prefix_size]
+        if prefix.isdigit() and int(prefix) >= min_size:
+            length = int(prefix)
+            # 超过上限的批量不缓冲，丢弃已收到的数据，由上层回复错误并断开
+            # A batch over the cap is not buffered: the received data is dropped and the caller answers an error and disconnects
+            if digits_start and self.max_batch_size is not None and length > self.max_batch_size:
+                self.oversized = length
+                self.start = self.end
+                self.compact()
+                return None
+        else:
+            # 前缀无效时无法重新同步，把剩余数据作为一条消息交给上层报错
+            # An invalid prefix cannot be resynchronised; hand the rest over as one message so the caller reports it
+            length = available
+
+        if available < length:
+            return None
+
+        # 直接从缓冲区解码，不生成中间bytes对象 / Decode straight from the buffer without an intermediate bytes object
+        view = memoryview(buffer)[self.start:self.start + length]
+        frame = str(view, 'utf-8', 'replace')
+        view.release()
+        self.start += length
+        self.popped()
+        return frame
+
+    # 依次取出所有完整消息 / Pop every complete message in order
+    def frames(self):
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    # 阻塞读取下一条完整消息，连接关闭时返回None / Block until the next complete message, or None once the peer closes
+    def read_frame(self, sock):
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                return frame
+            if not self.fill(sock):
+                return None
+
+    # 缓冲区已全部消费时重置位置；数据由feed()提供或缓冲区因长消息超过chunk_size时释放缓冲区
+    # Reset positions once the buffer is fully consumed; the buffer is released when data comes from feed() or a long
+    # message grew it past chunk_size
+    def compact(self):
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+            self.partial_since = None
+            if self.fed or len(self.buffer) > self.chunk_size:
+                self.buffer = b''
@@ -0,0 +1,203 @@
+# 结构化日志 / Structured logging
+#
+# 记录事件时只把(记录器, 时间, 级别, 事件名, 消息模板, 字段)放入队列，不做任何格式化；后台线程成批取出
+# 记录，格式化为文本或JSON行，每批对每个输出流只写一次。低于日志级别的事件在一次整数比较后即被丢弃，
+# 逐请求的事件另外按采样率只记录其中一部分。
+# Logging an event only queues (logger, time, level, event name, message
+# template, fields) without formatting anything; a background thread drains the
+# records in batches, formats them as text or JSON lines and writes each batch
+# to each stream at once. Events below the log level are dropped after one
+# integer comparison, and per-request events are further sampled.
+#
+# 文本格式输出填入字段后的消息，与print的输出相同；JSON格式每行一个对象：
+# The text format prints the message with its fields filled in, as print() did; the JSON format prints one object per line:
+#   {"time": 1760000000.123456, "level": "info", "event": "server_started", "message": "Server started on port 50000", "port": 50000}
+
+# 导入atexit模块用于退出前写出剩余记录 / Import atexit module to write the remaining records before exiting
+import atexit
+# 导入itertools模块用于请求采样计数 / Import itertools module to count sampled requests
+import itertools
+# 导入json模块用于JSON行格式 / Import json module for the JSON lines format
+import json
+# 导入os模块用于fork后重建写线程 / Import os module to rebuild the writer thread after a fork
+import os
+# 导入queue模块用于记录队列 / Import queue module for the record queue
+import queue
+# 导入sys模块用于默认输出流 / Import sys module for the default stream
+import sys
+# 导入threading模块用于后台写线程 / Import threading module for the background writer thread
+import threading
+# 导入time模块用于记录时间 / Import time module to timestamp records
+import time
+
+# 日志级别 / Log levels
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+LEVEL_NAMES = {number: name for name, number in LEVELS.items()}
+# 输出格式 / Output formats
+LOG_FORMATS = ('text', 'json')
+# 队列中待写记录的上限，超过时丢弃或等待 / Records allowed to wait in the queue before logging drops or waits
+QUEUE_SIZE = 1 << 16
+# 每批最多写出的记录数 / Most records written per batch
+BATCH_SIZE = 4096
+# 两批之间等待记录积累的秒数，避免每条记录都唤醒写线程 / Seconds records accumulate between batches, so the writer is not woken for every record
+WRITE_INTERVAL = 0.05
+
+# 进程内共享的记录队列和写线程，首次记录时启动 / Record queue and writer thread shared by the process, started on the first record
+_queue = queue.SimpleQueue()
+_writer = None
+_writer_lock = threading.Lock()
+# 要求写线程立即写出下一批 / Asks the writer to write the next batch right away
+_wake = threading.Event()
+
+
+# 启动后台写线程 / Start the background writer thread
+def _start_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_forever, name='log-writer', daemon=True)
+            _writer.start()
+
+
+# fork出的子进程没有父进程的写线程，使用新的队列并在需要时重新启动
+# A forked child has no copy of the parent's writer thread, so it uses a new queue and starts its own when needed
+def _after_fork():
+    global _queue, _writer, _writer_lock, _wake
+    _queue = queue.SimpleQueue()
+    _writer = None
+    _writer_lock = threading.Lock()
+    _wake = threading.Event()
+
+
+# 成批取出队列中的记录并写出 / Drain the queued records in batches and write them
+def _write_forever():
+    while True:
+        batch = [_queue.get()]
+        # 已排队的其余记录一起写出 / Write the rest of the queued records along with it
+        try:
+            while len(batch) < BATCH_SIZE:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+        _write_batch(batch)
+        # 队列已取空时让下一批记录积累起来，等待刷新的调用方会提前唤醒
+        # Once the queue is drained let the next batch accumulate; a caller waiting for a flush wakes the writer early
+        if len(batch) < BATCH_SIZE:
+            _wake.wait(WRITE_INTERVAL)
+            _wake.clear()
+
+
+# 格式化一批记录，每个输出流只写一次；之前的记录都写出后才通知等待刷新的调用方
+# Format a batch of records with one write per stream; callers waiting for a flush are only told once every record before it is written
+def _write_batch(batch):
+    lines = {}
+    flushed = []
+    for record in batch:
+        logger = record[0]
+        # 刷新标记 / Flush marker
+        if logger is None:
+            flushed.append(record[1])
+            continue
+        try:
+            line = logger.format_record(record)
+        except (KeyError, IndexError, ValueError) as e:
+            line = f"Invalid log record {record[3]}: {e}\n"
+        lines.setdefault(logger.stream, []).append(line)
+    for stream, parts in lines.items():
+        try:
+            stream.write(''.join(parts))
+            stream.flush()
+        # 输出流已关闭或管道已断开时丢弃 / Drop them when the stream is closed or the pipe is broken
+        except (OSError, ValueError):
+            pass
+    for done in flushed:
+        done.set()
+
+
+# 等待已排队的记录全部写出 / Wait until every queued record is written
+def flush():
+    if _writer is None:
+        return
+    done = threading.Event()
+    _queue.put((None, done))
+    _wake.set()
+    done.wait()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush)
+
+
+# 定义Logger类：按级别过滤事件并交给后台线程写出 / Define Logger class: filters events by level and hands them to the background writer
+class Logger:
+    # 初始化方法；sample为记录的请求比例，只在debug级别生效；lossy为True时队列满了就丢弃记录，否则等待写出
+    # Initialization method; sample is the fraction of requests logged, at the debug level only; when lossy is
+    # True records are dropped while the queue is full, otherwise logging waits for them to be written
+    def __init__(self, level='info', log_format='text', stream=None, sample=0.0, lossy=True, context=None):
+        self.level = LEVELS[level]
+        self.log_format = log_format
+        self.stream = stream if stream is not None else sys.stdout
+        self.lossy = lossy
+        # 每条JSON记录都带上的字段 / Fields added to every JSON record
+        self.context = context or {}
+        # 每隔多少个请求记录一个，0表示不记录请求 / Log one request in this many; 0 logs none
+        self.sample_every = round(1 / sample) if sample > 0 and self.level <= DEBUG else 0
+        self.requests = itertools.count()
+        # 队列满时丢弃的记录数 / Records dropped while the queue was full
+        self.dropped = 0
+
+    # 是否记录当前请求，调用前应先检查sample_every / Whether to log the current request; check sample_every first
+    def sample(self):
+        return next(self.requests) % self.sample_every == 0
+
+    # 记录一个事件，消息模板和字段在后台线程中格式化 / Log an event; the message template and fields are formatted by the background thread
+    def log(self, level, event, message, **fields):
+        if level >= self.level:
+            self.submit(level, event, message, fields)
+
+    def debug(self, event, message, **fields):
+        if DEBUG >= self.level:
+            self.submit(DEBUG, event, message, fields)
+
+    def info(self, event, message, **fields):
+        if INFO >= self.level:
+            self.submit(INFO, event, message, fields)
+
+    def warning(self, event, message, **fields):
+        if WARNING >= self.level:
+            self.submit(WARNING, event, message, fields)
+
+    def error(self, event, message, **fields):
+        if ERROR >= self.level:
+            self.submit(ERROR, event, message, fields)
+
+    # 把已通过级别检查的记录放入队列 / Queue a record that passed the level check
+    def submit(self, level, event, message, fields):
+        if _writer is None:
+            _start_writer()
+        # 写出跟不上时保护内存 / Keep memory bounded when writing falls behind
+        if _queue.qsize() >= QUEUE_SIZE:
+            if self.lossy:
+                self.dropped += 1
+                return
+            flush()
+        _queue.put((self, time.time(), level, event, message, fields))
+
+    # 等待已记录的事件全部写出 / Wait until every logged event is written
+    def flush(self):
+        flush()
+
+    # 把一条记录格式化为一行（在后台线程中调用） / Format one record as a line (called by the background thread)
+    def format_record(self, record):
+        _, created, level, event, message, fields = record
+        text = message.format(**fields) if fields else message
+        if self.log_format == 'text':
+            return text + '\n'
+        entry = {'time': round(created, 6), 'level': LEVEL_NAMES[level], 'event': event, 'message': text}
+        entry.update(self.context)
+        entry.update(fields)
+        return json.dumps(entry, default=str) + '\n'
@@ -0,0 +1,211 @@
+# 服务器性能指标 / Server performance metrics
+#
+# 每个R/G/P操作的服务时间和等锁时间记录在HDR风格的直方图中（每个2的幂区间再分为4个子桶），
+# 直方图按分片保存，并在持有该分片锁时更新，因此记录时不需要额外的锁。每个连接的字节数和
+# 消息大小只由处理该连接的线程或协程更新。指标以Prometheus文本格式通过本地HTTP端口导出。
+# The service time and lock-wait time of every R/G/P operation are recorded in
+# HDR-style histograms (every power-of-two range split into 4 sub-buckets).
+# The histograms are kept per shard and updated while that shard's lock is
+# held, so recording needs no extra lock. The bytes and message sizes of a
+# connection are only updated by the thread or coroutine serving it. Metrics
+# are exported in the Prometheus text format over a local HTTP port.
+
+# 导入bisect模块用于查找直方图桶 / Import bisect module to find histogram buckets
+import bisect
+# 导入threading模块用于连接登记锁和HTTP线程 / Import threading module for the connection registry lock and the HTTP thread
+import threading
+# 导入HTTP服务器用于导出指标 / Import the HTTP server used to export metrics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 记录延迟的操作 / Operations whose latency is recorded
+OPERATIONS = ('R', 'G', 'P')
+# 延迟直方图的桶上界（纳秒），从约1微秒到约15秒 / Latency bucket upper bounds (ns), from about 1us to about 15s
+LATENCY_BOUNDS_NS = [(1024 << exponent) + ((1024 << exponent) * sub_bucket >> 2)
+                     for exponent in range(24) for sub_bucket in range(4)]
+# 消息大小直方图的桶上界（字节） / Message size bucket upper bounds (bytes)
+SIZE_BOUNDS = [1 << exponent for exponent in range(3, 25)]
+
+
+# 定义Histogram类：固定桶的直方图，调用方负责同步 / Define Histogram class: fixed-bucket histogram, callers synchronise
+class Histogram:
+    # 初始化方法 / Initialization method
+    def __init__(self, bounds):
+        # 各桶的上界 / Upper bound of each bucket
+        self.bounds = bounds
+        # 各桶的计数，最后一个桶没有上界 / Count of each bucket, the last one is unbounded
+        self.counts = [0] * (len(bounds) + 1)
+        # 所有记录值之和 / Sum of every recorded value
+        self.total = 0
+
+    # 记录一个值 / Record one value
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    # 合并另一个直方图 / Merge another histogram into this one
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+
+
+# 定义ShardMetrics类：一个分片的操作延迟（持有分片锁时更新）
+# Define ShardMetrics class: operation latencies of one shard (updated with the shard lock held)
+class ShardMetrics:
+    # 初始化方法 / Initialization method
+    def __init__(self):
+        # 每种操作的服务时间，含等锁时间 / Service time of each operation, lock wait included
+        self.service = {operation: Histogram(LATENCY_BOUNDS_NS) for operation in OPERATIONS}
+        # 每种操作的等锁时间 / Lock-wait time of each operation
+        self.lock_wait = {operation: Histogram(LATENCY_BOUNDS_NS) for operation in OPERATIONS}
+
+    # 记录一次操作 / Record one operation
+    def record(self, operation, lock_wait_ns, service_ns):
+        self.lock_wait[operation].record(lock_wait_ns)
+        self.service[operation].record(service_ns)
+
+
+# 定义ConnectionMetrics类：一个连接的流量（只由该连接的处理者更新）
+# Define ConnectionMetrics class: traffic of one connection (only updated by whoever serves it)
+class ConnectionMetrics:
+    # 初始化方法 / Initialization method
+    def __init__(self, peer):
+        # 对端地址 / Peer address
+        self.peer = peer
+        # 收发字节数 / Bytes received and sent
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # 请求消息大小 / Request message sizes
+        self.message_sizes = Histogram(SIZE_BOUNDS)
+
+    # 在取出请求的同时记录其大小 / Record the size of each request as it is taken
+    def count(self, requests):
+        for request in requests:
+            self.message_sizes.record(len(request))
+            yield request
+
+
+# 把socket地址格式化为标签值 / Format a socket address as a label value
+def peer_name(address):
+    if isinstance(address, tuple):
+        return f"{address[0]}:{address[1]}"
+    # Unix域套接字（工作进程之间的转发）没有地址 / Unix domain sockets (forwarding between workers) have no address
+    return address or 'local'
+
+
+# 定义ServerMetrics类：服务器的所有指标 / Define ServerMetrics class: every metric of a server
+class ServerMetrics:
+    # 初始化方法 / Initialization method
+    def __init__(self, tuple_space):
+        # 元组空间，导出时用其分片锁 / Tuple space, whose shard locks are taken when exporting
+        self.tuple_space = tuple_space
+        # 每个分片的操作延迟 / Operation latencies of each shard
+        self.shards = [ShardMetrics() for _ in tuple_space.shards]
+        # 保护连接登记和已关闭连接合计的锁 / Lock guarding the connection registry and closed-connection totals
+        self.lock = threading.Lock()
+        # 活动连接 / Open connections
+        self.connections = set()
+        # 已关闭连接的合计 / Totals of closed connections
+        self.closed = ConnectionMetrics('closed')
+
+    # 登记新连接 / Register a new connection
+    def open_connection(self, address):
+        connection = ConnectionMetrics(peer_name(address))
+        with self.lock:
+            self.connections.add(connection)
+        return connection
+
+    # 注销连接并并入合计 / Unregister a connection and fold it into the totals
+    def close_connection(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+            self.closed.bytes_in += connection.bytes_in
+            self.closed.bytes_out += connection.bytes_out
+            self.closed.message_sizes.merge(connection.message_sizes)
+
+    # 以Prometheus文本格式导出指标 / Export the metrics in the Prometheus text format
+    def render(self, stats):
+        lines = []
+
+        # 服务器统计 / Server statistics
+        for name, value in stats.items():
+            kind = 'counter' if name.startswith('total_') else 'gauge'
+            lines.append(f"# TYPE tuplespace_{name} {kind}")
+            lines.append(f"tuplespace_{name} {value}")
+
+        # 合并各分片的延迟直方图 / Merge the latency histograms of every shard
+        service = {operation: Histogram(LATENCY_BOUNDS_NS) for operation in OPERATIONS}
+        lock_wait = {operation: Histogram(LATENCY_BOUNDS_NS) for operation in OPERATIONS}
+        for shard, metrics in zip(self.tuple_space.shards, self.shards):
+            with shard.lock:
+                for operation in OPERATIONS:
+                    service[operation].merge(metrics.service[operation])
+                    lock_wait[operation].merge(metrics.lock_wait[operation])
+        for name, histograms in (('op_service_seconds', service), ('op_lock_wait_seconds', lock_wait)):
+            lines.append(f"# TYPE tuplespace_{name} histogram")
+            for operation, histogram in histograms.items():
+                render_histogram(lines, f"tuplespace_{name}", f'op="{operation}"', histogram, 1e-9)
+
+        # 连接流量：合计加上每个活动连接 / Connection traffic: totals plus every open connection
+        with self.lock:
+            connections = list(self.connections)
+            totals = ConnectionMetrics('all')
+            for connection in [self.closed] + connections:
+                totals.bytes_in += connection.bytes_in
+                totals.bytes_out += connection.bytes_out
+                totals.message_sizes.merge(connection.message_sizes)
+        lines.append("# TYPE tuplespace_bytes_received_total counter")
+        lines.append(f"tuplespace_bytes_received_total {totals.bytes_in}")
+        lines.append("# TYPE tuplespace_bytes_sent_total counter")
+        lines.append(f"tuplespace_bytes_sent_total {totals.bytes_out}")
+        lines.append("# TYPE tuplespace_request_size_bytes histogram")
+        render_histogram(lines, "tuplespace_request_size_bytes", None, totals.message_sizes, 1)
+        lines.append("# TYPE tuplespace_open_connections gauge")
+        lines.append(f"tuplespace_open_connections {len(connections)}")
+        lines.append("# TYPE tuplespace_connection_bytes_received_total counter")
+        for connection in connections:
+            lines.append(f'tuplespace_connection_bytes_received_total{{peer="{connection.peer}"}} {connection.bytes_in}')
+        lines.append("# TYPE tuplespace_connection_bytes_sent_total counter")
+        for connection in connections:
+            lines.append(f'tuplespace_connection_bytes_sent_total{{peer="{connection.peer}"}} {connection.bytes_out}')
+        return '\n'.join(lines) + '\n'
+
+
+# 按Prometheus格式输出一个直方图（桶为累计计数） / Write one histogram in the Prometheus format (cumulative buckets)
+def render_histogram(lines, name, labels, histogram, scale):
+    prefix = f"{labels}," if labels else ""
+    suffix = f"{{{labels}}}" if labels else ""
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound * scale:.9g}"}} {cumulative}')
+    cumulative += histogram.counts[-1]
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+    lines.append(f"{name}_sum{suffix} {histogram.total * scale:.9g}")
+    lines.append(f"{name}_count{suffix} {cumulative}")
+
+
+# 在后台线程中通过本地HTTP端口提供/metrics / Serve /metrics over a local HTTP port from a background thread
+def serve_metrics(port, render):
+    # 定义请求处理类 / Define the request handler class
+    class MetricsHandler(BaseHTTPRequestHandler):
+        # 处理GET请求 / Handle GET requests
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        # 不为每次抓取打印日志 / Do not log every scrape
+        def log_message(self, format, *args):
+            pass
+
+    http_server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    http_server.daemon_threads = True
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return http_server
@@ -0,0 +1,224 @@
+# 元组空间的持久化层 / Persistence layer of the tuple space
+#
+# 每个成功的PUT和GET都以一行JSON追加到预写日志（wal-NNNNNNNN.log），过期和驱逐按GET记录，带TTL的PUT
+# 记录其绝对过期时间。定期把整个元组空间
+# 写成快照，并切换到新的日志文件，旧日志随后删除。启动时先加载快照，再按顺序重放快照之后的日志。
+# Every successful PUT and GET is appended as one JSON line to the write-ahead
+# log (wal-NNNNNNNN.log); expirations and evictions are logged like GETs and a
+# PUT with a TTL carries its absolute expiry time. The whole tuple space is periodically written to a
+# snapshot and the log switches to a new file, after which the old logs are
+# deleted. On startup the snapshot is loaded and the newer logs replayed in order.
+#
+# fsync策略 / fsync policies:
+#   always - 每条记录写入后立即fsync / fsync after every record
+#   group  - 后台线程批量写入并fsync，响应在记录落盘后才发送（组提交）
+#            a background thread writes and fsyncs records in groups; responses
+#            are only sent once their records are on disk (group commit)
+#   none   - 只写入操作系统，不fsync / write to the OS only, never fsync
+
+# 导入json模块用于记录和快照编码 / Import json module to encode records and snapshots
+import json
+# 导入os模块用于文件操作和fsync / Import os module for file handling and fsync
+import os
+# 导入threading模块用于组提交线程 / Import threading module for the group commit thread
+import threading
+# 导入time模块用于判断恢复时已过期的元组 / Import time module to skip tuples that expired before recovery
+import time
+
+# 支持的fsync策略 / Supported fsync policies
+FSYNC_POLICIES = ('always', 'group', 'none')
+# 快照文件名 / Snapshot file name
+SNAPSHOT_FILE = 'snapshot.json'
+
+
+# 返回某一代日志的路径 / Return the path of one log generation
+def log_path(data_dir, generation):
+    return os.path.join(data_dir, f"wal-{generation:08d}.log")
+
+
+# 按顺序返回目录中所有日志的代号 / Return the generations of every log in the directory, in order
+def log_generations(data_dir):
+    generations = []
+    for name in os.listdir(data_dir):
+        if name.startswith('wal-') and name.endswith('.log'):
+            generations.append(int(name[4:-4]))
+    return sorted(generations)
+
+
+# 定义WriteAheadLog类：预写日志和快照 / Define WriteAheadLog class: write-ahead log and snapshots
+class WriteAheadLog:
+    # 初始化方法 / Initialization method
+    def __init__(self, data_dir, fsync='group'):
+        # 数据目录 / Data directory
+        self.data_dir = data_dir
+        # fsync策略 / fsync policy
+        self.fsync = fsync
+        # 保护待写记录和计数的锁 / Lock guarding pending records and counters
+        self.lock = threading.Lock()
+        # 有新记录或记录落盘时通知 / Notified when records arrive or reach the disk
+        self.changed = threading.Condition(self.lock)
+        # 保护日志文件写入和切换的锁 / Lock guarding log file writes and switches
+        self.io_lock = threading.Lock()
+        # 等待组提交的记录 / Records waiting for the group commit
+        self.pending = []
+        # 已追加和已落盘的记录数 / Number of records appended and on disk
+        self.appended = 0
+        self.synced = 0
+        # 最近快照所覆盖的日志代号 / Log generation covered by the latest snapshot
+        self.snapshot_generation = 0
+        # 当前日志的代号和文件 / Generation and file of the current log
+        self.generation = 0
+        self.file = None
+        os.makedirs(data_dir, exist_ok=True)
+
+    # 加载快照并重放之后的日志，返回重放的记录数 / Load the snapshot and replay the newer logs; returns the records replayed
+    def load(self, tuple_space):
+        # 恢复时已过期的元组不再加载 / Tuples that expired before recovery are not loaded
+        now = time.time()
+        path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                snapshot = json.load(file)
+            self.snapshot_generation = snapshot['generation']
+            deadlines = snapshot.get('deadlines', {})
+            for key, value in snapshot['tuples'].items():
+                deadline = deadlines.get(key)
+                if deadline is None or deadline > now:
+                    tuple_space.shard_for(key).store(key, value, deadline)
+
+        replayed = 0
+        for generation in log_generations(self.data_dir):
+            # 快照已包含的日志跳过 / Skip logs already contained in the snapshot
+            if generation <= self.snapshot_generation:
+                continue
+            with open(log_path(self.data_dir, generation), encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的记录，之后没有有效数据 / A record torn by a crash, nothing valid follows
+                        break
+                    shard = tuple_space.shard_for(record[1])
+                    if record[0] == 'P':
+                        deadline = record[3] if len(record) > 3 else None
+                        if deadline is None or deadline > now:
+                            shard.store(record[1], record[2], deadline)
+                    elif record[1] in shard.tuples:
+                        shard.remove(record[1])
+                    replayed += 1
+        return replayed
+
+    # 开始写入新一代日志 / Start writing a new log generation
+    def open(self):
+        # 不追加到可能被截断的旧日志 / Never append to an old log that may end in a torn record
+        generations = log_generations(self.data_dir)
+        self.generation = max(generations[-1] if generations else 0, self.snapshot_generation) + 1
+        self.file = open(log_path(self.data_dir, self.generation), 'a', encoding='utf-8')
+        if self.fsync == 'group':
+            threading.Thread(target=self.flush_periodically, daemon=True).start()
+
+    # 恢复元组空间并准备写入，返回重放的记录数 / Recover the tuple space and get ready to write; returns the records replayed
+    def recover(self, tuple_space):
+        replayed = self.load(tuple_space)
+        self.open()
+        return replayed
+
+    # 追加一条记录（调用时持有键所属分片的锁，保证与操作顺序一致）
+    # Append one record (called with the key's shard lock held, so the log order matches the operation order)
+    def append(self, record):
+        line = json.dumps(record) + '\n'
+        if self.fsync == 'group':
+            with self.lock:
+                self.pending.append(line)
+                self.appended += 1
+                self.changed.notify_all()
+        else:
+            with self.io_lock:
+                self.file.write(line)
+                self.file.flush()
+                if self.fsync == 'always':
+                    os.fsync(self.file.fileno())
+
+    # 记录一次成功的PUT，deadline为可选的过期时间 / Record a successful PUT; deadline is an optional expiry time
+    def append_put(self, key, value, deadline=None):
+        self.append(['P', key, value] if deadline is None else ['P', key, value, deadline])
+
+    # 记录一次成功的GET / Record a successful GET
+    def append_get(self, key):
+        self.append(['G', key])
+
+    # 等待目前为止追加的记录全部落盘（仅组提交需要） / Wait until every record appended so far is on disk (group commit only)
+    def sync(self):
+        if self.fsync != 'group':
+            return
+        with self.lock:
+            target = self.appended
+            while self.synced < target:
+                self.changed.wait()
+
+    # 组提交线程：一次写入并fsync所有待写记录 / Group commit thread: write and fsync all pending records at once
+    def flush_periodically(self):
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.changed.wait()
+            with self.io_lock:
+                self.write_pending()
+
+    # 写入并fsync待写记录（调用时持有io_lock） / Write and fsync the pending records (called with io_lock held)
+    def write_pending(self):
+        with self.lock:
+            lines, self.pending = self.pending, []
+            target = self.appended
+        if lines:
+            self.file.write(''.join(lines))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        with self.lock:
+            self.synced = max(self.synced, target)
+            self.changed.notify_all()
+
+    # 关闭当前日志并开始新一代，返回已关闭的代号（调用时所有分片已锁定）
+    # Close the current log and start a new generation; returns the closed one (called with every shard locked)
+    def rotate(self):
+        with self.io_lock:
+            self.write_pending()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            closed = self.generation
+            self.generation += 1
+            self.file = open(log_path(self.data_dir, self.generation), 'a', encoding='utf-8')
+        return closed
+
+    # 写入快照并删除它已包含的日志 / Write a snapshot and delete the logs it contains
+    def snapshot(self, tuple_space):
+        # 锁定所有分片，复制一个一致的状态 / Lock every shard to copy a consistent state
+        with tuple_space.locked():
+            tuples = {}
+            deadlines = {}
+            for shard in tuple_space.shards:
+                tuples.update(shard.tuples)
+                deadlines.update(shard.deadlines)
+            generation = self.rotate()
+
+        # 先写临时文件再原子替换 / Write a temporary file, then replace atomically
+        path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'generation': generation, 'tuples': tuples, 'deadlines': deadlines}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+        # 确保目录项也已落盘 / Make sure the directory entry is on disk too
+        dir_fd = os.open(self.data_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        self.snapshot_generation = generation
+
+        # 截断：删除快照已包含的日志 / Truncate: delete the logs the snapshot contains
+        for old in log_generations(self.data_dir):
+            if old <= generation:
+                os.remove(log_path(self.data_dir, old))
+        return len(tuples)
@@ -0,0 +1,290 @@
+# 主从复制 / Primary-follower replication
+#
+# 主节点把每个成功的修改（与预写日志相同的PUT和GET记录，过期和驱逐按GET记录）按全局序号追加到
+# 内存中的环形缓冲区，并在独立的复制端口上把记录流式发送给从节点。从节点把记录应用到自己的元组
+# 空间，只在本地处理读请求。记录在持有键所属分片锁时追加，因此每个键的修改顺序与主节点一致。
+# The primary appends every successful mutation (the same PUT and GET records as
+# the write-ahead log, expirations and evictions logged as GETs) to an in-memory
+# ring buffer under a global sequence number, and streams the records to the
+# followers on a separate replication port. A follower applies them to its own
+# tuple space and only serves reads locally. Records are appended with the key's
+# shard lock held, so every key sees its mutations in the primary's order.
+#
+# 协议为每行一个JSON数组 / The protocol carries one JSON array per line:
+#   从节点 / follower: SYNC <epoch> <next_seq>            首次连接时epoch为"-" / epoch is "-" on the first connection
+#   主节点 / primary:  ["resume", epoch, seq]             从seq继续，从节点保留现有状态 / continue from seq, the follower keeps its state
+#                      ["snapshot", epoch, seq, count]    之后count行[key, value, deadline]即序号seq时的完整状态
+#                                                         the next count lines [key, value, deadline] are the whole state at seq
+#                      [seq, "P", key, value(, deadline)] 一次PUT / one PUT
+#                      [seq, "G", key]                    一次GET / one GET
+#                      ["sync", seq]                      主节点的下一个序号，空闲时每秒发送一次
+#                                                         the primary's next sequence number, sent every second when idle
+#
+# 主节点重启后epoch改变；从节点请求的记录已不在缓冲区中（落后太多）或epoch不符时，主节点先发送快照。
+# The epoch changes when the primary restarts; when the records a follower asks
+# for have left the buffer (it fell too far behind) or the epoch does not match,
+# the primary sends a snapshot first.
+
+# 导入json模块用于记录编码 / Import json module to encode records
+import json
+# 导入os模块用于生成epoch / Import os module to generate the epoch
+import os
+# 导入socket模块用于复制连接 / Import socket module for replication connections
+import socket
+# 导入threading模块用于发送和跟随线程 / Import threading module for the streaming and following threads
+import threading
+# 导入time模块用于心跳和延迟计算 / Import time module for heartbeats and lag
+import time
+
+# 主节点为从节点保留的默认记录数 / Default number of records the primary keeps for followers
+DEFAULT_BACKLOG = 1 << 20
+# 每次发送的最大记录数 / Maximum records sent per write
+STREAM_BATCH_SIZE = 1024
+# 快照每次发送的元组数 / Tuples sent per write of a snapshot
+SNAPSHOT_BATCH_SIZE = 1024
+# 空闲时发送心跳的间隔秒数 / Seconds between heartbeats when idle
+HEARTBEAT_INTERVAL = 1
+# 从节点重新连接前等待的秒数 / Seconds a follower waits before reconnecting
+RECONNECT_DELAY = 1
+
+
+# 编码一组消息为要发送的字节 / Encode a group of messages into the bytes to send
+def encode_lines(messages):
+    return ''.join(json.dumps(message) + '\n' for message in messages).encode('utf-8')
+
+
+# 定义ReplicationLog类：主节点上最近修改的环形缓冲区 / Define ReplicationLog class: ring buffer of recent mutations on the primary
+class ReplicationLog:
+    # 初始化方法 / Initialization method
+    def __init__(self, capacity=DEFAULT_BACKLOG):
+        # 保留的记录数 / Number of records kept
+        self.capacity = capacity
+        # 序号为seq的记录位于records[seq % capacity] / The record numbered seq lives at records[seq % capacity]
+        self.records = [None] * capacity
+        # 下一条记录的序号 / Sequence number of the next record
+        self.next_seq = 0
+        # 保护缓冲区的锁，有新记录时通知 / Lock guarding the buffer, notified when records arrive
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        # 本次运行的标识，重启后不同 / Identifier of this run, different after a restart
+        self.epoch = os.urandom(8).hex()
+        # 已连接的从节点数 / Number of connected followers
+        self.followers = 0
+
+    # 追加一条记录（调用时持有键所属分片的锁，保证与操作顺序一致）
+    # Append one record (called with the key's shard lock held, so the order matches the operation order)
+    def append(self, record):
+        with self.lock:
+            self.records[self.next_seq % self.capacity] = record
+            self.next_seq += 1
+            self.changed.notify_all()
+
+    # 记录一次成功的PUT，deadline为可选的过期时间 / Record a successful PUT; deadline is an optional expiry time
+    def append_put(self, key, value, deadline=None):
+        self.append(['P', key, value] if deadline is None else ['P', key, value, deadline])
+
+    # 记录一次成功的GET / Record a successful GET
+    def append_get(self, key):
+        self.append(['G', key])
+
+    # 是否还能从seq继续发送 / Whether streaming can still continue from seq
+    def retains(self, seq):
+        return self.next_seq - self.capacity <= seq <= self.next_seq
+
+    # 返回从seq开始的记录和主节点的下一个序号，没有新记录时最多等待timeout秒；记录已被覆盖时返回None
+    # Return the records from seq on and the primary's next sequence number, waiting up to timeout seconds
+    # when there are none; returns None once the records were overwritten
+    def read(self, seq, timeout):
+        with self.lock:
+            if seq == self.next_seq:
+                self.changed.wait(timeout)
+            if not self.retains(seq):
+                return None
+            end = min(self.next_seq, seq + STREAM_BATCH_SIZE)
+            return [self.records[index % self.capacity] for index in range(seq, end)], self.next_seq
+
+    # 返回复制统计 / Return the replication statistics
+    def stats(self):
+        return {
+            'replication_sequence': self.next_seq,      # 下一条记录的序号 / Sequence number of the next record
+            'replication_followers': self.followers,    # 已连接的从节点数 / Connected followers
+        }
+
+
+# 发送一致的快照，返回它对应的序号 / Send a consistent snapshot; returns the sequence number it corresponds to
+def send_snapshot(sock, tuple_space, log):
+    # 锁定所有分片：期间没有新记录，复制的状态与序号一致
+    # Lock every shard: no record is appended meanwhile, so the copied state matches the sequence number
+    with tuple_space.locked():
+        seq = log.next_seq
+        entries = []
+        for shard in tuple_space.shards:
+            deadlines = shard.deadlines
+            entries.extend([key, value, deadlines.get(key)] for key, value in shard.tuples.items())
+    sock.sendall(encode_lines([['snapshot', log.epoch, seq, len(entries)]]))
+    for start in range(0, len(entries), SNAPSHOT_BATCH_SIZE):
+        sock.sendall(encode_lines(entries[start:start + SNAPSHOT_BATCH_SIZE]))
+    return seq
+
+
+# 向一个从节点发送修改流，直到连接断开 / Stream mutations to one follower until the connection drops
+def stream_to_follower(sock, tuple_space, log):
+    with sock:
+        try:
+            with sock.makefile('rb') as lines:
+                request = lines.readline().decode('utf-8').split()
+            if len(request) != 3 or request[0] != 'SYNC' or not request[2].isdigit():
+                return
+            epoch, seq = request[1], int(request[2])
+
+            with log.lock:
+                log.followers += 1
+                resume = epoch == log.epoch and log.retains(seq)
+            try:
+                if resume:
+                    sock.sendall(encode_lines([['resume', log.epoch, seq]]))
+                else:
+                    seq = send_snapshot(sock, tuple_space, log)
+                while True:
+                    batch = log.read(seq, HEARTBEAT_INTERVAL)
+                    # 从节点落后太多，记录已被覆盖：改发快照 / The follower fell too far behind and its records were overwritten: send a snapshot
+                    if batch is None:
+                        seq = send_snapshot(sock, tuple_space, log)
+                        continue
+                    records, latest = batch
+                    messages = [[seq + offset] + record for offset, record in enumerate(records)]
+                    seq += len(records)
+                    messages.append(['sync', latest])
+                    sock.sendall(encode_lines(messages))
+            finally:
+                with log.lock:
+                    log.followers -= 1
+        except OSError:
+            pass
+
+
+# 在复制端口上接受从节点 / Accept followers on the replication port
+def serve_replication(port, tuple_space, log, backlog=16):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('0.0.0.0', port))
+    listener.listen(backlog)
+
+    def accept():
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=stream_to_follower, args=(sock, tuple_space, log), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener
+
+
+# 定义Follower类：跟随主节点的修改流并应用到本地元组空间 / Define Follower class: tails the primary's mutation stream into the local tuple space
+class Follower:
+    # 初始化方法 / Initialization method
+    def __init__(self, host, port, tuple_space):
+        # 主节点的复制地址 / Replication address of the primary
+        self.address = (host, port)
+        # 本地元组空间 / Local tuple space
+        self.tuple_space = tuple_space
+        # 当前跟随的主节点运行标识和下一条要应用的序号 / Epoch of the primary being followed and the next sequence number to apply
+        self.epoch = None
+        self.next_seq = 0
+        # 主节点最近报告的下一个序号 / The primary's next sequence number as last reported
+        self.primary_seq = 0
+        # 最近一次追上主节点的时间 / Last time the follower had caught up with the primary
+        self.caught_up_at = time.time()
+        # 是否已连接 / Whether connected
+        self.connected = False
+        # 加载过的快照数 / Number of snapshots loaded
+        self.snapshots = 0
+
+    # 启动跟随线程 / Start the following thread
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    # 连接主节点并跟随，断开后重连 / Connect to the primary and follow it, reconnecting after a drop
+    def run(self):
+        while True:
+            try:
+                with socket.create_connection(self.address) as sock:
+                    # 主节点每秒至少发送一次心跳，超时说明连接已失效 / The primary sends a heartbeat at least every second; a timeout means the connection is dead
+                    sock.settimeout(5 * HEARTBEAT_INTERVAL)
+                    sock.sendall(f"SYNC {self.epoch or '-'} {self.next_seq}\n".encode('utf-8'))
+                    self.connected = True
+                    with sock.makefile('r', encoding='utf-8') as lines:
+                        self.follow(lines)
+            except (OSError, ValueError):
+                pass
+            self.connected = False
+            time.sleep(RECONNECT_DELAY)
+
+    # 依次处理主节点发来的消息 / Handle the primary's messages in order
+    def follow(self, lines):
+        for line in lines:
+            message = json.loads(line)
+            kind = message[0]
+            if isinstance(kind, int):
+                self.apply(message)
+                self.next_seq = kind + 1
+            elif kind == 'sync':
+                self.primary_seq = message[1]
+                if self.next_seq >= self.primary_seq:
+                    self.caught_up_at = time.time()
+            elif kind == 'resume':
+                self.epoch = message[1]
+            elif kind == 'snapshot':
+                self.load_snapshot(message, lines)
+            else:
+                raise ValueError(f"Unknown replication message: {kind}")
+
+    # 应用一条修改记录 / Apply one mutation record
+    def apply(self, message):
+        _, operation, key = message[:3]
+        shard = self.tuple_space.shard_for(key)
+        with shard.lock:
+            if operation == 'P':
+                self.store(shard, key, message[3], message[4] if len(message) > 4 else None)
+            elif key in shard.tuples:
+                shard.remove(key)
+
+    # 存储一个元组并唤醒等待它的阻塞READ（调用时持有分片锁） / Store a tuple and wake the blocking READs waiting for it (called with the shard lock held)
+    def store(self, shard, key, value, deadline):
+        if key in shard.waiters:
+            shard.hand_over(key, value)
+        shard.store(key, value, deadline)
+
+    # 加载快照：逐个替换不同的元组，最后删除快照中没有的键，加载期间读请求仍能看到旧值
+    # Load a snapshot: replace the tuples that differ one by one, then delete the keys missing from it;
+    # reads still see the old values while it loads
+    def load_snapshot(self, header, lines):
+        _, epoch, seq, count = header
+        seen = set()
+        for _ in range(count):
+            line = next(lines, None)
+            if line is None:
+                raise ConnectionError("connection closed during a snapshot")
+            key, value, deadline = json.loads(line)
+            seen.add(key)
+            shard = self.tuple_space.shard_for(key)
+            with shard.lock:
+                if shard.tuples.get(key) != value or shard.deadlines.get(key) != deadline:
+                    self.store(shard, key, value, deadline)
+        for shard in self.tuple_space.shards:
+            with shard.lock:
+                for key in [key for key in shard.tuples if key not in seen]:
+                    shard.remove(key)
+        self.epoch = epoch
+        self.next_seq = self.primary_seq = seq
+        self.snapshots += 1
+
+    # 返回复制统计：落后的记录数和秒数 / Return the replication statistics: how many records and seconds behind
+    def stats(self):
+        lag = max(0, self.primary_seq - self.next_seq)
+        return {
+            'replication_connected': int(self.connected),                       # 是否已连接主节点 / Connected to the primary
+            'replication_applied': self.next_seq,                               # 已应用的记录数 / Records applied
+            'replication_lag': lag,                                             # 落后的记录数 / Records behind
+            'replication_lag_seconds': time.time() - self.caught_up_at if lag else 0,  # 落后的秒数 / Seconds behind
+            'total_replication_snapshots': self.snapshots,                      # 加载的快照数 / Snapshots loaded
+        }
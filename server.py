@@ -1,3 +1,15 @@
+# 导入asyncio模块用于事件循环服务器 / Import asyncio module for the event-loop server
+import asyncio
+# 导入functools模块用于推迟本进程的阻塞请求 / Import functools module to defer this worker's blocking requests
+import functools
+# 导入heapq模块用于合并各分片的有序查询结果 / Import heapq module to merge the sorted query results of the shards
+import heapq
+# 导入itertools模块用于截断和分块查询结果 / Import itertools module to cut and chunk query results
+import itertools
+# 导入os模块用于数据目录路径 / Import os module for data directory paths
+import os
+# 导入select模块用于检查等待中的客户端是否已断开 / Import select module to check whether a waiting client disconnected
+import select
 # 导入socket模块用于网络通信 / Import socket module for network communication
 import socket
 # 导入threading模块用于多线程处理 / Import threading module for multi-threading
@@ -6,70 +18,259 @@ import threading
 import time
 # 从collections导入defaultdict用于创建默认字典 / Import defaultdict from collections for default dictionaries
 from collections import defaultdict
+# 导入ThreadPoolExecutor作为有界的连接处理线程池 / Import ThreadPoolExecutor as the bounded pool of connection threads
+from concurrent.futures import ThreadPoolExecutor
 # 从datetime导入datetime和timedelta用于日期时间计算 / Import datetime and timedelta for date/time calculations
 from datetime import datetime, timedelta
+# 导入GeneratorType用于识别流式响应 / Import GeneratorType to recognise streamed responses
+from types import GeneratorType
+
+# 导入二进制协议 / Import the binary protocol
+from binary_protocol import (HELLO, MAX_FRAME_SIZE, NO_ARGUMENT, OPERATIONS, REQUEST_HEADER, STATUS_ERROR,
+                             STATUS_EXISTS, STATUS_OK, BinaryFrameReader, decode_request, encode_match, encode_request,
+                             encode_response, encode_value)
+# 导入带长度前缀的消息读取器 / Import the length-prefixed message reader
+from framing import BATCH_HEADER_SIZE, BATCH_MARKER, FrameReader, byte_length, format_batch, split_batch
+# 导入结构化日志 / Import structured logging
+from logs import LEVELS, LOG_FORMATS, Logger
+# 导入性能指标和导出端点 / Import performance metrics and their export endpoint
+from metrics import ServerMetrics, serve_metrics
+# 导入预写日志 / Import the write-ahead log
+from persistence import FSYNC_POLICIES, WriteAheadLog
+# 导入主从复制 / Import primary-follower replication
+from replication import DEFAULT_BACKLOG, Follower, ReplicationLog, serve_replication
+# 导入分片元组空间 / Import the sharded tuple space
+from tuple_store import EVICTION_POLICIES, WAIT_POLL_INTERVAL, ShardedTupleSpace, Waiter
+
+# 文本响应的最大长度（3位长度前缀） / Maximum length of a text response (3-digit length prefix)
+MAX_TEXT_RESPONSE = 999
+# 文本结果"NNN OK (k, v) removed"中键和值以外的长度 / Length of a text result "NNN OK (k, v) removed" besides the key and value
+# 查询匹配帧"NNN OK (k, v) matched"的额外长度与之相同 / A query match frame "NNN OK (k, v) matched" has the same overhead
+TEXT_RESULT_OVERHEAD = len("NNN OK (, ) removed")
+# 查询操作：QP按前缀，QR按键范围 / Query operations: QP by prefix, QR by key range
+QUERY_OPERATIONS = ('QP', 'QR')
+# 查询每次持有分片锁时取出的键数 / Keys fetched per shard lock acquisition while querying
+QUERY_PAGE_SIZE = 256
+# 流式响应每次发送的帧数 / Frames sent per write of a streamed response
+STREAM_CHUNK_SIZE = 256
+# 修改元组空间的操作，从节点拒绝它们 / Operations that modify the tuple space; followers reject them
+WRITE_OPERATIONS = ('G', 'P', 'PX', 'BG')
+
+
+# 定义ConnectionTimer类：asyncio连接的超时；每次活动只记录截止时间，定时器到期时才检查并按需重新安排
+# Define ConnectionTimer class: timeouts of an asyncio connection; each activity only records a deadline and
+# the timer checks it when it fires, rescheduling itself as needed
+class ConnectionTimer:
+    # 初始化方法，超时时调用on_timeout / Initialization method; on_timeout is called on a timeout
+    def __init__(self, loop, on_timeout):
+        self.loop = loop
+        self.on_timeout = on_timeout
+        # 当前截止时间（loop.time()），None表示不限 / Current deadline (loop.time()), None for no limit
+        self.deadline = None
+        # 已安排的定时器 / Scheduled timer
+        self.handle = None
+        # 是否已超时 / Whether the connection timed out
+        self.expired = False
+
+    # 从现在起timeout秒后超时，None表示不限 / Time out timeout seconds from now, None for no limit
+    def reset(self, timeout):
+        if timeout is None:
+            self.deadline = None
+            return
+        self.deadline = self.loop.time() + timeout
+        # 只在没有更早的定时器时重新安排 / Only reschedule when no earlier timer is pending
+        if self.handle is None or self.handle.when() > self.deadline:
+            self.cancel()
+            self.handle = self.loop.call_at(self.deadline, self.check)
+
+    # 定时器到期：截止时间已过则超时，否则等到新的截止时间 / Timer fired: time out if the deadline passed, otherwise wait for the new one
+    def check(self):
+        self.handle = None
+        if self.deadline is None:
+            return
+        if self.loop.time() >= self.deadline:
+            self.expired = True
+            self.on_timeout()
+        else:
+            self.handle = self.loop.call_at(self.deadline, self.check)
+
+    # 取消定时器 / Cancel the timer
+    def cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
 
 # 定义TupleSpaceServer类 / Define TupleSpaceServer class
 class TupleSpaceServer:
     # 初始化方法 / Initialization method
-    def __init__(self, port):
+    def __init__(self, port, backlog=128, num_shards=16, data_dir=None, fsync='group', snapshot_interval=60,
+                 metrics_port=None, max_memory=None, eviction='lru', replication_port=None,
+                 replication_backlog=DEFAULT_BACKLOG, follow=None, max_connections=1024, idle_timeout=300,
+                 read_timeout=30, write_timeout=30, logger=None):
         # 服务器端口号 / Server port number
         self.port = port
-        # 元组存储空间字典 / Dictionary for tuple storage
-        self.tuple_space = {}
-        # 线程锁用于同步 / Thread lock for synchronization
+        # 结构化日志，默认级别下不记录每个连接和请求 / Structured logger; the default level logs no per-connection or per-request events
+        self.logger = logger if logger is not None else Logger()
+        # 监听队列长度 / Listen (accept) backlog
+        self.backlog = backlog
+        # 同时服务的最大客户端连接数，超出时拒绝 / Maximum client connections served at once; beyond it they are rejected
+        self.max_connections = max_connections
+        # 空闲超时：没有未完成请求时等待下一个请求的秒数 / Idle timeout: seconds to wait for the next request when none is partly received
+        self.idle_timeout = idle_timeout
+        # 读超时：接收一个已开始的请求的最长秒数 / Read timeout: longest time in seconds to receive a request once it started
+        self.read_timeout = read_timeout
+        # 写超时：客户端读取响应的最长秒数，防止慢读者让服务器无限缓冲
+        # Write timeout: longest time in seconds for the client to read a response, so slow readers cannot make the server buffer without bound
+        self.write_timeout = write_timeout
+        # 按键哈希分片的元组存储空间，每个分片独立加锁，可选内存上限
+        # Tuple storage sharded by key hash, one lock per shard, with an optional memory cap
+        self.tuple_space = ShardedTupleSpace(num_shards, max_memory, eviction)
+        # 服务器级统计信息的锁 / Lock for server-level statistics
         self.lock = threading.Lock()
-        # 服务器统计信息字典 / Server statistics dictionary
+        # 服务器级统计信息字典（操作计数在各分片中） / Server-level statistics (operation counters live in the shards)
         self.stats = {
             'total_clients': 0,      # 总客户端数 / Total clients
-            'total_operations': 0,   # 总操作数 / Total operations
-            'total_reads': 0,        # 读取操作数 / Read operations
-            'total_gets': 0,         # 获取操作数 / Get operations
-            'total_puts': 0,        # 存放操作数 / Put operations
-            'total_errors': 0,       # 错误数 / Errors
+            'active_clients': 0,     # 当前连接的客户端数 / Clients currently connected
+            'total_rejected': 0,     # 因连接数上限被拒绝的连接 / Connections rejected at the connection limit
+            'total_timeouts': 0,     # 因超时被关闭的连接 / Connections closed by a timeout
+            'total_queries': 0,      # 前缀和范围查询数 / Prefix and range queries
         }
         # 上次报告统计信息的时间 / Last statistics report time
         self.last_report_time = datetime.now()
+        # 多进程模式下与其他工作进程共享端口 / Share the port with other workers in multi-process mode
+        self.reuse_port = False
+        # 多进程模式下的键路由器（单进程时为None） / Key router in multi-process mode (None in a single process)
+        self.router = None
+        # 多进程asyncio模式下执行转发的线程池，每个连接最多占用一个线程，阻塞的转发不会耗尽它
+        # Thread pool running forwards in multi-process asyncio mode; each connection uses at most one thread, so blocked forwards cannot exhaust it
+        self.forward_pool = None
+        # 预写日志（未指定数据目录时为None） / Write-ahead log (None without a data directory)
+        self.log = None
+        # 写快照的间隔秒数 / Seconds between snapshots
+        self.snapshot_interval = snapshot_interval
+        # 指标导出端口，指定时才启用性能指标 / Metrics export port; performance metrics are only enabled when it is set
+        self.metrics_port = metrics_port
+        self.metrics = ServerMetrics(self.tuple_space) if metrics_port is not None else None
+        # 复制端口，指定时作为主节点向从节点发送修改流 / Replication port; when set, the server streams its mutations to followers as a primary
+        self.replication_port = replication_port
+        self.replication = ReplicationLog(replication_backlog) if replication_port is not None else None
+        # 作为只读从节点时跟随的主节点(主机, 复制端口) / (host, replication port) of the primary followed as a read-only follower
+        self.follower = Follower(*follow, self.tuple_space) if follow is not None else None
+        if data_dir is not None:
+            self.log = WriteAheadLog(data_dir, fsync)
+            # 从快照和日志恢复元组空间 / Recover the tuple space from the snapshot and the log
+            started = time.perf_counter()
+            replayed = self.log.recover(self.tuple_space)
+            self.logger.info('recovered', "Recovered {tuples} tuples ({records} log records) in {seconds:.2f}s",
+                             tuples=len(self.tuple_space), records=replayed, seconds=time.perf_counter() - started)
+            # 恢复的数据可能超出新的内存上限 / The recovered data may exceed a new memory cap
+            if max_memory is not None:
+                for shard in self.tuple_space.shards:
+                    with shard.lock:
+                        self.log_removed(shard.evict())
         
-    # 启动服务器方法 / Server startup method
-    def start(self):
+    # 创建监听socket方法 / Listening socket creation method
+    def create_server_socket(self):
         # 创建TCP socket / Create TCP socket
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # 重启后可立即重新绑定仍有TIME_WAIT连接的端口 / Allow rebinding the port right after a restart while old connections are in TIME_WAIT
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # 允许多个工作进程绑定同一端口 / Allow several workers to bind the same port
+        if self.reuse_port:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         # 绑定服务器地址和端口 / Bind server address and port
         server_socket.bind(('0.0.0.0', self.port))
-        # 开始监听，最大连接数5 / Start listening with max 5 connections
-        server_socket.listen(5)
-        # 打印服务器启动信息 / Print server startup message
-        print(f"Server started on port {self.port}")
+        # 开始监听，使用可配置的队列长度 / Start listening with the configurable backlog
+        server_socket.listen(self.backlog)
+        return server_socket
+
+    # 启动服务器方法（每连接一个线程） / Server startup method (one thread per connection)
+    def start(self):
+        # 创建监听socket / Create listening socket
+        server_socket = self.create_server_socket()
+        # 记录服务器启动信息 / Log server startup message
+        self.logger.info('server_started', "Server started on port {port}", port=self.port, engine='threaded')
         
-        # 启动统计信息报告线程 / Start statistics reporting thread
-        stats_thread = threading.Thread(target=self.report_stats_periodically, daemon=True)
-        stats_thread.start()
+        # 启动后台线程 / Start background threads
+        self.start_background_threads()
+        # 有界的连接处理线程池，线程在连接之间复用 / Bounded pool of connection threads, reused across connections
+        pool = ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix='client')
         
         try:
             # 主服务器循环 / Main server loop
             while True:
                 # 接受客户端连接 / Accept client connection
                 client_socket, addr = server_socket.accept()
-                # 客户端计数增加 / Increment client count
-                self.stats['total_clients'] += 1
-                # 打印新客户端信息 / Print new client info
-                print(f"New client connected: {addr}")
+                # 达到连接数上限时拒绝 / Reject at the connection limit
+                if not self.admit():
+                    self.logger.debug('client_rejected', "Rejected client {address}: too many connections", address=addr)
+                    self.reject(client_socket.sendall, client_socket.close)
+                    continue
+                # 记录新客户端信息 / Log new client info
+                self.logger.debug('client_connected', "New client connected: {address}", address=addr)
                 
-                # 创建客户端处理线程 / Create client handler thread
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket,)
-                )
-                # 启动客户端线程 / Start client thread
-                client_thread.start()
+                # 交给线程池处理，结束后释放名额 / Hand it to the pool, releasing the slot once done
+                pool.submit(self.handle_client, client_socket).add_done_callback(lambda future: self.leave())
         # 捕获键盘中断 / Catch keyboard interrupt
         except KeyboardInterrupt:
-            print("\nServer shutting down...")
+            self.logger.info('server_stopped', "Server shutting down...")
         finally:
             # 关闭服务器socket / Close server socket
             server_socket.close()
+            pool.shutdown(wait=False)
     
+    # 启动统计、快照和指标导出等后台线程 / Start the statistics, snapshot and metrics export background threads
+    def start_background_threads(self):
+        # 启动统计信息报告线程 / Start statistics reporting thread
+        stats_thread = threading.Thread(target=self.report_stats_periodically, daemon=True)
+        stats_thread.start()
+        # 启动过期元组回收线程 / Start the expired tuple reaper thread
+        threading.Thread(target=self.expire_periodically, daemon=True).start()
+        # 启用持久化时启动快照线程 / Start the snapshot thread when persistence is enabled
+        if self.log is not None:
+            threading.Thread(target=self.snapshot_periodically, daemon=True).start()
+        # 启用性能指标时启动导出端点 / Start the export endpoint when performance metrics are enabled
+        if self.metrics is not None:
+            serve_metrics(self.metrics_port, lambda: self.metrics.render(self.stats_snapshot()))
+            self.logger.info('metrics_started', "Metrics available at http://127.0.0.1:{port}/metrics",
+                             port=self.metrics_port)
+        # 主节点接受从节点，从节点开始跟随主节点 / A primary accepts followers, a follower starts tailing its primary
+        if self.replication is not None:
+            serve_replication(self.replication_port, self.tuple_space, self.replication)
+            self.logger.info('replication_started', "Replicating to followers on port {port}",
+                             port=self.replication_port)
+        if self.follower is not None:
+            self.follower.start()
+            self.logger.info('following', "Following primary at {host}:{port}",
+                             host=self.follower.address[0], port=self.follower.address[1])
+
+    # 启动服务器方法（asyncio事件循环） / Server startup method (asyncio event loop)
+    def start_async(self):
+        try:
+            # 在事件循环中运行服务器 / Run the server inside an event loop
+            asyncio.run(self.serve_async())
+        # 捕获键盘中断 / Catch keyboard interrupt
+        except KeyboardInterrupt:
+            self.logger.info('server_stopped', "Server shutting down...")
+
+    # 事件循环服务器主协程 / Main coroutine of the event-loop server
+    async def serve_async(self):
+        # 创建监听socket / Create listening socket
+        server_socket = self.create_server_socket()
+        if self.router is not None:
+            self.forward_pool = ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix='forward')
+        # 由asyncio接管监听socket / Hand the listening socket over to asyncio
+        server = await asyncio.start_server(self.handle_client_async, sock=server_socket)
+        # 记录服务器启动信息 / Log server startup message
+        self.logger.info('server_started', "Server started on port {port} (asyncio)", port=self.port, engine='asyncio')
+
+        # 启动后台线程 / Start background threads
+        self.start_background_threads()
+
+        # 单个进程内持续服务所有连接 / Serve every connection from this one process
+        async with server:
+            await server.serve_forever()
+
     # 定期报告统计信息方法 / Periodic statistics reporting method
     def report_stats_periodically(self):
         while True:
@@ -78,6 +279,52 @@ class TupleSpaceServer:
             # 调用报告方法 / Call report method
             self.report_stats()
     
+    # 定期写快照并截断日志 / Periodically write a snapshot and truncate the log
+    def snapshot_periodically(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            self.log.snapshot(self.tuple_space)
+
+    # 定期删除已过期但未被访问的元组，只处理有TTL的分片，按过期堆取出而不扫描
+    # Periodically remove expired tuples nobody accessed; only shards with TTLs are visited and the expiry heap avoids scans
+    def expire_periodically(self):
+        while True:
+            time.sleep(1)
+            for shard in self.tuple_space.shards:
+                if shard.deadlines:
+                    with shard.lock:
+                        self.log_removed(shard.expire(time.time()))
+
+    # 等待本批响应对应的日志记录落盘 / Wait until the log records behind these responses are on disk
+    async def sync_log_async(self):
+        if self.log is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.log.sync)
+
+    # 返回当前统计信息而不打印，耗时与元组数量无关
+    # Return the current statistics without printing them; the cost does not depend on the number of tuples
+    def stats_snapshot(self):
+        # 合并服务器级和各分片的统计 / Merge server-level and per-shard statistics
+        stats = {**self.stats, **self.tuple_space.merged_stats()}
+        # 主节点和从节点的复制状态 / Replication state of a primary or a follower
+        if self.replication is not None:
+            stats.update(self.replication.stats())
+        if self.follower is not None:
+            stats.update(self.follower.stats())
+        # 队列满时丢弃的日志记录 / Log records dropped while the queue was full
+        stats['total_log_dropped'] = self.logger.dropped
+        # 元组数量和总长度由各分片累计维护 / Tuple count and total sizes are running totals kept by the shards
+        num_tuples = stats['tuples']
+        total_key_size = stats['key_size']
+        total_value_size = stats['value_size']
+
+        # 计算平均键长度 / Calculate average key size
+        stats['avg_key_size'] = total_key_size / num_tuples if num_tuples > 0 else 0
+        # 计算平均值长度 / Calculate average value size
+        stats['avg_value_size'] = total_value_size / num_tuples if num_tuples > 0 else 0
+        # 计算平均元组长度 / Calculate average tuple size
+        stats['avg_tuple_size'] = (total_key_size + total_value_size) / num_tuples if num_tuples > 0 else 0
+        return stats
+
     # 报告统计信息方法 / Statistics reporting method
     def report_stats(self):
         # 使用锁保证线程安全 / Use lock for thread safety
@@ -86,102 +333,407 @@ class TupleSpaceServer:
             current_time = datetime.now()
             # 检查是否达到报告间隔 / Check if reporting interval reached
             if current_time - self.last_report_time >= timedelta(seconds=10):
-                # 计算元组数量 / Calculate tuple count
-                num_tuples = len(self.tuple_space)
-                # 计算所有键的总长度 / Calculate total key size
-                total_key_size = sum(len(k) for k in self.tuple_space.keys())
-                # 计算所有值的总长度 / Calculate total value size
-                total_value_size = sum(len(v) for v in self.tuple_space.values())
-                
-                # 计算平均键长度 / Calculate average key size
-                avg_key_size = total_key_size / num_tuples if num_tuples > 0 else 0
-                # 计算平均值长度 / Calculate average value size
-                avg_value_size = total_value_size / num_tuples if num_tuples > 0 else 0
-                # 计算平均元组长度 / Calculate average tuple size
-                avg_tuple_size = (total_key_size + total_value_size) / num_tuples if num_tuples > 0 else 0
+                stats = self.stats_snapshot()
                 
-                # 打印统计信息 / Print statistics
-                print("\n=== Server Statistics ===")
-                print(f"Tuples: {num_tuples}")
-                print(f"Avg tuple size: {avg_tuple_size:.2f} chars")
-                print(f"Avg key size: {avg_key_size:.2f} chars")
-                print(f"Avg value size: {avg_value_size:.2f} chars")
-                print(f"Total clients: {self.stats['total_clients']}")
-                print(f"Total operations: {self.stats['total_operations']}")
-                print(f"  READs: {self.stats['total_reads']}")
-                print(f"  GETs: {self.stats['total_gets']}")
-                print(f"  PUTs: {self.stats['total_puts']}")
-                print(f"  Errors: {self.stats['total_errors']}")
-                print("=======================\n")
+                # 记录统计信息，JSON格式下每个统计项都是一个字段 / Log statistics; in the JSON format every statistic is a field
+                report = [
+                    "\n=== Server Statistics ===",
+                    "Tuples: {tuples}",
+                    "Avg tuple size: {avg_tuple_size:.2f} chars",
+                    "Avg key size: {avg_key_size:.2f} chars",
+                    "Avg value size: {avg_value_size:.2f} chars",
+                    "Total clients: {total_clients} ({active_clients} active, "
+                    "{total_rejected} rejected, {total_timeouts} timed out)",
+                    "Total operations: {total_operations}",
+                    "  READs: {total_reads}",
+                    "  GETs: {total_gets}",
+                    "  PUTs: {total_puts}",
+                    "  Errors: {total_errors}",
+                    "Queries: {total_queries}",
+                    "Expired: {total_expired}",
+                    "Evicted: {total_evicted}",
+                ]
+                if self.replication is not None:
+                    report.append("Replication: sequence {replication_sequence}, {replication_followers} followers")
+                if self.follower is not None:
+                    stats['replication_state'] = 'connected' if stats['replication_connected'] else 'disconnected'
+                    report.append("Replication: applied {replication_applied}, lag {replication_lag} records "
+                                  "({replication_lag_seconds:.1f}s), {total_replication_snapshots} snapshots, "
+                                  "{replication_state}")
+                report.append("=======================\n")
+                self.logger.info('stats', '\n'.join(report), **stats)
                 
                 # 更新最后报告时间 / Update last report time
                 self.last_report_time = current_time
     
-    # 处理客户端连接方法 / Client connection handler method
-    def handle_client(self, client_socket):
+    # 接纳一个新客户端，达到连接数上限时返回False / Admit a new client; returns False at the connection limit
+    def admit(self):
+        with self.lock:
+            if self.stats['active_clients'] >= self.max_connections:
+                self.stats['total_rejected'] += 1
+                return False
+            # 客户端计数增加 / Increment client count
+            self.stats['total_clients'] += 1
+            self.stats['active_clients'] += 1
+            return True
+
+    # 客户端断开后释放名额 / Release the slot of a client that disconnected
+    def leave(self):
+        with self.lock:
+            self.stats['active_clients'] -= 1
+
+    # 告知客户端连接数已满并关闭连接 / Tell a client the server is full and close the connection
+    def reject(self, send, close):
+        try:
+            send(self.format_error("Too many connections").encode('utf-8'))
+        except OSError:
+            pass
+        close()
+
+    # 记录一个超时关闭的连接 / Record a connection closed by a timeout
+    def count_timeout(self):
+        with self.lock:
+            self.stats['total_timeouts'] += 1
+        self.logger.debug('client_timeout', "Client timed out")
+
+    # 只在超时变化时设置socket超时 / Set a socket's timeout only when it changes
+    def set_timeout(self, sock, timeout):
+        if sock.gettimeout() != timeout:
+            sock.settimeout(timeout)
+
+    # 下一次接收的超时：有未接收完的请求时为读超时的剩余时间（可能小于等于0），否则为空闲超时；pending_since为该请求开始计时的时间
+    # Timeout of the next receive: what remains of the read timeout while a request is partly received (possibly 0 or
+    # less), the idle timeout otherwise; pending_since is when that request's clock started
+    def receive_timeout(self, pending_since):
+        if pending_since is None:
+            return self.idle_timeout
+        if self.read_timeout is None:
+            return None
+        return pending_since + self.read_timeout - time.monotonic()
+
+    # 按采样率记录经过的请求 / Log a sample of the requests passing through
+    def log_requests(self, requests):
+        for request in requests:
+            if self.logger.sample():
+                self.logger.debug('request', "Request {operation} ({size} bytes)",
+                                  operation=self.describe_request(request), size=len(request))
+            yield request
+
+    # 请求的操作名，用于日志 / Operation name of a request, for logging
+    def describe_request(self, request):
+        if isinstance(request, bytes):
+            if len(request) < REQUEST_HEADER.size:
+                return '?'
+            return OPERATIONS.get(REQUEST_HEADER.unpack_from(request)[1], '?')
+        if request.startswith(BATCH_MARKER):
+            return 'BATCH'
+        words = request.split(maxsplit=2)
+        return words[1] if len(words) > 1 else '?'
+
+    # 协商连接使用的协议：返回(读取器, 请求处理函数, 回复的握手字节)，数据还不足以判断时返回None
+    # Negotiate the protocol of a connection: returns (reader, request handler, handshake reply), or None while too little has arrived
+    def negotiate(self, reader):
+        binary = reader.consume(HELLO)
+        if binary is None:
+            return None
+        if binary:
+            return BinaryFrameReader(REQUEST_HEADER.size, reader), self.process_binary, HELLO
+        return reader, self.process_request, b''
+
+    # 把一组响应编码为要发送的字节 / Encode a group of responses into the bytes to send
+    def encode_responses(self, responses):
+        if isinstance(responses[0], bytes):
+            return b''.join(responses)
+        return ''.join(responses).encode('utf-8')
+
+    # 取出流式响应的下一块帧，结束时返回空列表 / Pull the next chunk of frames from a streamed response; empty once it ends
+    def next_chunk(self, stream):
+        return list(itertools.islice(stream, STREAM_CHUNK_SIZE))
+
+    # 发送一组响应 / Send a group of responses
+    def send_responses(self, client_socket, responses, connection):
+        if not responses:
+            return
+        # 修改落盘后才确认 / Acknowledge changes only once they are on disk
+        if self.log is not None:
+            self.log.sync()
+        payload = self.encode_responses(responses)
+        if connection is not None:
+            connection.bytes_out += len(payload)
+        client_socket.sendall(payload)
+
+    # 处理客户端连接方法，peer为True时是其他工作进程转发的连接：查询不再分发，也没有超时
+    # Client connection handler method; peer is True for connections forwarded by other workers, whose queries are
+    # not fanned out again and which never time out
+    def handle_client(self, client_socket, peer=False):
+        # 每个连接一个消息读取器，协议在收到第一批数据时确定
+        # One message reader per connection; the protocol is settled when the first bytes arrive
+        reader = FrameReader(max_batch_size=MAX_FRAME_SIZE)
+        process = None
+        # 启用性能指标时记录本连接的流量 / Record this connection's traffic when performance metrics are enabled
+        connection = None
+        if self.metrics is not None:
+            try:
+                connection = self.metrics.open_connection(client_socket.getpeername())
+            except OSError:
+                connection = self.metrics.open_connection(None)
+        # 阻塞请求等待时用于发现客户端已断开 / Lets blocking requests notice that the client disconnected while they wait
+        closed = functools.partial(self.client_closed, client_socket)
         try:
             while True:
-                # 接收客户端数据 / Receive client data
-                data = client_socket.recv(1024).decode('utf-8')
+                # 接收客户端数据，空闲或请求接收太久时超时 / Receive client data, timing out when idle or when a request takes too long
+                if not peer:
+                    timeout = self.receive_timeout(reader.partial_started())
+                    # 剩余时间已用完时直接超时；settimeout(0)会使socket变为非阻塞
+                    # Time out at once when no time is left; settimeout(0) would make the socket non-blocking
+                    if timeout is not None and timeout <= 0:
+                        raise socket.timeout("read timeout")
+                    self.set_timeout(client_socket, timeout)
+                received = reader.fill(client_socket)
                 # 如果没有数据则断开 / Disconnect if no data
-                if not data:
+                if not received:
+                    break
+                if connection is not None:
+                    connection.bytes_in += received
+                # 发送受写超时限制，客户端不读取时断开 / Sends are bounded by the write timeout; clients that stop reading are dropped
+                if not peer:
+                    self.set_timeout(client_socket, self.write_timeout)
+
+                # 协商协议，接受二进制协议时回复握手 / Negotiate the protocol, answering the handshake when binary is accepted
+                if process is None:
+                    negotiated = self.negotiate(reader)
+                    if negotiated is None:
+                        continue
+                    reader, process, reply = negotiated
+                    if reply:
+                        client_socket.sendall(reply)
+
+                # 按顺序处理本次收到的所有完整请求 / Process every complete request received so far, in order
+                requests = reader.frames()
+                if connection is not None:
+                    requests = connection.count(requests)
+                if self.logger.sample_every:
+                    requests = self.log_requests(requests)
+                responses = []
+                for request in requests:
+                    response = process(request, fan_out=not peer, closed=closed)
+                    # 查询结果分块流式发送，先发送之前的响应 / Query results are streamed in chunks, after the responses before them
+                    if isinstance(response, GeneratorType):
+                        self.send_responses(client_socket, responses, connection)
+                        responses = []
+                        for chunk in iter(lambda: self.next_chunk(response), []):
+                            self.send_responses(client_socket, chunk, connection)
+                    else:
+                        responses.append(response)
+                # 批量消息超过长度上限时回复错误并断开 / Answer an error and disconnect when a batch exceeds the length cap
+                if reader.oversized is not None:
+                    responses.append(self.batch_too_long(reader))
+                # 一次性发送其余响应给客户端 / Send the remaining responses to the client at once
+                self.send_responses(client_socket, responses, connection)
+                if reader.oversized is not None:
                     break
-                    
-                # 处理请求并获取响应 / Process request and get response
-                response = self.process_request(data)
-                # 发送响应给客户端 / Send response to client
-                client_socket.send(response.encode('utf-8'))
+        # 空闲、读或写超时 / Idle, read or write timeout
+        except socket.timeout:
+            self.count_timeout()
         # 处理连接重置错误 / Handle connection reset error
-        except ConnectionResetError:
-            print("Client disconnected unexpectedly")
+        except (ConnectionResetError, BrokenPipeError):
+            self.logger.debug('client_reset', "Client disconnected unexpectedly")
         finally:
             # 关闭客户端socket / Close client socket
             client_socket.close()
+            if connection is not None:
+                self.metrics.close_connection(connection)
     
+    # 处理客户端连接协程（asyncio引擎） / Client connection handler coroutine (asyncio engine)
+    async def handle_client_async(self, reader, writer):
+        # 达到连接数上限时拒绝 / Reject at the connection limit
+        if not self.admit():
+            self.logger.debug('client_rejected', "Rejected client {address}: too many connections",
+                              address=writer.get_extra_info('peername'))
+            self.reject(writer.write, writer.close)
+            return
+        # 记录新客户端信息 / Log new client info
+        self.logger.debug('client_connected', "New client connected: {address}", address=writer.get_extra_info('peername'))
+        # 每个连接一个消息读取器，协议在收到第一批数据时确定
+        # One message reader per connection; the protocol is settled when the first bytes arrive
+        frames = FrameReader(max_batch_size=MAX_FRAME_SIZE)
+        process = None
+        # 启用性能指标时记录本连接的流量 / Record this connection's traffic when performance metrics are enabled
+        connection = None
+        if self.metrics is not None:
+            connection = self.metrics.open_connection(writer.get_extra_info('peername'))
+        # 超时时中止连接，等待中的读写随之结束 / A timeout aborts the connection, which ends the pending read or write
+        timer = ConnectionTimer(asyncio.get_running_loop(), writer.transport.abort)
+        # 阻塞请求等待时用于发现客户端已断开 / Lets blocking requests notice that the client disconnected while they wait
+        closed = lambda: reader.at_eof() or writer.transport.is_closing()
+        try:
+            while True:
+                # 接收客户端数据，空闲或请求接收太久时超时 / Receive client data, timing out when idle or when a request takes too long
+                timeout = self.receive_timeout(frames.partial_started())
+                # 剩余时间已用完时直接超时 / Time out at once when no time is left
+                if timeout is not None and timeout <= 0:
+                    timer.expired = True
+                    break
+                timer.reset(timeout)
+                data = await reader.read(frames.chunk_size)
+                # 如果没有数据则断开 / Disconnect if no data
+                if not data:
+                    break
+                frames.feed(data)
+                if connection is not None:
+                    connection.bytes_in += len(data)
+                # 处理请求时不计时，发送时由写超时限制 / No timeout while requests are processed; sends are bounded by the write timeout
+                timer.reset(None)
+
+                # 协商协议，接受二进制协议时回复握手 / Negotiate the protocol, answering the handshake when binary is accepted
+                if process is None:
+                    negotiated = self.negotiate(frames)
+                    if negotiated is None:
+                        continue
+                    frames, process, reply = negotiated
+                    if reply:
+                        writer.write(reply)
+
+                # 按顺序处理本次收到的所有完整请求 / Process every complete request received so far, in order
+                requests = frames.frames()
+                if connection is not None:
+                    requests = connection.count(requests)
+                if self.logger.sample_every:
+                    requests = self.log_requests(requests)
+                if self.router is None:
+                    await self.write_results(writer, (process(request, wait=self.process_wait_async, closed=closed)
+                                                      for request in requests), connection, timer)
+                else:
+                    # 转发会阻塞，放到转发线程池中执行；在本进程的阻塞请求处停下，由事件循环等待它
+                    # Forwarding blocks, so run it in the forward pool; stop at a blocking request of this worker, which the event loop waits for
+                    requests = iter(list(requests))
+                    loop = asyncio.get_running_loop()
+                    while True:
+                        results = await loop.run_in_executor(self.forward_pool, self.process_until_wait,
+                                                             process, requests, closed)
+                        if not results:
+                            break
+                        await self.write_results(writer, results, connection, timer)
+                # 批量消息超过长度上限时回复错误并断开 / Answer an error and disconnect when a batch exceeds the length cap
+                if frames.oversized is not None:
+                    await self.write_responses(writer, [self.batch_too_long(frames)], connection)
+                # 等待写缓冲区排空，保证内存有界 / Wait for the write buffer to drain so memory stays bounded
+                await self.drain(writer, timer)
+                if frames.oversized is not None:
+                    break
+        # 处理连接重置错误（超时中止连接时也会出现） / Handle connection reset error (also raised when a timeout aborts the connection)
+        except ConnectionResetError:
+            if not timer.expired:
+                self.logger.debug('client_reset', "Client disconnected unexpectedly")
+        finally:
+            timer.cancel()
+            if timer.expired:
+                self.count_timeout()
+            self.leave()
+            # 关闭客户端连接 / Close client connection
+            writer.close()
+            if connection is not None:
+                self.metrics.close_connection(connection)
+
+    # 按顺序发送一组请求的结果（asyncio引擎） / Send the results of a group of requests in order (asyncio engine)
+    async def write_results(self, writer, results, connection, timer):
+        responses = []
+        for response in results:
+            # 推迟的本进程阻塞请求在事件循环中开始等待 / A deferred blocking request of this worker starts waiting in the event loop
+            if isinstance(response, functools.partial):
+                response = response()
+            if isinstance(response, (str, bytes)):
+                responses.append(response)
+                continue
+            # 流式或阻塞请求：先发送已完成的响应 / Streamed or blocking request: flush finished responses first
+            if responses:
+                await self.write_responses(writer, responses, connection)
+                responses = []
+            if isinstance(response, GeneratorType):
+                await self.write_stream(writer, response, connection, timer)
+            else:
+                # 等待键出现 / Wait for the key
+                responses.append(await response)
+        # 发送响应给客户端 / Send responses to client
+        if responses:
+            await self.write_responses(writer, responses, connection)
+
+    # 在转发线程池中依次处理请求，遇到本进程的阻塞请求时停下并把它推迟给事件循环
+    # Process requests in order in the forward pool, stopping at a blocking request of this worker, which is deferred to the event loop
+    def process_until_wait(self, process, requests, closed=None):
+        results = []
+        for request in requests:
+            results.append(process(request, wait=self.defer_wait, closed=closed))
+            if isinstance(results[-1], functools.partial):
+                break
+        return results
+
+    # 推迟阻塞的READ/GET，由事件循环调用process_wait_async / Defer a blocking READ/GET; the event loop calls process_wait_async
+    def defer_wait(self, *args, **kwargs):
+        return functools.partial(self.process_wait_async, *args, **kwargs)
+
+    # 分块发送流式响应（asyncio引擎）；多进程模式下分发到其他进程的查询会阻塞，在线程池中生成每一块
+    # Send a streamed response in chunks (asyncio engine); queries fanned out to other workers block, so chunks are built in the thread pool in multi-process mode
+    async def write_stream(self, writer, stream, connection, timer):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.router is None:
+                chunk = self.next_chunk(stream)
+            else:
+                chunk = await loop.run_in_executor(self.forward_pool, self.next_chunk, stream)
+            if not chunk:
+                return
+            await self.write_responses(writer, chunk, connection)
+            # 等待客户端读取后再生成下一块 / Wait for the client to read before building the next chunk
+            await self.drain(writer, timer)
+
+    # 等待写缓冲区排空，客户端在写超时内不读取时连接被中止（asyncio引擎）
+    # Wait for the write buffer to drain; the connection is aborted when the client does not read within the write timeout (asyncio engine)
+    async def drain(self, writer, timer):
+        timer.reset(self.write_timeout)
+        await writer.drain()
+        timer.reset(None)
+        # 中止后drain可能正常返回，不再处理已缓冲的请求 / drain may return normally after an abort; stop before handling buffered requests
+        if timer.expired:
+            raise ConnectionResetError("write timeout")
+
+    # 发送一组响应（asyncio引擎） / Send a group of responses (asyncio engine)
+    async def write_responses(self, writer, responses, connection):
+        # 修改落盘后才确认 / Acknowledge changes only once they are on disk
+        await self.sync_log_async()
+        payload = self.encode_responses(responses)
+        if connection is not None:
+            connection.bytes_out += len(payload)
+        writer.write(payload)
+
     # 处理请求方法 / Request processing method
-    def process_request(self, request):
+    # wait处理阻塞的BR/BG请求，默认在当前线程中等待 / wait handles blocking BR/BG requests, by default waiting in the calling thread
+    # fan_out为False时查询只在本工作进程中执行 / With fan_out False queries only run in this worker
+    # closed返回客户端是否已断开，阻塞的请求据此放弃等待 / closed tells whether the client disconnected, so blocking requests stop waiting
+    def process_request(self, request, wait=None, fan_out=True, closed=None):
         try:
             # 清除请求首尾空白字符 / Strip whitespace from request
             request = request.strip()
-        
-            # === 基础验证 === / Basic validation
-            # 检查最小有效请求长度 / Check minimum valid request length
-            if len(request) < 5:  # 最小如 "005 R x" / Minimum like "005 R x"
-               return self.format_error("Message too short")
-        
-            # === 提取长度前缀 === / Extract length prefix
-            # 获取声明的长度字符串 / Get declared length string
-            declared_length_str = request[:3]
-            try:
-               # 转换为整数 / Convert to integer
-               declared_length = int(declared_length_str)
-            except ValueError:
-                return self.format_error("Invalid length prefix")
-        
-            # 验证声明的长度是否匹配实际长度 / Validate declared vs actual length
-            actual_length = len(request)
-            if actual_length != declared_length:
-                return self.format_error(
-                    f"Size mismatch (declared: {declared_length}, actual: {actual_length})"
-                )
-        
-            # === 提取操作和参数 === / Extract operation and parameters
-            # 跳过长度前缀和空格 / Skip length prefix and space
-            remaining_msg = request[4:]
-            # 分割消息（最多2次以兼容含空格的value） / Split message (max 2 splits for space-containing values)
-            parts = remaining_msg.split(maxsplit=2)
-        
-            # 检查必要参数 / Check required parameters
-            if len(parts) < 2 and parts[0] != 'P':
-                return self.format_error("Missing key")
-            
-            # 获取操作类型（转为大写） / Get operation type (uppercase)
-            operation = parts[0].upper()
-            # 获取键 / Get key
-            key = parts[1]
-            # 如果是PUT操作则获取值 / Get value if PUT operation
-            value = parts[2] if len(parts) > 2 and operation == 'P' else None
-        
+
+            # 批量消息单独处理 / Batch messages are handled separately
+            if request.startswith(BATCH_MARKER):
+                return self.process_batch(request)
+
+            # 解析请求，失败时得到错误响应 / Parse the request, getting an error response on failure
+            parsed = self.parse_request(request)
+            if isinstance(parsed, str):
+                return parsed
+            operation, key, argument = parsed
+
+            # 从节点只处理读请求 / Followers only serve reads
+            if self.follower is not None and operation in WRITE_OPERATIONS:
+                return self.format_error("Read-only follower")
+
+            # === 多进程转发 === / Multi-process forwarding
+            # 键属于其他工作进程时转发给所属进程 / Forward to the owning worker when another worker owns the key
+            if self.router is not None and operation in ('R', 'G', 'P', 'PX', 'BR', 'BG') and not self.router.is_local(key):
+                return self.router.forward(key, request, closed if operation in ('BR', 'BG') else None)
+
             # === 操作路由 === / Operation routing
             if operation == 'R':
                 return self.process_read(key)
@@ -189,9 +741,33 @@ class TupleSpaceServer:
                 return self.process_get(key)
             elif operation == 'P':
                 # PUT操作必须提供值 / PUT requires a value
-                if value is None:
+                if argument is None:
                     return self.format_error("PUT requires a value")
-                return self.process_put(key, value)
+                return self.process_put(key, argument)
+            elif operation == 'PX':
+                # 带TTL的PUT：参数为"<秒数> <值>" / PUT with a TTL: the argument is "<seconds> <value>"
+                parsed = self.parse_ttl(argument)
+                if isinstance(parsed, str):
+                    return parsed
+                return self.process_put(key, parsed[1], parsed[0])
+            elif operation in ('BR', 'BG'):
+                # 可选的超时秒数，省略时一直等待 / Optional timeout in seconds, wait forever when omitted
+                timeout = None
+                if argument is not None:
+                    try:
+                        timeout = float(argument)
+                    except ValueError:
+                        return self.format_error("Invalid timeout")
+                    if timeout < 0:
+                        return self.format_error("Timeout must not be negative")
+                return (wait or self.process_wait)(operation[1], key, timeout, closed=closed)
+            elif operation in QUERY_OPERATIONS:
+                # QP的参数为"[上限]"，QR为"<结束键> [上限]" / QP takes "[limit]", QR takes "<end key> [limit]"
+                parsed = self.parse_query(operation, argument)
+                if isinstance(parsed, str):
+                    return parsed
+                end, limit = parsed
+                return self.stream_text(self.process_query(operation, key, end, limit, fan_out))
             else:
                 return self.format_error(f"Invalid operation: {operation}")
             
@@ -199,62 +775,558 @@ class TupleSpaceServer:
         except Exception as e:
             return self.format_error(f"Internal error: {str(e)}")
 
+    # 解析请求：返回(操作, 键, 参数)，无效时返回错误响应
+    # Parse a request: returns (operation, key, argument), or an error response when it is invalid
+    def parse_request(self, request):
+        # === 基础验证 === / Basic validation
+        # 检查最小有效请求长度 / Check minimum valid request length
+        if len(request) < 5:  # 最小如 "005 R x" / Minimum like "005 R x"
+           return self.format_error("Message too short")
+    
+        # === 提取长度前缀 === / Extract length prefix
+        # 获取声明的长度字符串 / Get declared length string
+        declared_length_str = request[:3]
+        try:
+           # 转换为整数 / Convert to integer
+           declared_length = int(declared_length_str)
+        except ValueError:
+            return self.format_error("Invalid length prefix")
+    
+        # 验证声明的长度是否匹配实际字节数 / Validate declared length vs actual length in bytes
+        actual_length = byte_length(request)
+        if actual_length != declared_length:
+            return self.format_error(
+                f"Size mismatch (declared: {declared_length}, actual: {actual_length})"
+            )
+    
+        # === 提取操作和参数 === / Extract operation and parameters
+        # 跳过长度前缀和空格 / Skip length prefix and space
+        remaining_msg = request[4:]
+        # 分割消息（最多2次以兼容含空格的value） / Split message (max 2 splits for space-containing values)
+        parts = remaining_msg.split(maxsplit=2)
+    
+        # 检查必要参数 / Check required parameters
+        if len(parts) < 2 and parts[0] != 'P':
+            return self.format_error("Missing key")
+        
+        # 获取操作类型（转为大写） / Get operation type (uppercase)
+        operation = parts[0].upper()
+        # 获取键 / Get key
+        key = parts[1]
+        # 获取参数：PUT的值或阻塞操作的超时 / Get the argument: the PUT value or the blocking timeout
+        argument = parts[2] if len(parts) > 2 else None
+        return operation, key, argument
+
+    # 解析PX的参数：返回(过期时间, 值)，无效时返回错误响应
+    # Parse the argument of a PX: returns (expiry time, value), or an error response when it is invalid
+    def parse_ttl(self, argument):
+        parts = argument.split(maxsplit=1) if argument is not None else []
+        if len(parts) < 2:
+            return self.format_error("PX requires a TTL and a value")
+        try:
+            ttl = float(parts[0])
+        except ValueError:
+            return self.format_error("Invalid TTL")
+        if not 0 < ttl < float('inf'):
+            return self.format_error("TTL must be positive")
+        return time.time() + ttl, parts[1]
+
+    # 解析查询的参数：返回(结束键, 数量上限)，无效时返回错误响应
+    # Parse the arguments of a query: returns (end key, limit), or an error response when they are invalid
+    def parse_query(self, operation, argument):
+        parts = argument.split() if argument is not None else []
+        end = None
+        if operation == 'QR':
+            if not parts:
+                return self.format_error("QR requires an end key")
+            end = parts.pop(0)
+        if len(parts) > 1:
+            return self.format_error("Too many arguments")
+        limit = None
+        if parts:
+            if not parts[0].isdigit() or int(parts[0]) < 1:
+                return self.format_error("Invalid limit")
+            limit = int(parts[0])
+        return end, limit
+
+    # 超过长度上限的批量消息的错误响应 / Error response for a batch over the length cap
+    def batch_too_long(self, reader):
+        return self.format_error(f"Batch too long (declared: {reader.oversized}, maximum: {MAX_FRAME_SIZE})")
+
+    # 处理批量消息：所有操作在一次加锁中完成 / Batch handler: every operation is applied under one lock acquisition
+    def process_batch(self, request):
+        # 验证批量消息长度 / Validate the batch length
+        declared_length_str = request[1:BATCH_HEADER_SIZE - 1]
+        if not declared_length_str.isdigit():
+            return self.format_error("Invalid batch length prefix")
+        actual_length = byte_length(request)
+        if int(declared_length_str) != actual_length:
+            return self.format_error(
+                f"Batch size mismatch (declared: {int(declared_length_str)}, actual: {actual_length})"
+            )
+        try:
+            messages = list(split_batch(request[BATCH_HEADER_SIZE:]))
+        except ValueError as e:
+            return self.format_error(str(e))
+
+        parsed = [self.parse_request(message.strip()) for message in messages]
+        # 多进程模式下键分布在各进程中，逐条处理 / In multi-process mode the keys span workers, so process one by one
+        if self.router is not None:
+            # 阻塞操作和查询在路由之前拒绝，与单进程模式一致 / Blocking operations and queries are rejected before routing, as in single-process mode
+            responses = []
+            for message, operation in zip(messages, parsed):
+                error = self.batch_error(operation)
+                responses.append(self.process_request(message) if error is None else error)
+            return format_batch(responses)
+
+        keys = [operation[1] for operation in parsed if not isinstance(operation, str)]
+        # 按顺序锁定涉及的分片，每个分片只加锁一次 / Lock the shards involved in order, each one only once
+        with self.tuple_space.locked(keys):
+            responses = [self.apply_operation(operation) for operation in parsed]
+        return format_batch(responses)
+
+    # 批量中不能执行的操作返回错误响应：解析失败、阻塞操作和查询；其余返回None
+    # Error response for an operation a batch cannot run: one that failed to parse, a blocking operation or a query; None otherwise
+    def batch_error(self, parsed):
+        # 解析失败时直接返回错误响应 / Return the error response of a request that failed to parse
+        if isinstance(parsed, str):
+            return parsed
+        if parsed[0] in ('BR', 'BG'):
+            return self.format_error("Blocking operations are not allowed in a batch")
+        if parsed[0] in QUERY_OPERATIONS:
+            return self.format_error("Queries are not allowed in a batch")
+        return None
+
+    # 在已持有分片锁时执行一个批量中的操作 / Apply one operation of a batch with the shard locks already held
+    def apply_operation(self, parsed):
+        error = self.batch_error(parsed)
+        if error is not None:
+            return error
+        operation, key, argument = parsed
+        if self.follower is not None and operation in WRITE_OPERATIONS:
+            return self.format_error("Read-only follower")
+        shard = self.tuple_space.shard_for(key)
+        if operation == 'R':
+            return self.apply_read(shard, key)
+        elif operation == 'G':
+            return self.apply_get(shard, key)
+        elif operation == 'P':
+            # PUT操作必须提供值 / PUT requires a value
+            if argument is None:
+                return self.format_error("PUT requires a value")
+            return self.apply_put(shard, key, argument)
+        elif operation == 'PX':
+            parsed = self.parse_ttl(argument)
+            if isinstance(parsed, str):
+                return parsed
+            return self.apply_put(shard, key, parsed[1], parsed[0])
+        else:
+            return self.format_error(f"Invalid operation: {operation}")
+
     # 处理READ操作 / READ operation handler
     def process_read(self, key):
-        # 使用锁保证线程安全 / Use lock for thread safety
-        with self.lock:
-            # 更新操作统计 / Update operation stats
-            self.stats['total_operations'] += 1
-            self.stats['total_reads'] += 1
-            
-            # 检查键是否存在 / Check if key exists
-            if key in self.tuple_space:
-                # 返回值 / Return value
-                value = self.tuple_space[key]
-                return self.format_response(f"OK ({key}, {value}) read")
-            else:
-                # 更新错误统计 / Update error stats
-                self.stats['total_errors'] += 1
-                return self.format_response(f"ERR {key} does not exist")
-    
+        return self.run_locked('R', key, self.apply_read)
+
     # 处理GET操作 / GET operation handler
     def process_get(self, key):
-        with self.lock:
-            # 更新操作统计 / Update operation stats
-            self.stats['total_operations'] += 1
-            self.stats['total_gets'] += 1
-            
-            # 检查键是否存在 / Check if key exists
-            if key in self.tuple_space:
-                # 移除并返回值 / Remove and return value
-                value = self.tuple_space.pop(key)
-                return self.format_response(f"OK ({key}, {value}) removed")
+        return self.run_locked('G', key, self.apply_get)
+
+    # 处理PUT操作，deadline为可选的过期时间 / PUT operation handler; deadline is an optional expiry time
+    def process_put(self, key, value, deadline=None):
+        return self.run_locked('P', key, self.apply_put, value, deadline)
+
+    # 处理二进制请求帧，返回二进制响应帧、阻塞请求等待用的协程或查询的响应帧流
+    # Binary request frame handler; returns the response frame, a coroutine to await for a blocking request, or the frame stream of a query
+    def process_binary(self, frame, wait=None, fan_out=True, closed=None):
+        try:
+            try:
+                operation, key, argument, value = decode_request(frame)
+            except ValueError as e:
+                return encode_response(STATUS_ERROR, str(e))
+
+            # 从节点只处理读请求 / Followers only serve reads
+            if self.follower is not None and operation in WRITE_OPERATIONS:
+                return encode_response(STATUS_ERROR, "Read-only follower")
+
+            # 查询：键为前缀或起始键，值为QR的结束键，参数为数量上限
+            # Queries: the key is the prefix or start key, the value the end key of a QR, the argument the limit
+            if operation in QUERY_OPERATIONS:
+                if operation == 'QR' and not value:
+                    return encode_response(STATUS_ERROR, "QR requires an end key")
+                if argument == 0:
+                    return encode_response(STATUS_ERROR, "Invalid limit")
+                limit = None if argument == NO_ARGUMENT else argument
+                return self.stream_binary(self.process_query(operation, key, value or None, limit, fan_out))
+
+            # 键属于其他工作进程时转发给所属进程 / Forward to the owning worker when another worker owns the key
+            if self.router is not None and not self.router.is_local(key):
+                return self.router.forward(key, frame, closed if operation in ('BR', 'BG') else None)
+
+            # 结果在释放分片锁后才编码 / Results are encoded after the shard lock is released
+            if operation == 'R':
+                return encode_value(self.run_locked('R', key, self.read_tuple))
+            elif operation == 'G':
+                return encode_value(self.run_locked('G', key, self.get_tuple))
+            elif operation in ('P', 'PX'):
+                deadline = None
+                if operation == 'PX':
+                    if argument in (0, NO_ARGUMENT):
+                        return encode_response(STATUS_ERROR, "TTL must be positive")
+                    deadline = time.time() + argument / 1000
+                error = self.over_budget(self.tuple_space.shard_for(key), key, value)
+                if error is not None:
+                    return encode_response(STATUS_ERROR, error)
+                added = self.run_locked('P', key, self.put_tuple, value, deadline)
+                return encode_response(STATUS_OK if added else STATUS_EXISTS)
             else:
-                # 更新错误统计 / Update error stats
-                self.stats['total_errors'] += 1
-                return self.format_response(f"ERR {key} does not exist")
-    
-    # 处理PUT操作 / PUT operation handler
-    def process_put(self, key, value):
+                # BR/BG：参数为超时毫秒数 / BR/BG: the argument is the timeout in milliseconds
+                timeout = None if argument == NO_ARGUMENT else argument / 1000
+                return (wait or self.process_wait)(operation[1], key, timeout,
+                                                   lambda operation, key, value: encode_value(value), closed)
+
+        # 捕获所有异常 / Catch all exceptions
+        except Exception as e:
+            return encode_response(STATUS_ERROR, f"Internal error: {str(e)}")
+
+    # 执行前缀（QP）或范围（QR，不含结束键）查询，返回按键排序的(键, 值)迭代器；
+    # 合并各分片（fan_out时还有其他工作进程）各自有序的结果，按需分页读取
+    # Run a prefix (QP) or range (QR, end key excluded) query and return an iterator of (key, value) sorted by key;
+    # the sorted results of every shard (and of the other workers when fanning out) are merged and fetched page by page on demand
+    def process_query(self, operation, start, end, limit, fan_out=True):
         with self.lock:
+            self.stats['total_queries'] += 1
+        if operation == 'QP':
+            within = lambda key: key.startswith(start)
+        else:
+            within = lambda key: key < end
+        streams = [self.query_shard(shard, start, within) for shard in self.tuple_space.shards]
+        if self.router is not None and fan_out:
+            argument = NO_ARGUMENT if limit is None else limit
+            streams.extend(self.router.query_peers(encode_request(operation, start, end or '', argument)))
+        return itertools.islice(heapq.merge(*streams), limit)
+
+    # 按键顺序读取一个分片中从start开始、满足within的元组；每页只短暂持有分片锁，不更新LRU顺序
+    # Read the tuples of one shard from start on, in key order, while within holds; the shard lock is only held
+    # briefly for each page and the LRU order is not updated
+    def query_shard(self, shard, start, within):
+        cursor, inclusive = start, True
+        while True:
+            with shard.lock:
+                # 先删除已过期的元组 / Remove expired tuples first
+                if shard.deadlines:
+                    self.log_removed(shard.expire(time.time()))
+                keys = shard.index.keys_from(cursor, QUERY_PAGE_SIZE, inclusive)
+                page = []
+                for key in keys:
+                    if not within(key):
+                        break
+                    page.append((key, shard.tuples[key]))
+            yield from page
+            if len(page) < QUERY_PAGE_SIZE:
+                return
+            cursor, inclusive = page[-1][0], False
+
+    # 把查询结果编码为文本帧流：每个元组一帧，最后一帧为匹配数量
+    # Encode query results as a stream of text frames: one per tuple, then one with the match count
+    def stream_text(self, matches):
+        count = 0
+        try:
+            for key, value in matches:
+                # 文本帧放不下的元组（经二进制协议存放）跳过 / Tuples too long for a text frame (stored over the binary protocol) are skipped
+                if not self.fits_text(key, value):
+                    continue
+                count += 1
+                yield self.format_response(f"OK ({key}, {value}) matched")
+        except Exception as e:
+            yield self.format_error(f"Internal error: {str(e)}")
+            return
+        yield self.format_response(f"OK {count} tuples matched")
+
+    # 把查询结果编码为二进制帧流：每个元组一个STATUS_MATCH帧，最后是携带匹配数量的STATUS_OK帧
+    # Encode query results as a stream of binary frames: one STATUS_MATCH frame per tuple, then STATUS_OK with the match count
+    def stream_binary(self, matches):
+        count = 0
+        try:
+            for key, value in matches:
+                count += 1
+                yield encode_match(key, value)
+        except Exception as e:
+            yield encode_response(STATUS_ERROR, f"Internal error: {str(e)}")
+            return
+        yield encode_response(STATUS_OK, str(count))
+
+    # 锁定键所属的分片执行操作，启用性能指标时记录等锁和服务时间
+    # Apply an operation with the key's shard locked, recording lock-wait and service time when metrics are enabled
+    def run_locked(self, operation, key, apply, *args):
+        # 找到键所属的分片 / Find the shard that owns the key
+        index = self.tuple_space.shard_index(key)
+        shard = self.tuple_space.shards[index]
+        if self.metrics is None:
+            # 只锁定该分片保证线程安全 / Lock only that shard for thread safety
+            with shard.lock:
+                return apply(shard, key, *args)
+        started = time.perf_counter_ns()
+        with shard.lock:
+            acquired = time.perf_counter_ns()
+            response = apply(shard, key, *args)
+            # 在持有分片锁时记录到该分片的直方图 / Record into the shard's histograms while its lock is held
+            self.metrics.shards[index].record(operation, acquired - started, time.perf_counter_ns() - started)
+        return response
+
+    # 把成功的PUT记录到预写日志并发送给从节点（调用时持有分片锁）
+    # Record a successful PUT in the write-ahead log and for the followers (called with the shard lock held)
+    def log_put(self, key, value, deadline=None):
+        if self.log is not None:
+            self.log.append_put(key, value, deadline)
+        if self.replication is not None:
+            self.replication.append_put(key, value, deadline)
+
+    # 把成功的GET记录到预写日志并发送给从节点（调用时持有分片锁）
+    # Record a successful GET in the write-ahead log and for the followers (called with the shard lock held)
+    def log_get(self, key):
+        if self.log is not None:
+            self.log.append_get(key)
+        if self.replication is not None:
+            self.replication.append_get(key)
+
+    # 把过期或驱逐的键按GET记录（调用时持有分片锁） / Record expired or evicted keys like GETs (called with the shard lock held)
+    def log_removed(self, keys):
+        for key in keys:
+            self.log_get(key)
+
+    # 执行READ操作并返回文本响应（调用时持有分片锁） / Apply a READ and return the text response (called with the shard lock held)
+    def apply_read(self, shard, key):
+        return self.format_result('R', key, self.read_tuple(shard, key))
+
+    # 执行GET操作并返回文本响应（调用时持有分片锁） / Apply a GET and return the text response (called with the shard lock held)
+    def apply_get(self, shard, key):
+        # 文本响应放不下的值（经二进制协议存放）不移除 / Values too long for a text response (stored over the binary protocol) are not removed
+        value = shard.tuples.get(key)
+        if value is not None and not self.fits_text(key, value):
+            return self.format_error("Tuple too long for the text protocol")
+        return self.format_result('G', key, self.get_tuple(shard, key))
+
+    # 执行PUT操作并返回文本响应（调用时持有分片锁） / Apply a PUT and return the text response (called with the shard lock held)
+    def apply_put(self, shard, key, value, deadline=None):
+        error = self.over_budget(shard, key, value)
+        if error is not None:
+            return self.format_error(error)
+        return self.format_result('P', key, value if self.put_tuple(shard, key, value, deadline) else None)
+
+    # 大于分片内存上限的元组存入后会被立即驱逐，返回拒绝它的原因，否则返回None
+    # A tuple larger than the memory cap of its shard would be evicted as soon as it is stored; returns why it is rejected, or None
+    def over_budget(self, shard, key, value):
+        if shard.budget is not None and len(key) + len(value) > shard.budget:
+            return f"Tuple larger than the shard memory limit ({shard.budget})"
+        return None
+
+    # 读取键的值，不存在时返回None（调用时持有分片锁） / Read a key's value, None when it does not exist (called with the shard lock held)
+    def read_tuple(self, shard, key):
+        # 更新操作统计 / Update operation stats
+        shard.stats['total_operations'] += 1
+        shard.stats['total_reads'] += 1
+        # 先删除已过期的元组 / Remove expired tuples first
+        if shard.deadlines:
+            self.log_removed(shard.expire(time.time()))
+        
+        # 检查键是否存在 / Check if key exists
+        if key in shard.tuples:
+            # 返回值并记录访问 / Return value and record the access
+            shard.touch(key)
+            return shard.tuples[key]
+        # 更新错误统计 / Update error stats
+        shard.stats['total_errors'] += 1
+        return None
+
+    # 移除并返回键的值，不存在时返回None（调用时持有分片锁） / Remove and return a key's value, None when it does not exist (called with the shard lock held)
+    def get_tuple(self, shard, key):
+        # 更新操作统计 / Update operation stats
+        shard.stats['total_operations'] += 1
+        shard.stats['total_gets'] += 1
+        # 先删除已过期的元组 / Remove expired tuples first
+        if shard.deadlines:
+            self.log_removed(shard.expire(time.time()))
+        
+        # 检查键是否存在 / Check if key exists
+        if key in shard.tuples:
+            # 移除并返回值 / Remove and return value
+            value = shard.remove(key)
+            # 记录到预写日志并发送给从节点 / Record it in the write-ahead log and for the followers
+            self.log_get(key)
+            return value
+        # 更新错误统计 / Update error stats
+        shard.stats['total_errors'] += 1
+        return None
+
+    # 存放键值对，deadline为可选的过期时间，键已存在时返回False（调用时持有分片锁）
+    # Put a key-value pair, deadline being an optional expiry time; returns False when the key exists (called with the shard lock held)
+    def put_tuple(self, shard, key, value, deadline=None):
+        # 更新操作统计 / Update operation stats
+        shard.stats['total_operations'] += 1
+        shard.stats['total_puts'] += 1
+        # 先删除已过期的元组 / Remove expired tuples first
+        if shard.deadlines:
+            self.log_removed(shard.expire(time.time()))
+        
+        # 检查键是否已存在 / Check if key already exists
+        if key in shard.tuples:
+            # 更新错误统计 / Update error stats
+            shard.stats['total_errors'] += 1
+            return False
+        # 先把值交给等待该键的请求，被GET取走时不再存储
+        # Hand the value to requests waiting for the key first; it is not stored if a GET takes it
+        if key in shard.waiters and shard.hand_over(key, value, deadline):
+            return True
+        # 存储键值对 / Store key-value pair
+        shard.store(key, value, deadline)
+        # 记录到预写日志并发送给从节点 / Record it in the write-ahead log and for the followers
+        self.log_put(key, value, deadline)
+        # 超出内存上限时驱逐 / Evict when over the memory cap
+        if shard.budget is not None:
+            self.log_removed(shard.evict())
+        return True
+    
+    # 开始阻塞的READ/GET并返回Waiter：键已存在时Waiter立即完成，否则加入等待队列
+    # Start a blocking READ/GET and return its Waiter: done at once if the key exists, otherwise queued
+    def start_wait(self, operation, key, notify, fits=None):
+        shard = self.tuple_space.shard_for(key)
+        waiter = Waiter(operation, notify, fits)
+        with shard.lock:
             # 更新操作统计 / Update operation stats
-            self.stats['total_operations'] += 1
-            self.stats['total_puts'] += 1
-            
-            # 检查键是否已存在 / Check if key already exists
-            if key in self.tuple_space:
+            shard.stats['total_operations'] += 1
+            shard.stats['total_reads' if operation == 'R' else 'total_gets'] += 1
+            # 先删除已过期的元组 / Remove expired tuples first
+            if shard.deadlines:
+                self.log_removed(shard.expire(time.time()))
+
+            # 键已存在时立即完成 / Complete immediately when the key exists
+            if key in shard.tuples:
+                # 无法交给该GET的值（如文本响应放不下）不移除，响应会报告错误
+                # A value that cannot be handed to this GET (e.g. too long for a text response) is not removed; the response reports the error
+                if operation == 'R' or not waiter.accepts(shard.tuples[key]):
+                    waiter.value = shard.tuples[key]
+                    shard.touch(key)
+                else:
+                    waiter.value = shard.remove(key)
+                    self.log_get(key)
+                waiter.done = True
+                return waiter
+
+            # 否则等待PUT唤醒 / Otherwise wait for a PUT to wake it
+            shard.add_waiter(key, waiter)
+            return waiter
+
+    # 结束阻塞的READ/GET：返回交付的值，超时或客户端断开则移出队列并返回None；
+    # 交给GET的值无法送达已断开的客户端，重新存储
+    # Finish a blocking READ/GET: return the handed-over value, or leave the queue on timeout or disconnect and
+    # return None; a value handed to a GET whose client is gone cannot be delivered, so it is stored again
+    def finish_wait(self, key, waiter, closed=None):
+        shard = self.tuple_space.shard_for(key)
+        with shard.lock:
+            if not waiter.done:
+                shard.remove_waiter(key, waiter)
                 # 更新错误统计 / Update error stats
-                self.stats['total_errors'] += 1
-                return self.format_response(f"ERR {key} already exists")
-            else:
-                # 存储键值对 / Store key-value pair
-                self.tuple_space[key] = value
-                return self.format_response(f"OK ({key}, {value}) added")
-    
+                shard.stats['total_errors'] += 1
+                return None
+            # 客户端已断开时取走的值重新存放（保留原来的过期时间），不再作为结果发送，避免同一元组被取走两次
+            # Once the client is gone the value taken is stored again with its original expiry time and not sent as
+            # well, so one tuple is never taken twice
+            if waiter.operation == 'G' and closed is not None and closed():
+                if waiter.deadline is None or waiter.deadline > time.time():
+                    self.put_tuple(shard, key, waiter.value, waiter.deadline)
+                return None
+        return waiter.value
+
+    # 处理阻塞的READ/GET（在当前线程中等待），respond把结果编码为响应（默认文本），客户端断开时放弃等待
+    # Blocking READ/GET handler (waits in the calling thread); respond encodes the result (text by default); the wait
+    # is abandoned when the client disconnects
+    def process_wait(self, operation, key, timeout, respond=None, closed=None):
+        woken = threading.Event()
+        waiter = self.start_wait(operation, key, woken.set, self.text_fits(key, respond))
+        respond = respond or self.format_result
+        if waiter.done:
+            return respond(operation, key, waiter.value)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not woken.wait(self.wait_slice(deadline)):
+            if self.wait_over(deadline, closed):
+                break
+        return respond(operation, key, self.finish_wait(key, waiter, closed))
+
+    # 处理阻塞的READ/GET（asyncio引擎）：返回响应或等待用的协程
+    # Blocking READ/GET handler (asyncio engine): returns the response or a coroutine to await
+    def process_wait_async(self, operation, key, timeout, respond=None, closed=None):
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        # PUT可能来自其他线程 / The PUT may come from another thread
+        waiter = self.start_wait(operation, key, lambda: loop.call_soon_threadsafe(woken.set),
+                                 self.text_fits(key, respond))
+        respond = respond or self.format_result
+        if waiter.done:
+            return respond(operation, key, waiter.value)
+        return self.finish_wait_async(key, waiter, woken, timeout, respond, closed)
+
+    # 在事件循环中等待唤醒、超时或客户端断开 / Wait in the event loop until woken, timed out or the client disconnects
+    async def finish_wait_async(self, key, waiter, woken, timeout, respond, closed=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not woken.is_set():
+            try:
+                await asyncio.wait_for(woken.wait(), self.wait_slice(deadline))
+            except asyncio.TimeoutError:
+                if self.wait_over(deadline, closed):
+                    break
+        return respond(waiter.operation, key, self.finish_wait(key, waiter, closed))
+
+    # 文本响应（respond为None）只接收放得下的值，二进制响应接收任何值
+    # Text responses (respond is None) only take values that fit them; binary responses take any value
+    def text_fits(self, key, respond):
+        if respond is not None:
+            return None
+        return lambda value: self.fits_text(key, value)
+
+    # 元组能否放进一条文本响应 / Whether a tuple fits in a text response
+    def fits_text(self, key, value):
+        return byte_length(key) + byte_length(value) + TEXT_RESULT_OVERHEAD <= MAX_TEXT_RESPONSE
+
+    # 下一段等待的秒数，每段不超过轮询间隔以便检查客户端 / Seconds of the next wait slice, at most the poll interval so the client can be checked
+    def wait_slice(self, deadline):
+        if deadline is None:
+            return WAIT_POLL_INTERVAL
+        return max(0.0, min(WAIT_POLL_INTERVAL, deadline - time.monotonic()))
+
+    # 等待是否应结束：超时或客户端已断开 / Whether a wait should end: timed out or the client disconnected
+    def wait_over(self, deadline, closed):
+        if deadline is not None and time.monotonic() >= deadline:
+            return True
+        return closed is not None and closed()
+
+    # 客户端是否已关闭连接（只窥视不消费数据） / Whether the client closed the connection (peeks without consuming data)
+    # 使用poll而不是select，后者不支持大于等于FD_SETSIZE（1024）的文件描述符
+    # Uses poll rather than select, which fails for file descriptors of FD_SETSIZE (1024) and above
+    def client_closed(self, sock):
+        try:
+            poller = select.poll()
+            poller.register(sock, select.POLLIN)
+            if not poller.poll(0):
+                return False
+            return sock.recv(1, socket.MSG_PEEK) == b''
+        except OSError:
+            return True
+
+    # 把操作结果格式化为文本响应，value为None表示失败 / Format an operation result as a text response; a None value means it failed
+    def format_result(self, operation, key, value):
+        if value is None:
+            reason = 'already exists' if operation == 'P' else 'does not exist'
+            return self.format_response(f"ERR {key} {reason}")
+        verb = {'R': 'read', 'G': 'removed', 'P': 'added'}[operation]
+        return self.format_response(f"OK ({key}, {value}) {verb}")
+
     # 格式化响应方法 / Response formatting method
     def format_response(self, message):
         # 格式: NNN message (NNN是总长度) / Format: NNN message (NNN is total length)
-        size = len(message) + 4  # 3位长度+1空格 / 3 for size + 1 space
+        size = byte_length(message) + 4  # 3位长度+1空格，按字节计算 / 3 for size + 1 space, in bytes
+        # 经二进制协议存放的长值无法用3位长度表示 / Long values stored over the binary protocol do not fit the 3-digit length
+        if size > MAX_TEXT_RESPONSE:
+            return self.format_error("Tuple too long for the text protocol")
         return f"{size:03d} {message}"
     
     # 格式化错误方法 / Error formatting method
@@ -263,28 +1335,140 @@ class TupleSpaceServer:
 
 # 主函数 / Main function
 def main():
-    import sys
-    # 检查命令行参数 / Check command line arguments
-    if len(sys.argv) != 2:
-        print("Usage: python server.py <port>")
-        return
-    
+    import argparse
+    # 解析命令行参数 / Parse command line arguments
+    parser = argparse.ArgumentParser(usage="python server.py <port> [options]")
+    parser.add_argument('port', help="port number (50000-59999)")
+    parser.add_argument('--engine', choices=['threaded', 'asyncio'], default='threaded',
+                        help="connection handling engine (default: threaded)")
+    parser.add_argument('--backlog', type=int, default=128,
+                        help="listen backlog for pending connections (default: 128)")
+    parser.add_argument('--max-connections', type=int, default=1024,
+                        help="client connections served at once per process; more are rejected (default: 1024)")
+    parser.add_argument('--idle-timeout', type=float, default=300,
+                        help="seconds a connection may wait between requests; 0 disables (default: 300)")
+    parser.add_argument('--read-timeout', type=float, default=30,
+                        help="seconds allowed to receive one request once it started; 0 disables (default: 30)")
+    parser.add_argument('--write-timeout', type=float, default=30,
+                        help="seconds a client may take to read responses before it is dropped; 0 disables (default: 30)")
+    parser.add_argument('--shards', type=int, default=16,
+                        help="number of independently locked tuple space partitions (default: 16)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes sharing the port via SO_REUSEPORT (default: 1)")
+    parser.add_argument('--data-dir',
+                        help="directory for the write-ahead log and snapshots (default: no persistence)")
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default='group',
+                        help="when log records are fsynced (default: group)")
+    parser.add_argument('--snapshot-interval', type=float, default=60,
+                        help="seconds between snapshots that truncate the log (default: 60)")
+    parser.add_argument('--metrics-port', type=int,
+                        help="local port serving Prometheus metrics; enables instrumentation (default: off)")
+    parser.add_argument('--max-memory', type=int,
+                        help="cap on the total key and value size in characters; evicts beyond it (default: no cap)")
+    parser.add_argument('--eviction', choices=EVICTION_POLICIES, default='lru',
+                        help="which tuples are evicted first under --max-memory (default: lru)")
+    parser.add_argument('--replication-port', type=int,
+                        help="port streaming this server's mutations to followers (default: no replication)")
+    parser.add_argument('--replication-backlog', type=int, default=DEFAULT_BACKLOG,
+                        help=f"mutations kept for followers to resume from before they need a snapshot "
+                             f"(default: {DEFAULT_BACKLOG})")
+    parser.add_argument('--follow', metavar='HOST:PORT',
+                        help="run as a read-only follower of the primary with this replication address")
+    parser.add_argument('--log-level', choices=list(LEVELS), default='info',
+                        help="least severe events logged; debug adds connections and sampled requests (default: info)")
+    parser.add_argument('--log-format', choices=LOG_FORMATS, default='text',
+                        help="plain text lines or one JSON object per line (default: text)")
+    parser.add_argument('--log-sample', type=float, default=0.01,
+                        help="fraction of requests logged at the debug level (default: 0.01)")
+    args = parser.parse_args()
+    # 结构化日志，由所有工作进程共享配置 / Structured logger, its configuration shared by every worker
+    logger = Logger(args.log_level, args.log_format, sample=max(0.0, min(args.log_sample, 1.0)))
+
     try:
         # 获取端口号 / Get port number
-        port = int(sys.argv[1])
+        port = int(args.port)
         # 验证端口范围 / Validate port range
         if not (50000 <= port <= 59999):
             raise ValueError("Port must be between 50000 and 59999")
+        # 至少允许一个连接，超时不能为负 / At least one connection must be allowed and timeouts must not be negative
+        if args.max_connections < 1:
+            raise ValueError("Max connections must be at least 1")
+        if min(args.idle_timeout, args.read_timeout, args.write_timeout) < 0:
+            raise ValueError("Timeouts must not be negative")
+        # 采样率是比例 / The sample rate is a fraction
+        if not 0 <= args.log_sample <= 1:
+            raise ValueError("Log sample must be between 0 and 1")
+        # 至少需要一个分片 / At least one shard is required
+        if args.shards < 1:
+            raise ValueError("Shards must be at least 1")
+        # 至少需要一个工作进程 / At least one worker is required
+        if args.workers < 1:
+            raise ValueError("Workers must be at least 1")
+            
+        # 快照间隔必须为正 / The snapshot interval must be positive
+        if args.snapshot_interval <= 0:
+            raise ValueError("Snapshot interval must be positive")
+        # 内存上限至少要让每个工作进程的每个分片有空间 / The memory cap must leave room in every shard of every worker
+        if args.max_memory is not None and args.max_memory < args.shards * args.workers:
+            raise ValueError("Max memory must be at least the number of shards times the number of workers")
+        # 复制流覆盖整个键空间，只支持单进程 / A replication stream covers the whole key space, so only a single process is supported
+        if (args.replication_port is not None or args.follow is not None) and args.workers > 1:
+            raise ValueError("Replication cannot be combined with --workers")
+        if args.replication_backlog < 1:
+            raise ValueError("Replication backlog must be at least 1")
+        # 从节点的状态来自主节点 / A follower's state comes from its primary
+        follow = None
+        if args.follow is not None:
+            if args.replication_port is not None or args.data_dir is not None:
+                raise ValueError("A follower cannot use --replication-port or --data-dir")
+            host, _, follow_port = args.follow.rpartition(':')
+            if not host or not follow_port.isdigit():
+                raise ValueError("--follow must be HOST:PORT")
+            follow = (host, int(follow_port))
             
-        # 创建并启动服务器 / Create and start server
-        server = TupleSpaceServer(port)
-        server.start()
+        # 创建服务器 / Create server
+        def create_server(worker=None):
+            data_dir = args.data_dir
+            # 每个工作进程持久化自己的键分区 / Each worker persists its own key partition
+            if data_dir is not None and worker is not None:
+                data_dir = os.path.join(data_dir, f"worker-{worker}")
+            # 每个工作进程使用相邻的指标端口 / Each worker uses the next metrics port
+            metrics_port = args.metrics_port
+            if metrics_port is not None and worker is not None:
+                metrics_port += worker
+            # 每个工作进程只保存自己的键分区，平分内存上限 / Each worker only holds its own key partition, so the cap is split
+            max_memory = args.max_memory
+            if max_memory is not None and worker is not None:
+                max_memory //= args.workers
+            return TupleSpaceServer(port, backlog=args.backlog, num_shards=args.shards, data_dir=data_dir,
+                                    fsync=args.fsync, snapshot_interval=args.snapshot_interval,
+                                    metrics_port=metrics_port, max_memory=max_memory, eviction=args.eviction,
+                                    replication_port=args.replication_port,
+                                    replication_backlog=args.replication_backlog, follow=follow,
+                                    max_connections=args.max_connections, idle_timeout=args.idle_timeout or None,
+                                    read_timeout=args.read_timeout or None, write_timeout=args.write_timeout or None,
+                                    logger=logger)
+
+        # 多进程模式：按键空间划分给各工作进程 / Multi-process mode: key space partitioned across workers
+        if args.workers > 1:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise ValueError("--workers requires SO_REUSEPORT support")
+            from workers import run_workers
+            run_workers(create_server, args.workers, args.engine)
+            return
+
+        server = create_server()
+        # 按所选引擎启动服务器 / Start server with the selected engine
+        if args.engine == 'asyncio':
+            server.start_async()
+        else:
+            server.start()
     # 处理值错误 / Handle value error
     except ValueError as e:
-        print(f"Error: {e}")
+        logger.error('invalid_arguments', "Error: {error}", error=str(e))
     # 处理其他异常 / Handle other exceptions
     except Exception as e:
-        print(f"Server error: {e}")
+        logger.error('server_error', "Server error: {error}", error=str(e))
 
 # 程序入口 / Program entry point
 if __name__ == "__main__":
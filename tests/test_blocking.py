@@ -0,0 +1,156 @@
+# 阻塞READ/GET的测试 / Tests for blocking READ/GET
+import functools
+import os
+import resource
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from binary_protocol import encode_request
+from framing import FrameReader
+from server import TupleSpaceServer
+from workers import KeyRouter, key_owner
+
+# 高于select上限（FD_SETSIZE）的文件描述符 / A file descriptor above the select limit (FD_SETSIZE)
+HIGH_FD = 1103
+
+
+# 等待键的等待队列出现 / Wait until a key has a waiter queue
+def wait_for_waiter(shard, key):
+    deadline = time.monotonic() + 5
+    while key not in shard.waiters:
+        if time.monotonic() > deadline:
+            raise AssertionError(f"nobody waits for {key}")
+        time.sleep(0.01)
+
+
+# 返回一对已连接的套接字，第一个的文件描述符为HIGH_FD / Return a connected socket pair whose first socket has HIGH_FD
+def high_socketpair(test):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft <= HIGH_FD:
+        if hard != resource.RLIM_INFINITY and hard <= HIGH_FD:
+            test.skipTest("file descriptor limit too low")
+        resource.setrlimit(resource.RLIMIT_NOFILE, (HIGH_FD + 1, hard))
+    left, right = socket.socketpair()
+    high = socket.socket(fileno=os.dup2(left.fileno(), HIGH_FD))
+    left.close()
+    test.addCleanup(high.close)
+    test.addCleanup(right.close)
+    return high, right
+
+
+class BlockingGetTest(unittest.TestCase):
+    def setUp(self):
+        self.server = TupleSpaceServer(50000)
+        self.shard = self.server.tuple_space.shard_for('k')
+
+    # 在线程中开始阻塞GET，返回线程和结果列表 / Start a blocking GET in a thread; returns the thread and a result list
+    def start_get(self, closed):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.server.process_wait('G', 'k', None, closed=closed)))
+        thread.start()
+        wait_for_waiter(self.shard, 'k')
+        return thread, result
+
+    def test_disconnected_waiter_is_removed(self):
+        gone = threading.Event()
+        thread, result = self.start_get(gone.is_set)
+        gone.set()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertNotIn('k', self.shard.waiters)
+        # 之后的PUT存储元组，而不是交给已断开的GET / A later PUT stores the tuple instead of handing it to the gone GET
+        self.server.process_put('k', 'v')
+        self.assertEqual(self.shard.tuples.get('k'), 'v')
+
+    def test_value_for_gone_client_is_stored_again(self):
+        gone = threading.Event()
+        thread, result = self.start_get(gone.is_set)
+        # 值交付后客户端才断开 / The client disconnects once the value is handed over
+        with self.shard.lock:
+            gone.set()
+            self.server.put_tuple(self.shard, 'k', 'v')
+        thread.join(timeout=5)
+        self.assertEqual(self.shard.tuples.get('k'), 'v')
+        # 值不会同时发送给已断开的客户端 / The value is not also sent to the gone client
+        self.assertEqual(result[0][4:], "ERR k does not exist")
+
+    def test_stored_again_with_its_ttl(self):
+        gone = threading.Event()
+        thread, result = self.start_get(gone.is_set)
+        deadline = time.time() + 60
+        with self.shard.lock:
+            gone.set()
+            self.server.put_tuple(self.shard, 'k', 'v', deadline)
+        thread.join(timeout=5)
+        self.assertEqual(self.shard.deadlines.get('k'), deadline)
+
+    def test_live_client_with_high_descriptor(self):
+        server_socket, client_socket = high_socketpair(self)
+        closed = functools.partial(self.server.client_closed, server_socket)
+        self.assertFalse(closed())
+        thread, result = self.start_get(closed)
+        # 跨过至少一次客户端检查 / Span at least one client check
+        time.sleep(0.7)
+        self.server.process_put('k', 'v')
+        thread.join(timeout=5)
+        self.assertEqual(result[0][4:], "OK (k, v) removed")
+        self.assertNotIn('k', self.shard.tuples)
+        client_socket.close()
+        self.assertTrue(closed())
+
+
+class ForwardTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.router = KeyRouter(0, 2, self.directory.name)
+        self.key = next(key for key in map(str, range(100)) if key_owner(key, 2) == 1)
+        self.sock, self.peer = high_socketpair(self)
+        self.router.local.connections = {(1, False): (self.sock, FrameReader())}
+
+    def test_blocking_forward_with_high_descriptor(self):
+        # 所属进程稍后才回复 / The owner only answers after a while
+        timer = threading.Timer(0.7, lambda: self.peer.sendall(b"018 OK (x, v) read"))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        response = self.router.forward(self.key, f"012 BR {self.key} 1", lambda: False)
+        self.assertEqual(response, "018 OK (x, v) read")
+        self.assertIn((1, False), self.router.local.connections)
+
+    def test_connection_dropped_after_error(self):
+        def closed():
+            raise RuntimeError("check failed")
+        with self.assertRaises(RuntimeError):
+            self.router.forward(self.key, f"012 BR {self.key} 1", closed)
+        # 响应未读的连接不再使用 / A connection whose reply was not read is not used again
+        self.assertNotIn((1, False), self.router.local.connections)
+
+
+class TooLongForTextTest(unittest.TestCase):
+    def setUp(self):
+        self.server = TupleSpaceServer(50000)
+        self.value = 'x' * 2000
+
+    def test_existing_tuple_is_not_removed(self):
+        self.server.process_binary(encode_request('P', 'big', self.value))
+        response = self.server.process_request('012 BG big 1')
+        self.assertEqual(response[4:], "ERR Tuple too long for the text protocol")
+        self.assertEqual(self.server.tuple_space.shard_for('big').tuples.get('big'), self.value)
+
+    def test_waiting_text_get_is_skipped(self):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.server.process_request('014 BG big 0.5')))
+        thread.start()
+        shard = self.server.tuple_space.shard_for('big')
+        wait_for_waiter(shard, 'big')
+        self.server.process_binary(encode_request('P', 'big', self.value))
+        thread.join(timeout=5)
+        self.assertEqual(result[0][4:], "ERR big does not exist")
+        self.assertEqual(shard.tuples.get('big'), self.value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+# 长度前缀分帧的测试 / Tests for length-prefix framing
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from client import TupleSpaceClient
+from framing import READ_SIZE, FrameReader, byte_length, format_batch, split_batch
+from server import TupleSpaceServer
+from workers import KeyRouter
+
+
+# 把请求行编码为文本请求 / Encode request lines as text requests
+def encode(*lines):
+    client = TupleSpaceClient(None, None, None)
+    return [client.build_request(line)[0] for line in lines]
+
+
+class FrameReaderTest(unittest.TestCase):
+    def test_prefix_counts_utf8_bytes(self):
+        request, = encode("PUT café latte")
+        self.assertEqual(int(request[:3]), len(request.encode('utf-8')))
+        self.assertEqual(int(request[:3]), byte_length(request))
+
+    def test_coalesced_frames(self):
+        requests = encode("PUT café latte", "READ café", "GET naïve")
+        reader = FrameReader()
+        reader.feed(''.join(requests).encode('utf-8'))
+        self.assertEqual(list(reader.frames()), requests)
+        self.assertEqual(reader.start, reader.end)
+
+    def test_frame_split_across_reads(self):
+        requests = encode("PUT café latte", "READ café")
+        data = ''.join(requests).encode('utf-8')
+        reader = FrameReader(chunk_size=4)
+        frames = []
+        # 逐字节送入，包括多字节字符的中间 / Feed one byte at a time, including the middle of multi-byte characters
+        for position in range(len(data)):
+            reader.feed(data[position:position + 1])
+            frames.extend(reader.frames())
+        self.assertEqual(frames, requests)
+
+    def test_buffer_allocated_on_demand(self):
+        requests = encode("PUT café latte", "READ café")
+        reader = FrameReader()
+        self.assertEqual(len(reader.buffer), 0)
+        data = ''.join(requests).encode('utf-8')
+        # 完整消息直接从收到的bytes中取出 / Complete messages are popped straight from the bytes received
+        reader.feed(data[:-3])
+        self.assertEqual(list(reader.frames()), requests[:1])
+        # 剩余的不完整消息复制到缓冲区 / The partial message left over is copied into a buffer
+        reader.feed(data[-3:])
+        self.assertIsInstance(reader.buffer, bytearray)
+        self.assertEqual(list(reader.frames()), requests[1:])
+        # 消费完后不再引用任何数据 / Nothing is referenced once everything is consumed
+        self.assertEqual(len(reader.buffer), 0)
+
+    def test_long_message_buffer_is_released(self):
+        request, = encode("READ a")
+        batch = format_batch([request] * 100).encode('utf-8')
+        reader = FrameReader(chunk_size=64)
+        for position in range(0, len(batch), 50):
+            reader.feed(batch[position:position + 50])
+        self.assertGreater(len(reader.buffer), 64)
+        self.assertEqual(len(list(reader.frames())), 1)
+        self.assertEqual(len(reader.buffer), 0)
+
+    def test_read_size_grows_with_traffic(self):
+        server_socket, client_socket = socket.socketpair()
+        self.addCleanup(server_socket.close)
+        self.addCleanup(client_socket.close)
+        request, = encode("READ a")
+        reader = FrameReader()
+        client_socket.sendall(request.encode('utf-8'))
+        reader.fill(server_socket)
+        list(reader.frames())
+        # 少量数据只占用一次小的接收 / Little data only takes one small read
+        self.assertEqual(len(reader.buffer), READ_SIZE)
+        data = request.encode('utf-8') * 20000
+        thread = threading.Thread(target=client_socket.sendall, args=(data,))
+        thread.start()
+        frames = 0
+        while frames < 20000:
+            reader.fill(server_socket)
+            frames += len(list(reader.frames()))
+        thread.join()
+        self.assertEqual(reader.read_size, reader.chunk_size)
+
+    def test_batch_with_non_ascii(self):
+        requests = encode("PUT café latte", "READ café")
+        batch = format_batch(requests)
+        self.assertEqual(int(batch[1:9]), len(batch.encode('utf-8')))
+        self.assertEqual(list(split_batch(batch[10:])), requests)
+
+    def test_oversized_batch_is_not_buffered(self):
+        request, = encode("READ a")
+        reader = FrameReader(max_batch_size=100)
+        reader.feed((request + "*99999999 " + request).encode('utf-8'))
+        self.assertEqual(list(reader.frames()), [request])
+        self.assertEqual(reader.oversized, 99999999)
+        self.assertEqual(reader.start, reader.end)
+        # 之后收到的数据被忽略 / Data received afterwards is ignored
+        reader.feed(request.encode('utf-8'))
+        self.assertEqual(list(reader.frames()), [])
+
+
+class ServerFramingTest(unittest.TestCase):
+    def setUp(self):
+        self.server = TupleSpaceServer(50000)
+
+    def test_non_ascii_request_and_response(self):
+        put, read = encode("PUT café latte", "READ café")
+        self.assertEqual(self.server.process_request(put), "027 OK (café, latte) added")
+        response = self.server.process_request(read)
+        self.assertEqual(response[4:], "OK (café, latte) read")
+        self.assertEqual(int(response[:3]), len(response.encode('utf-8')))
+
+    def test_connection_stays_in_sync(self):
+        server_socket, client_socket = socket.socketpair()
+        thread = threading.Thread(target=self.server.handle_client, args=(server_socket, True))
+        thread.start()
+        try:
+            # 两条请求在一次发送中，第一条包含非ASCII字符 / Both requests in one send, the first one with non-ASCII characters
+            client_socket.sendall(''.join(encode("PUT café latte", "READ café", "READ x")).encode('utf-8'))
+            reader = FrameReader()
+            responses = [reader.read_frame(client_socket) for _ in range(3)]
+        finally:
+            client_socket.close()
+            thread.join()
+        self.assertEqual([response[4:] for response in responses],
+                         ["OK (café, latte) added", "OK (café, latte) read", "ERR x does not exist"])
+
+    def test_oversized_batch_closes_connection(self):
+        server_socket, client_socket = socket.socketpair()
+        thread = threading.Thread(target=self.server.handle_client, args=(server_socket, True))
+        thread.start()
+        try:
+            request, = encode("READ x")
+            client_socket.sendall((request + "*99999999 " + request).encode('utf-8'))
+            reader = FrameReader()
+            responses = [reader.read_frame(client_socket) for _ in range(3)]
+        finally:
+            client_socket.close()
+            thread.join()
+        self.assertEqual(responses[0][4:], "ERR x does not exist")
+        self.assertEqual(responses[1][4:], "ERR Batch too long (declared: 99999999, maximum: 16777216)")
+        # 服务器已关闭连接 / The server closed the connection
+        self.assertIsNone(responses[2])
+
+
+class WorkerBatchTest(unittest.TestCase):
+    def test_blocking_operations_and_queries_are_rejected(self):
+        server = TupleSpaceServer(50000)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # 多进程模式；被拒绝的请求不会转发给其他进程 / Multi-process mode; rejected requests are never forwarded
+        server.router = KeyRouter(0, 2, directory.name)
+        batch = format_batch(encode("BGET zzz 2", "BREAD zzz", "QUERY a", "RANGE a b"))
+        started = time.monotonic()
+        response = server.process_request(batch)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([message[4:] for message in split_batch(response[10:])],
+                         ["ERR Blocking operations are not allowed in a batch"] * 2 +
+                         ["ERR Queries are not allowed in a batch"] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+# 内存上限的测试 / Tests for the memory cap
+import unittest
+
+from binary_protocol import STATUS_ERROR, decode_response, encode_request
+from server import TupleSpaceServer
+
+
+class OversizedPutTest(unittest.TestCase):
+    def setUp(self):
+        # 每个分片最多10个字符 / At most 10 characters per shard
+        self.server = TupleSpaceServer(50000, num_shards=2, max_memory=20)
+        self.shard = self.server.tuple_space.shard_for('k')
+
+    def test_text_put_is_rejected(self):
+        response = self.server.process_put('k', 'x' * 10)
+        self.assertEqual(response[4:], "ERR Tuple larger than the shard memory limit (10)")
+        self.assertNotIn('k', self.shard.tuples)
+        self.assertEqual(self.shard.stats['total_evicted'], 0)
+
+    def test_binary_put_is_rejected(self):
+        status, payload = decode_response(self.server.process_binary(encode_request('P', 'k', 'x' * 10)))
+        self.assertEqual(status, STATUS_ERROR)
+        self.assertEqual(payload, "Tuple larger than the shard memory limit (10)")
+        self.assertNotIn('k', self.shard.tuples)
+
+    def test_put_within_the_limit_is_stored(self):
+        self.assertEqual(self.server.process_put('k', 'x' * 9)[4:], "OK (k, xxxxxxxxx) added")
+        self.assertEqual(self.shard.tuples.get('k'), 'x' * 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# 预写日志恢复的测试 / Tests for write-ahead log recovery
+import os
+import tempfile
+import time
+import unittest
+
+from persistence import SNAPSHOT_FILE, WriteAheadLog, log_generations, log_path
+from tuple_store import ShardedTupleSpace
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_dir = self.directory.name
+        self.logs = []
+
+    def tearDown(self):
+        for log in self.logs:
+            log.file.close()
+        self.directory.cleanup()
+
+    # 模拟一次服务器启动：恢复到新的元组空间 / Simulate a server start: recover into a new tuple space
+    def start(self):
+        tuple_space = ShardedTupleSpace(num_shards=4)
+        log = WriteAheadLog(self.data_dir, fsync='always')
+        replayed = log.recover(tuple_space)
+        self.logs.append(log)
+        return tuple_space, log, replayed
+
+    # 像服务器一样存放元组并记录 / Put a tuple and log it, as the server does
+    def put(self, tuple_space, log, key, value, deadline=None):
+        tuple_space.shard_for(key).store(key, value, deadline)
+        log.append_put(key, value, deadline)
+
+    # 像服务器一样取走元组并记录 / Take a tuple and log it, as the server does
+    def get(self, tuple_space, log, key):
+        tuple_space.shard_for(key).remove(key)
+        log.append_get(key)
+
+    # 元组空间中的所有元组 / Every tuple in a tuple space
+    def contents(self, tuple_space):
+        return {key: value for shard in tuple_space.shards for key, value in shard.tuples.items()}
+
+    def test_snapshot_and_log_tail(self):
+        tuple_space, log, replayed = self.start()
+        self.assertEqual(replayed, 0)
+        for key in ('a', 'b', 'c'):
+            self.put(tuple_space, log, key, key.upper())
+        self.assertEqual(log.snapshot(tuple_space), 3)
+        # 快照之后的修改只在日志尾部 / Changes after the snapshot are only in the log tail
+        self.get(tuple_space, log, 'a')
+        self.put(tuple_space, log, 'd', 'D')
+
+        recovered, _, replayed = self.start()
+        self.assertEqual(replayed, 2)
+        self.assertEqual(self.contents(recovered), {'b': 'B', 'c': 'C', 'd': 'D'})
+        # 索引与恢复的元组一致 / The index matches the recovered tuples
+        self.assertEqual(sorted(key for shard in recovered.shards for key in shard.index.keys_from('', 10)),
+                         ['b', 'c', 'd'])
+
+    def test_torn_last_record(self):
+        tuple_space, log, _ = self.start()
+        self.put(tuple_space, log, 'a', 'A')
+        self.put(tuple_space, log, 'b', 'B')
+        # 崩溃时最后一条记录只写了一半 / The last record was half written when the server crashed
+        log.file.write('["P", "c", "C')
+        log.file.flush()
+        torn = log.generation
+
+        recovered, restarted, replayed = self.start()
+        self.assertEqual(replayed, 2)
+        self.assertEqual(self.contents(recovered), {'a': 'A', 'b': 'B'})
+        # 新记录写入新一代日志，不追加在截断的记录之后 / New records go to a new log, not after the torn record
+        self.assertGreater(restarted.generation, torn)
+        self.put(recovered, restarted, 'c', 'C')
+        again, _, _ = self.start()
+        self.assertEqual(self.contents(again), {'a': 'A', 'b': 'B', 'c': 'C'})
+
+    def test_records_that_expired_while_down(self):
+        tuple_space, log, _ = self.start()
+        now = time.time()
+        self.put(tuple_space, log, 'old', 'snapshot', now + 0.2)
+        self.put(tuple_space, log, 'kept', 'snapshot', now + 3600)
+        log.snapshot(tuple_space)
+        self.put(tuple_space, log, 'gone', 'log', now + 0.2)
+        self.put(tuple_space, log, 'live', 'log', now + 3600)
+        self.put(tuple_space, log, 'plain', 'log')
+        # 服务器停机期间过期 / Expire while the server is down
+        time.sleep(0.3)
+
+        recovered, _, _ = self.start()
+        self.assertEqual(self.contents(recovered), {'kept': 'snapshot', 'live': 'log', 'plain': 'log'})
+        # 未过期的元组保留过期时间 / Tuples that did not expire keep their deadline
+        self.assertEqual(recovered.shard_for('kept').deadlines['kept'], now + 3600)
+        self.assertEqual(recovered.shard_for('live').deadlines['live'], now + 3600)
+        self.assertNotIn('plain', recovered.shard_for('plain').deadlines)
+
+    def test_generations_after_restart(self):
+        tuple_space, log, _ = self.start()
+        self.assertEqual(log.generation, 1)
+        self.put(tuple_space, log, 'a', 'A')
+        log.snapshot(tuple_space)
+        # 快照包含第1代，日志切换到第2代并删除第1代 / The snapshot contains generation 1; the log moves to 2 and 1 is deleted
+        self.assertEqual((log.snapshot_generation, log.generation), (1, 2))
+        self.assertEqual(log_generations(self.data_dir), [2])
+
+        _, restarted, _ = self.start()
+        self.assertEqual(restarted.snapshot_generation, 1)
+        self.assertEqual(restarted.generation, 3)
+        self.assertEqual(log_generations(self.data_dir), [2, 3])
+
+        # 没有日志时代号仍然在快照之后 / Without any log the generation still follows the snapshot
+        for generation in log_generations(self.data_dir):
+            os.remove(log_path(self.data_dir, generation))
+        recovered, restarted, _ = self.start()
+        self.assertEqual(restarted.generation, 2)
+        self.assertEqual(self.contents(recovered), {'a': 'A'})
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, SNAPSHOT_FILE)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# 有序键索引和前缀/范围查询的测试 / Tests for the sorted key index and prefix/range queries
+import random
+import unittest
+
+from server import QUERY_PAGE_SIZE, TupleSpaceServer
+from tuple_store import INDEX_CHUNK_SIZE, SortedKeys
+
+
+# 生成n个按数字顺序排列的键 / Build n keys that sort in numeric order
+def make_keys(n):
+    return [f"k{number:05d}" for number in range(n)]
+
+
+class SortedKeysTest(unittest.TestCase):
+    def setUp(self):
+        self.keys = make_keys(5 * INDEX_CHUNK_SIZE)
+        self.index = SortedKeys()
+        shuffled = list(self.keys)
+        random.Random(1).shuffle(shuffled)
+        for key in shuffled:
+            self.index.add(key)
+
+    # 检查块内和块之间有序、每块的最大键正确且没有过大的块
+    # Check that chunks are sorted within and between each other, their maxes are right and none is too long
+    def assert_consistent(self, expected):
+        self.assertEqual([key for chunk in self.index.chunks for key in chunk], expected)
+        self.assertEqual(self.index.maxes, [chunk[-1] for chunk in self.index.chunks])
+        for chunk in self.index.chunks:
+            self.assertTrue(0 < len(chunk) <= 2 * INDEX_CHUNK_SIZE)
+
+    def test_add_splits_chunks(self):
+        self.assertGreater(len(self.index.chunks), 1)
+        self.assert_consistent(self.keys)
+
+    def test_add_in_order_splits_the_last_chunk(self):
+        index = SortedKeys()
+        for key in self.keys:
+            index.add(key)
+        self.index = index
+        self.assertGreater(len(index.chunks), 1)
+        self.assert_consistent(self.keys)
+
+    def test_remove_across_chunks(self):
+        remaining = list(self.keys)
+        removed = list(self.keys)
+        random.Random(2).shuffle(removed)
+        for position, key in enumerate(removed):
+            self.index.remove(key)
+            remaining.remove(key)
+            if position % 500 == 0:
+                self.assert_consistent(remaining)
+        self.assertEqual(self.index.chunks, [])
+        self.assertEqual(self.index.maxes, [])
+
+    def test_remove_empties_a_middle_chunk(self):
+        middle = list(self.index.chunks[1])
+        for key in middle:
+            self.index.remove(key)
+        self.assert_consistent([key for key in self.keys if key not in middle])
+        # 删空的块之后还能插回 / Keys can be added back after their chunk was emptied
+        for key in middle:
+            self.index.add(key)
+        self.assert_consistent(self.keys)
+
+    def test_keys_from_inclusive_and_exclusive(self):
+        self.assertEqual(self.index.keys_from('k00010', 3), ['k00010', 'k00011', 'k00012'])
+        self.assertEqual(self.index.keys_from('k00010', 3, inclusive=False), ['k00011', 'k00012', 'k00013'])
+        # 起点不是已有的键 / A start that is not a key
+        self.assertEqual(self.index.keys_from('k00010x', 2), ['k00011', 'k00012'])
+        self.assertEqual(self.index.keys_from('k00010x', 2, inclusive=False), ['k00011', 'k00012'])
+        self.assertEqual(self.index.keys_from('', 1), ['k00000'])
+
+    def test_keys_from_at_chunk_boundary(self):
+        last = self.index.maxes[0]
+        following = self.index.chunks[1][0]
+        self.assertEqual(self.index.keys_from(last, 2), [last, following])
+        self.assertEqual(self.index.keys_from(last, 1, inclusive=False), [following])
+
+    def test_keys_from_at_the_end(self):
+        self.assertEqual(self.index.keys_from(self.keys[-1], 5), [self.keys[-1]])
+        self.assertEqual(self.index.keys_from(self.keys[-1], 5, inclusive=False), [])
+        self.assertEqual(self.index.keys_from('z', 5), [])
+        self.assertEqual(SortedKeys().keys_from('', 5), [])
+
+    def test_paging_visits_every_key_once(self):
+        pages = []
+        cursor, inclusive = '', True
+        while True:
+            page = self.index.keys_from(cursor, 100, inclusive)
+            pages.extend(page)
+            if len(page) < 100:
+                break
+            cursor, inclusive = page[-1], False
+        self.assertEqual(pages, self.keys)
+
+
+class QueryBoundaryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = TupleSpaceServer(50000)
+        for key in ('a', 'ab', 'abc', 'abd', 'ac', 'b', 'bé'):
+            self.server.process_put(key, key.upper())
+
+    # 查询匹配的键 / Keys matched by a query
+    def query(self, operation, start, end=None, limit=None):
+        return [key for key, _ in self.server.process_query(operation, start, end, limit)]
+
+    def test_prefix_boundaries(self):
+        self.assertEqual(self.query('QP', 'ab'), ['ab', 'abc', 'abd'])
+        self.assertEqual(self.query('QP', 'abc'), ['abc'])
+        self.assertEqual(self.query('QP', 'b'), ['b', 'bé'])
+        self.assertEqual(self.query('QP', 'abz'), [])
+        self.assertEqual(self.query('QP', ''), ['a', 'ab', 'abc', 'abd', 'ac', 'b', 'bé'])
+
+    def test_range_includes_start_and_excludes_end(self):
+        self.assertEqual(self.query('QR', 'ab', 'ac'), ['ab', 'abc', 'abd'])
+        self.assertEqual(self.query('QR', 'aa', 'ab'), [])
+        self.assertEqual(self.query('QR', 'abc', 'abd'), ['abc'])
+        self.assertEqual(self.query('QR', 'ac', 'z'), ['ac', 'b', 'bé'])
+
+    def test_limit(self):
+        self.assertEqual(self.query('QP', 'a', limit=2), ['a', 'ab'])
+        self.assertEqual(self.query('QR', 'abc', 'z', limit=3), ['abc', 'abd', 'ac'])
+
+    def test_pages_across_one_shard(self):
+        server = TupleSpaceServer(50000, num_shards=1)
+        keys = make_keys(3 * QUERY_PAGE_SIZE + 1)
+        for key in reversed(keys):
+            server.process_put(key, 'v')
+        matches = [key for key, _ in server.process_query('QP', 'k', None, None)]
+        self.assertEqual(matches, keys)
+        # 分页边界上的范围结束键 / A range ending on a page boundary
+        end = keys[QUERY_PAGE_SIZE]
+        matches = [key for key, _ in server.process_query('QR', keys[0], end, None)]
+        self.assertEqual(matches, keys[:QUERY_PAGE_SIZE])
+
+
+if __name__ == '__main__':
+    unittest.main()
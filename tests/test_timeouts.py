@@ -0,0 +1,97 @@
+# 连接超时的测试 / Tests for connection timeouts
+import asyncio
+import socket
+import threading
+import time
+import unittest
+
+from framing import FrameReader
+from server import TupleSpaceServer
+
+# 对不存在的键的READ请求 / READ request for a key that does not exist
+REQUEST = b"008 R ab"
+RESPONSE = "ERR ab does not exist"
+
+
+class ThreadedTimeoutTest(unittest.TestCase):
+    def make_server(self, **timeouts):
+        return TupleSpaceServer(50000, **timeouts)
+
+    # 开始服务一个连接，返回客户端套接字 / Start serving one connection; returns the client socket
+    def connect(self, server):
+        server_socket, client_socket = socket.socketpair()
+        thread = threading.Thread(target=server.handle_client, args=(server_socket,))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(client_socket.close)
+        return client_socket
+
+    # 等待服务器关闭连接，返回所用的秒数 / Wait for the server to close the connection; returns the seconds it took
+    def wait_closed(self, sock):
+        started = time.monotonic()
+        sock.settimeout(5)
+        while sock.recv(4096):
+            pass
+        return time.monotonic() - started
+
+    def test_pipelined_requests_each_get_the_read_timeout(self):
+        server = self.make_server(read_timeout=0.5)
+        sock = self.connect(server)
+        # 缓冲区中总留有半条请求，但每条请求都在0.1秒内收完 / Half a request is always buffered, yet each one completes within 0.1 s
+        sock.sendall(REQUEST[:4])
+        for _ in range(12):
+            time.sleep(0.1)
+            sock.sendall(REQUEST[4:] + REQUEST[:4])
+        sock.sendall(REQUEST[4:])
+        reader = FrameReader()
+        sock.settimeout(5)
+        responses = [reader.read_frame(sock) for _ in range(13)]
+        self.assertEqual([response[4:] for response in responses], [RESPONSE] * 13)
+        self.assertEqual(server.stats['total_timeouts'], 0)
+
+    def test_stalled_request_times_out(self):
+        server = self.make_server(read_timeout=0.3)
+        sock = self.connect(server)
+        sock.sendall(REQUEST[:4])
+        self.assertLess(self.wait_closed(sock), 2)
+        self.assertEqual(server.stats['total_timeouts'], 1)
+
+    def test_idle_timeout(self):
+        server = self.make_server(idle_timeout=0.3)
+        sock = self.connect(server)
+        self.assertLess(self.wait_closed(sock), 2)
+        self.assertEqual(server.stats['total_timeouts'], 1)
+
+    def test_no_time_left_counts_as_timeout(self):
+        server = self.make_server()
+        # 部分接收的请求没有剩余时间 / No time left for a partly received request
+        server.receive_timeout = lambda pending_since: None if pending_since is None else 0.0
+        sock = self.connect(server)
+        sock.sendall(REQUEST[:4])
+        self.assertLess(self.wait_closed(sock), 2)
+        self.assertEqual(server.stats['total_timeouts'], 1)
+
+
+class AsyncTimeoutTest(ThreadedTimeoutTest):
+    # 在独立线程的事件循环中通过TCP服务连接 / Serve connections over TCP from an event loop in its own thread
+    def connect(self, server):
+        loop = asyncio.new_event_loop()
+        listener = loop.run_until_complete(asyncio.start_server(server.handle_client_async, '127.0.0.1', 0))
+        port = listener.sockets[0].getsockname()[1]
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+
+        def stop():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            listener.close()
+            loop.run_until_complete(listener.wait_closed())
+            loop.close()
+        self.addCleanup(stop)
+        client_socket = socket.create_connection(('127.0.0.1', port))
+        self.addCleanup(client_socket.close)
+        return client_socket
+
+
+if __name__ == '__main__':
+    unittest.main()
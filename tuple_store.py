@@ -0,0 +1,300 @@
+# 导入bisect模块用于有序键索引 / Import bisect module for the sorted key index
+import bisect
+# 导入heapq模块用于过期时间堆 / Import heapq module for the expiry heap
+import heapq
+# 导入threading模块用于分片锁 / Import threading module for per-shard locks
+import threading
+# 从collections导入deque和OrderedDict用于等待队列和LRU顺序 / Import deque and OrderedDict for waiter queues and LRU order
+from collections import OrderedDict, deque
+# 导入contextmanager用于同时锁定多个分片 / Import contextmanager to lock several shards at once
+from contextlib import contextmanager
+
+# 每个分片维护的操作计数器 / Operation counters kept by every shard
+SHARD_COUNTERS = (
+    'total_operations',   # 总操作数 / Total operations
+    'total_reads',        # 读取操作数 / Read operations
+    'total_gets',         # 获取操作数 / Get operations
+    'total_puts',         # 存放操作数 / Put operations
+    'total_errors',       # 错误数 / Errors
+    'tuples',             # 元组数 / Tuples stored
+    'key_size',           # 所有键的总长度 / Total key size
+    'value_size',         # 所有值的总长度 / Total value size
+    'total_expired',      # 过期删除的元组数 / Tuples removed on expiry
+    'total_evicted',      # 因内存上限驱逐的元组数 / Tuples evicted by the memory cap
+)
+
+# 超出内存上限时的驱逐策略 / Eviction policies used when over the memory cap
+#   lru - 驱逐最久未访问的元组 / evict the least recently used tuple
+#   ttl - 先驱逐最早过期的元组，没有带TTL的元组时退回LRU
+#         evict the tuple expiring soonest first, falling back to LRU when none has a TTL
+EVICTION_POLICIES = ('lru', 'ttl')
+
+# 阻塞的READ/GET每隔多少秒检查一次客户端是否已断开 / Seconds between checks whether the client of a blocking READ/GET disconnected
+WAIT_POLL_INTERVAL = 0.5
+# 有序键索引每块的目标长度，块超过两倍时拆分 / Target length of a sorted key index chunk; chunks are split beyond twice that
+INDEX_CHUNK_SIZE = 512
+
+
+# 定义SortedKeys类：分块保存的有序键列表，插入和删除只移动一个块内的元素
+# Define SortedKeys class: a sorted list of keys kept in chunks, so inserts and deletes only shift one chunk
+class SortedKeys:
+    # 初始化方法 / Initialization method
+    def __init__(self):
+        # 有序的块，块之间也有序 / Sorted chunks, ordered between each other too
+        self.chunks = []
+        # 每块的最大键，用于二分查找块 / Largest key of each chunk, bisected to find a chunk
+        self.maxes = []
+
+    # 插入一个键 / Insert a key
+    def add(self, key):
+        if not self.chunks:
+            self.chunks.append([key])
+            self.maxes.append(key)
+            return
+        index = bisect.bisect_left(self.maxes, key)
+        if index == len(self.maxes):
+            # 比所有键都大，追加到最后一块 / Larger than every key, append to the last chunk
+            index -= 1
+            chunk = self.chunks[index]
+            chunk.append(key)
+            self.maxes[index] = key
+        else:
+            chunk = self.chunks[index]
+            bisect.insort(chunk, key)
+        if len(chunk) > 2 * INDEX_CHUNK_SIZE:
+            self.chunks[index:index + 1] = [chunk[:INDEX_CHUNK_SIZE], chunk[INDEX_CHUNK_SIZE:]]
+            self.maxes[index:index + 1] = [chunk[INDEX_CHUNK_SIZE - 1], chunk[-1]]
+
+    # 删除一个已存在的键 / Delete a key that is present
+    def remove(self, key):
+        index = bisect.bisect_left(self.maxes, key)
+        chunk = self.chunks[index]
+        del chunk[bisect.bisect_left(chunk, key)]
+        if not chunk:
+            del self.chunks[index]
+            del self.maxes[index]
+        else:
+            self.maxes[index] = chunk[-1]
+
+    # 按顺序返回从start开始（inclusive为False时不含start）的至多count个键
+    # Return up to count keys in order from start on (start itself excluded when inclusive is False)
+    def keys_from(self, start, count, inclusive=True):
+        find = bisect.bisect_left if inclusive else bisect.bisect_right
+        index = find(self.maxes, start)
+        keys = []
+        while index < len(self.chunks) and len(keys) < count:
+            chunk = self.chunks[index]
+            position = find(chunk, start) if not keys else 0
+            keys.extend(chunk[position:position + count - len(keys)])
+            index += 1
+        return keys
+
+
+# 定义Waiter类：一个等待键出现的阻塞READ/GET / Define Waiter class: one blocking READ/GET waiting for a key
+class Waiter:
+    # 初始化方法 / Initialization method
+    def __init__(self, operation, notify, fits=None):
+        # 等待的操作：'R'或'G' / Operation waiting: 'R' or 'G'
+        self.operation = operation
+        # 唤醒时调用的回调（不能阻塞） / Callback invoked when woken (must not block)
+        self.notify = notify
+        # 判断值能否交给该等待者，如文本响应放不下的值（None表示都可以）
+        # Tells whether a value can be handed to this waiter, e.g. one too long for a text response (None accepts any)
+        self.fits = fits
+        # 交付给等待者的值及其过期时间 / Value handed to the waiter and its expiry time
+        self.value = None
+        self.deadline = None
+        # 是否已收到值 / Whether a value has been handed over
+        self.done = False
+
+    # 值能否交给该等待者 / Whether a value can be handed to this waiter
+    def accepts(self, value):
+        return self.fits is None or self.fits(value)
+
+    # 交付值并唤醒等待者（调用时持有分片锁） / Hand over a value and wake the waiter (called with the shard lock held)
+    def wake(self, value, deadline=None):
+        self.value = value
+        self.deadline = deadline
+        self.done = True
+        self.notify()
+
+
+# 定义Shard类：一个独立加锁的分区 / Define Shard class: one independently locked partition
+class Shard:
+    # 初始化方法 / Initialization method
+    # budget为本分片键和值的总长度上限，None表示不限 / budget caps the total key and value size of this shard, None for no cap
+    def __init__(self, budget=None, eviction='lru'):
+        # 保护本分片数据和计数器的锁 / Lock guarding this shard's tuples and counters
+        self.lock = threading.Lock()
+        # 本分片的元组存储字典，有内存上限时按访问顺序排列 / Tuple storage dictionary of this shard, kept in access order under a memory cap
+        self.tuples = OrderedDict() if budget is not None else {}
+        # 内存上限和驱逐策略 / Memory cap and eviction policy
+        self.budget = budget
+        self.eviction = eviction
+        # 带TTL的键的过期时间（time.time()） / Expiry time (time.time()) of every key with a TTL
+        self.deadlines = {}
+        # 过期时间的最小堆，条目在键被删除或覆盖后惰性丢弃
+        # Min-heap of expiry times; entries are dropped lazily once their key is removed or replaced
+        self.expiry_heap = []
+        # 按顺序排列的键，用于前缀和范围查询 / Keys in order, for prefix and range queries
+        self.index = SortedKeys()
+        # 本分片的统计计数器 / Statistics counters of this shard
+        self.stats = dict.fromkeys(SHARD_COUNTERS, 0)
+        # 每个键的等待队列，按到达顺序排列 / Per-key waiter queues, in arrival order
+        self.waiters = {}
+
+    # 存储键值对并更新累计大小，deadline为可选的过期时间（调用时持有锁）
+    # Store a key-value pair and update the running totals; deadline is an optional expiry time (called with the lock held)
+    def store(self, key, value, deadline=None):
+        if key in self.tuples:
+            self.remove(key)
+        self.tuples[key] = value
+        self.index.add(key)
+        self.stats['tuples'] += 1
+        self.stats['key_size'] += len(key)
+        self.stats['value_size'] += len(value)
+        if deadline is not None:
+            self.deadlines[key] = deadline
+            heapq.heappush(self.expiry_heap, (deadline, key))
+            # 失效条目过多时重建堆，使其大小与带TTL的键数成正比
+            # Rebuild the heap when stale entries pile up, keeping it proportional to the keys with a TTL
+            if len(self.expiry_heap) > 2 * len(self.deadlines) + 64:
+                self.expiry_heap = [(deadline, key) for key, deadline in self.deadlines.items()]
+                heapq.heapify(self.expiry_heap)
+
+    # 移除并返回键的值，同时更新累计大小（调用时持有锁） / Remove and return a key's value, updating the running totals (called with the lock held)
+    def remove(self, key):
+        value = self.tuples.pop(key)
+        self.index.remove(key)
+        self.stats['tuples'] -= 1
+        self.stats['key_size'] -= len(key)
+        self.stats['value_size'] -= len(value)
+        self.deadlines.pop(key, None)
+        return value
+
+    # 记录一次访问，用于LRU驱逐（调用时持有锁） / Record an access for LRU eviction (called with the lock held)
+    def touch(self, key):
+        if self.budget is not None:
+            self.tuples.move_to_end(key)
+
+    # 丢弃堆顶已失效的条目，返回最早过期的(时间, 键)或None
+    # Drop stale entries from the top of the heap; returns the (deadline, key) expiring soonest, or None
+    def next_deadline(self):
+        heap = self.expiry_heap
+        while heap and self.deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    # 删除在now之前过期的元组，返回被删除的键（调用时持有锁）
+    # Remove the tuples that expired before now; returns the keys removed (called with the lock held)
+    def expire(self, now):
+        expired = []
+        while True:
+            entry = self.next_deadline()
+            if entry is None or entry[0] > now:
+                break
+            heapq.heappop(self.expiry_heap)
+            self.remove(entry[1])
+            expired.append(entry[1])
+        self.stats['total_expired'] += len(expired)
+        return expired
+
+    # 按驱逐策略删除元组直到不超过内存上限，返回被驱逐的键（调用时持有锁）
+    # Remove tuples by the eviction policy until within the memory cap; returns the keys evicted (called with the lock held)
+    def evict(self):
+        evicted = []
+        while self.tuples and self.stats['key_size'] + self.stats['value_size'] > self.budget:
+            entry = self.next_deadline() if self.eviction == 'ttl' else None
+            key = entry[1] if entry is not None else next(iter(self.tuples))
+            self.remove(key)
+            evicted.append(key)
+        self.stats['total_evicted'] += len(evicted)
+        return evicted
+
+    # 将等待者加入键的等待队列 / Add a waiter to the queue of a key
+    def add_waiter(self, key, waiter):
+        self.waiters.setdefault(key, deque()).append(waiter)
+
+    # 从键的等待队列中移除等待者 / Remove a waiter from the queue of a key
+    def remove_waiter(self, key, waiter):
+        queue = self.waiters[key]
+        queue.remove(waiter)
+        if not queue:
+            del self.waiters[key]
+
+    # 把新放入的值交给所有等待的READ和第一个等待的GET，GET取走时返回True
+    # Hand a newly put value to every waiting READ and the first waiting GET; returns True if a GET took it
+    # deadline is the value's expiry time, kept in case the GET's client is gone and the value is stored again
+    def hand_over(self, key, value, deadline=None):
+        taken = False
+        remaining = deque()
+        for waiter in self.waiters.pop(key):
+            # 值已被取走后，其余GET继续等待；无法接收该值的GET也继续等待，而不是取走后丢失
+            # Once the value is taken the other GETs keep waiting; so do GETs that cannot receive it, instead of losing it
+            if waiter.operation == 'G' and (taken or not waiter.accepts(value)):
+                remaining.append(waiter)
+                continue
+            taken = taken or waiter.operation == 'G'
+            waiter.wake(value, deadline)
+        if remaining:
+            self.waiters[key] = remaining
+        return taken
+
+
+# 定义ShardedTupleSpace类：按键哈希分片的元组空间 / Define ShardedTupleSpace class: tuple space sharded by key hash
+class ShardedTupleSpace:
+    # 初始化方法 / Initialization method
+    # max_memory为所有键和值的总长度上限，平均分给各分片，每个分片独立驱逐
+    # max_memory caps the total key and value size; it is split evenly across the shards, which evict independently
+    def __init__(self, num_shards=16, max_memory=None, eviction='lru'):
+        budget = max_memory // num_shards if max_memory is not None else None
+        # 创建所有分片 / Create all shards
+        self.shards = [Shard(budget, eviction) for _ in range(num_shards)]
+
+    # 返回键所属分片的编号 / Return the index of the shard that owns a key
+    def shard_index(self, key):
+        return hash(key) % len(self.shards)
+
+    # 返回键所属的分片 / Return the shard that owns a key
+    def shard_for(self, key):
+        return self.shards[self.shard_index(key)]
+
+    # 按编号顺序锁定这些键所属的分片，每个分片只加锁一次（固定顺序避免死锁），
+    # 不传keys时锁定所有分片
+    # Lock the shards owning these keys in index order, each only once (the fixed order avoids deadlocks);
+    # every shard is locked when no keys are given
+    @contextmanager
+    def locked(self, keys=None):
+        if keys is None:
+            indexes = range(len(self.shards))
+        else:
+            indexes = sorted({self.shard_index(key) for key in keys})
+        locks = [self.shards[index].lock for index in indexes]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    # 元组总数 / Total number of tuples
+    def __len__(self):
+        return sum(len(shard.tuples) for shard in self.shards)
+
+    # 逐个分片复制所有键值对 / Copy all key-value pairs, one shard at a time
+    def items(self):
+        items = []
+        for shard in self.shards:
+            with shard.lock:
+                items.extend(shard.tuples.items())
+        return items
+
+    # 读取时合并各分片的计数器 / Merge the per-shard counters when they are read
+    def merged_stats(self):
+        merged = dict.fromkeys(SHARD_COUNTERS, 0)
+        for shard in self.shards:
+            with shard.lock:
+                for name, count in shard.stats.items():
+                    merged[name] += count
+        return merged
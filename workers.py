@@ -0,0 +1,221 @@
+# 多进程服务器模式 / Multi-process server mode
+#
+# N个工作进程通过SO_REUSEPORT在同一端口上接受连接，键空间按CRC32哈希划分给各个进程。
+# 每个键只由其所属进程修改，因此GET在所有进程中只会移除一次。请求的键属于其他进程时，
+# 通过Unix域套接字转发给所属进程，并把响应原样返回给客户端。
+# N worker processes accept connections on the same port through SO_REUSEPORT
+# and the key space is partitioned between them by CRC32 hash. Only the owning
+# worker ever mutates a key, so a GET removes it exactly once across all
+# workers. A request for a key owned by another worker is forwarded to it over
+# a Unix domain socket and its response relayed back to the client unchanged.
+
+# 导入multiprocessing模块用于创建工作进程 / Import multiprocessing module to create worker processes
+import multiprocessing
+# 导入os模块用于路径处理 / Import os module for path handling
+import os
+# 导入select模块用于等待转发响应时检查客户端 / Import select module to watch the client while waiting for a forwarded response
+import select
+# 导入shutil模块用于清理临时目录 / Import shutil module to clean up the temporary directory
+import shutil
+# 导入signal模块以便在终止时停止工作进程 / Import signal module to stop the workers on termination
+import signal
+# 导入socket模块用于进程间通信 / Import socket module for inter-worker communication
+import socket
+# 导入sys模块用于退出父进程 / Import sys module to exit the parent process
+import sys
+# 导入tempfile模块用于创建套接字目录 / Import tempfile module to create the socket directory
+import tempfile
+# 导入threading模块用于转发连接 / Import threading module for forwarding connections
+import threading
+# 导入time模块用于连接重试 / Import time module for connection retries
+import time
+# 导入zlib模块用于跨进程稳定的哈希 / Import zlib module for a hash that is stable across processes
+import zlib
+
+# 导入二进制协议，用于转发二进制请求 / Import the binary protocol to forward binary requests
+from binary_protocol import (
+    RESPONSE_HEADER, STATUS_MATCH, STATUS_OK, BinaryFrameReader, decode_match, decode_response, negotiate,
+)
+# 导入带长度前缀的消息读取器 / Import the length-prefixed message reader
+from framing import FrameReader
+# 导入等待时检查客户端的间隔 / Import the interval between client checks while waiting
+from tuple_store import WAIT_POLL_INTERVAL
+
+
+# 返回键所属的工作进程编号 / Return the index of the worker that owns a key
+def key_owner(key, num_workers):
+    return zlib.crc32(key.encode('utf-8')) % num_workers
+
+
+# 工作进程之间转发请求的套接字路径 / Socket path used to forward requests to a worker
+def peer_socket_path(socket_dir, index):
+    return os.path.join(socket_dir, f"worker-{index}.sock")
+
+
+# 定义KeyRouter类：决定请求在本进程处理还是转发 / Define KeyRouter class: handle a request locally or forward it
+class KeyRouter:
+    # 初始化方法 / Initialization method
+    def __init__(self, index, num_workers, socket_dir):
+        # 本工作进程编号 / Index of this worker
+        self.index = index
+        # 工作进程总数 / Total number of workers
+        self.num_workers = num_workers
+        # 转发套接字所在目录 / Directory holding the forwarding sockets
+        self.socket_dir = socket_dir
+        # 每个线程自己的转发连接 / Forwarding connections owned by each thread
+        self.local = threading.local()
+
+    # 键是否属于本工作进程 / Whether this worker owns the key
+    def is_local(self, key):
+        return key_owner(key, self.num_workers) == self.index
+
+    # 建立到一个工作进程的新连接 / Open a new connection to a worker
+    def connect(self, owner):
+        path = peer_socket_path(self.socket_dir, owner)
+        # 对方可能仍在启动，短暂重试 / The peer may still be starting, retry briefly
+        for attempt in range(50):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if attempt == 49:
+                    raise
+                time.sleep(0.1)
+
+    # 获取（必要时建立）到所属进程的文本或二进制连接 / Get (or open) the text or binary connection to the owning worker
+    def connection(self, owner, binary=False):
+        connections = getattr(self.local, 'connections', None)
+        if connections is None:
+            connections = self.local.connections = {}
+        if (owner, binary) not in connections:
+            sock = self.connect(owner)
+            if binary:
+                negotiate(sock)
+                connections[owner, binary] = (sock, BinaryFrameReader(RESPONSE_HEADER.size))
+            else:
+                connections[owner, binary] = (sock, FrameReader())
+        return connections[owner, binary]
+
+    # 转发请求给键所属的工作进程并返回其响应，二进制请求（bytes）走二进制连接；
+    # 转发阻塞请求时传入closed，客户端断开后关闭转发连接，使所属进程放弃等待
+    # Forward a request to the owning worker and return its response; binary requests (bytes) use a binary connection.
+    # Blocking requests pass closed: once the client disconnects the forwarding connection is closed, so the owner stops waiting
+    def forward(self, key, request, closed=None):
+        owner = key_owner(key, self.num_workers)
+        binary = isinstance(request, bytes)
+        sock, reader = self.connection(owner, binary)
+        abandoned = False
+        try:
+            sock.sendall(request if binary else request.encode('utf-8'))
+            if closed is not None:
+                # poll没有select的文件描述符上限（FD_SETSIZE） / poll has no file descriptor limit, unlike select (FD_SETSIZE)
+                poller = select.poll()
+                poller.register(sock, select.POLLIN)
+                while not poller.poll(WAIT_POLL_INTERVAL * 1000):
+                    if closed():
+                        abandoned = True
+                        break
+            response = None if abandoned else reader.read_frame(sock)
+        except OSError:
+            response = None
+        except BaseException:
+            # 响应未被读取，连接已不同步，不能再用 / The reply was not read, so the connection is out of sync and cannot be reused
+            self.drop(owner, binary, sock)
+            raise
+        if response is None:
+            # 连接失效或已放弃，下次重新建立 / The connection is broken or abandoned, reopen it next time
+            self.drop(owner, binary, sock)
+            raise ConnectionError("client disconnected" if abandoned else f"worker {owner} unavailable")
+        return response
+
+    # 关闭并丢弃本线程到某个工作进程的连接 / Close and discard this thread's connection to a worker
+    def drop(self, owner, binary, sock):
+        del self.local.connections[owner, binary]
+        sock.close()
+
+    # 在其他每个工作进程上执行二进制查询请求，返回它们各自按键排序的(键, 值)流
+    # Run a binary query request on every other worker; returns their (key, value) streams, each sorted by key
+    def query_peers(self, request):
+        return [self.query_peer(owner, request) for owner in range(self.num_workers) if owner != self.index]
+
+    # 从一个工作进程流式读取查询结果；使用独立的连接，因为流可能在其他线程中继续
+    # Stream the query results of one worker over a connection of its own, as the stream may be resumed from another thread
+    def query_peer(self, owner, request):
+        sock = self.connect(owner)
+        try:
+            negotiate(sock)
+            reader = BinaryFrameReader(RESPONSE_HEADER.size)
+            sock.sendall(request)
+            while True:
+                frame = reader.read_frame(sock)
+                if frame is None:
+                    raise ConnectionError(f"worker {owner} unavailable")
+                if frame[RESPONSE_HEADER.size - 1] != STATUS_MATCH:
+                    break
+                yield decode_match(frame)
+            status, payload = decode_response(frame)
+            if status != STATUS_OK:
+                raise ConnectionError(f"worker {owner} failed the query: {payload}")
+        finally:
+            sock.close()
+
+    # 监听来自其他工作进程的转发请求 / Listen for requests forwarded by other workers
+    def serve_peers(self, server):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(peer_socket_path(self.socket_dir, self.index))
+        listener.listen(server.backlog)
+        while True:
+            peer_socket, _ = listener.accept()
+            # 复用普通客户端的处理逻辑，查询只在本进程中执行 / Reuse the regular client handler; queries only run locally
+            threading.Thread(target=server.handle_client, args=(peer_socket, True), daemon=True).start()
+
+
+# 工作进程入口 / Worker process entry point
+def run_worker(create_server, index, num_workers, socket_dir, engine):
+    # 恢复从父进程继承的默认终止行为 / Restore the default termination behaviour inherited from the parent
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server = create_server(index)
+    # 与其他工作进程共享监听端口 / Share the listening port with the other workers
+    server.reuse_port = True
+    server.router = KeyRouter(index, num_workers, socket_dir)
+    # 启动转发请求监听线程 / Start the thread that accepts forwarded requests
+    threading.Thread(target=server.router.serve_peers, args=(server,), daemon=True).start()
+    server.logger.info('worker_started', "Worker {index} of {workers} starting (pid {pid})",
+                       index=index, workers=num_workers, pid=os.getpid())
+    try:
+        if engine == 'asyncio':
+            server.start_async()
+        else:
+            server.start()
+    # 子进程退出时不运行atexit，先写出剩余日志 / A child exits without running atexit, so write out the remaining log records first
+    finally:
+        server.logger.flush()
+
+
+# 启动N个工作进程并等待它们退出 / Start N worker processes and wait for them to exit
+def run_workers(create_server, num_workers, engine='threaded'):
+    socket_dir = tempfile.mkdtemp(prefix='tuplespace-')
+    # 使用fork使子进程继承服务器配置 / Use fork so the children inherit the server configuration
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=run_worker, args=(create_server, index, num_workers, socket_dir, engine))
+        for index in range(num_workers)
+    ]
+    # 父进程被终止时也停止所有工作进程 / Stop every worker when the parent is terminated too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    # 捕获键盘中断，子进程会各自退出 / Catch keyboard interrupt, each child shuts itself down
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join(timeout=5)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        shutil.rmtree(socket_dir, ignore_errors=True)